@@ -0,0 +1,499 @@
+import time
+import asyncio
+import logging
+import threading
+import contextlib
+import collections
+import concurrent.futures
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+# Who the current generation is for: set by get_ai_response* before the providers run
+Caller = collections.namedtuple("Caller", "key channel")
+current_caller = ContextVar("current_caller", default=None)
+ANONYMOUS = Caller("anonymous", "web")
+
+REJECTION_REASONS = ("rate_limited", "queue_full", "overloaded", "timeout")
+
+
+class AdmissionRejected(Exception):
+    """
+    The request was shed instead of queued; the caller answers with a "busy" reply.
+    `reason` is one of REJECTION_REASONS.
+    """
+
+    def __init__(self, reason, provider=None, retry_after=None):
+        super().__init__(f"{provider or 'assistant'} busy ({reason})")
+        self.reason = reason
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+def parse_mapping(spec, default=None):
+    """
+    'local=2,openai=16' -> {'local': 2, 'openai': 16}.
+    """
+    mapping = dict(default or {})
+    for item in spec.split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip():
+            mapping[name.strip().lower()] = int(value)
+    return mapping
+
+
+class TokenBuckets:
+    """
+    One token bucket per caller key: `burst` requests at once, refilled at `rate`
+    per second. Least recently seen keys are dropped beyond `max_keys` (a dropped
+    key simply starts again with a full bucket).
+    """
+
+    def __init__(self, rate, burst, max_keys=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = collections.OrderedDict() # key -> [tokens, last refill]
+        self._lock = threading.Lock()
+
+    def take(self, key):
+        """
+        Takes a token; returns 0 if one was available, else seconds until there is one.
+        """
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(self.burst), now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+            return (1 - bucket[0]) / self.rate
+
+    async def atake(self, key):
+        return self.take(key)
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def stats(self):
+        return {"rate": self.rate, "burst": self.burst, "callers": len(self)}
+
+
+class SharedRateLimit:
+    """
+    Per-caller rate limit kept in a shared state store (shared_state), so the API
+    workers and the bot count against one limit instead of one each. Each caller
+    gets `burst` requests per fixed window of burst / rate seconds, counted with
+    the store's incr. A store error lets the request through.
+    """
+
+    def __init__(self, store, rate, burst):
+        self.store = store
+        self.rate = rate
+        self.burst = burst
+        self.window = burst / rate
+
+    def _window(self, key):
+        # (counter key, seconds until the window ends)
+        now = time.time()
+        index = int(now // self.window)
+        return f"admission:rate:{key}:{index}", (index + 1) * self.window - now
+
+    def _result(self, count, remaining):
+        return 0 if count <= self.burst else remaining
+
+    def take(self, key):
+        """
+        Counts a request; returns 0 if it is within the limit, else seconds until the next window.
+        """
+        name, remaining = self._window(key)
+        try:
+            return self._result(self.store.incr(name, ttl=self.window), remaining)
+        except Exception as e:
+            logger.error(f"Shared rate limit error: {e}")
+            return 0
+
+    async def atake(self, key):
+        name, remaining = self._window(key)
+        try:
+            return self._result(await self.store.aincr(name, ttl=self.window), remaining)
+        except Exception as e:
+            logger.error(f"Shared rate limit error: {e}")
+            return 0
+
+    def stats(self):
+        return {"rate": self.rate, "burst": self.burst, "window": round(self.window, 3), "shared": True}
+
+
+class Waiter:
+    __slots__ = ("caller", "future", "enqueued")
+
+    def __init__(self, caller):
+        self.caller = caller
+        self.future = concurrent.futures.Future()
+        self.enqueued = time.monotonic()
+
+
+class ProviderGate:
+    """
+    Concurrency limit for one provider with a fair queue behind it.
+
+    Waiting requests are grouped by channel and, within a channel, by caller.
+    Channels are served weighted round-robin (a channel with weight 3 gets up to
+    three slots for every one of a weight-1 channel while both are waiting) and
+    callers within a channel round-robin, so a burst from one Telegram group
+    queues behind itself rather than in front of everyone else.
+
+    A freed slot is handed straight to the next waiter, so callers on the event
+    loop and in threads share one queue; they wait on a concurrent.futures.Future.
+    """
+
+    def __init__(self, name, limit, weights, max_queue=64, max_queue_per_caller=4, max_wait=20.0):
+        self.name = name
+        self.limit = limit
+        self.weights = weights
+        self.max_queue = max_queue
+        self.max_queue_per_caller = max_queue_per_caller
+        self.max_wait = max_wait
+        self.active = 0
+        self.queued = 0
+        self.service_time = None # moving average of how long a slot is held
+        self._queues = {} # channel -> OrderedDict(caller key -> deque of waiters)
+        self._turn = [] # channels in round-robin order
+        self._served_in_turn = 0
+        self._lock = threading.Lock()
+        self.admitted = 0
+        self.waited = 0
+
+    def _weight(self, channel):
+        return max(1, self.weights.get(channel, 1))
+
+    def _ahead_of(self, caller):
+        """
+        Waiters the round-robin would serve before a new request from `caller`.
+        """
+        own = self._queues.get(caller.channel, {})
+        mine = len(own.get(caller.key, ()))
+        in_channel = sum(min(len(waiters), mine + 1) for waiters in own.values())
+        rounds = (in_channel + 1) / self._weight(caller.channel)
+        others = sum(
+            min(sum(len(waiters) for waiters in queue.values()), int(rounds * self._weight(channel)))
+            for channel, queue in self._queues.items() if channel != caller.channel
+        )
+        return in_channel + others
+
+    def enter(self, caller):
+        """
+        Returns None when a slot was free, else a Waiter to wait on.
+        Raises AdmissionRejected when the request would not be served in time.
+        """
+        with self._lock:
+            if self.active < self.limit and not self.queued:
+                self.active += 1
+                self.admitted += 1
+                return None
+            if self.queued >= self.max_queue:
+                raise AdmissionRejected("queue_full", self.name, self.max_wait)
+            queue = self._queues.setdefault(caller.channel, collections.OrderedDict())
+            if len(queue.get(caller.key, ())) >= self.max_queue_per_caller:
+                raise AdmissionRejected("queue_full", self.name, self.max_wait)
+            if self.service_time is not None:
+                expected = (self._ahead_of(caller) + 1) / self.limit * self.service_time
+                if expected > self.max_wait:
+                    raise AdmissionRejected("overloaded", self.name, expected)
+            if caller.channel not in self._turn:
+                self._turn.append(caller.channel)
+            waiter = Waiter(caller)
+            queue.setdefault(caller.key, collections.deque()).append(waiter)
+            self.queued += 1
+            return waiter
+
+    def _next_waiter(self):
+        # Called with the lock held and at least one waiter queued
+        while True:
+            channel = self._turn[0]
+            queue = self._queues.get(channel)
+            if queue and self._served_in_turn < self._weight(channel):
+                break
+            self._turn.append(self._turn.pop(0))
+            self._served_in_turn = 0
+        self._served_in_turn += 1
+        key, waiters = next(iter(queue.items()))
+        waiter = waiters.popleft()
+        if waiters:
+            queue.move_to_end(key)
+        else:
+            del queue[key]
+        self.queued -= 1
+        return waiter
+
+    def leave(self, held=None):
+        """
+        Frees a slot after `held` seconds, handing it to the next waiter if any.
+        """
+        with self._lock:
+            if held is not None:
+                self.service_time = held if self.service_time is None else 0.8 * self.service_time + 0.2 * held
+            if not self.queued or self.active > self.limit:
+                self.active -= 1
+                return
+            waiter = self._next_waiter()
+            self.admitted += 1
+            self.waited += 1
+            waiter.future.set_result(time.monotonic() - waiter.enqueued)
+
+    def resize(self, limit):
+        """
+        Changes the concurrency limit. Extra slots go to waiters right away; above
+        a lowered limit, freed slots are not handed on until it is met again.
+        """
+        with self._lock:
+            self.limit = limit
+            while self.queued and self.active < self.limit:
+                waiter = self._next_waiter()
+                self.active += 1
+                self.admitted += 1
+                self.waited += 1
+                waiter.future.set_result(time.monotonic() - waiter.enqueued)
+
+    def cancel(self, waiter):
+        """
+        Withdraws a waiter that gave up. Returns False if it was granted a slot
+        meanwhile, in which case the caller owns that slot.
+        """
+        with self._lock:
+            if waiter.future.done():
+                return False
+            queue = self._queues[waiter.caller.channel]
+            waiters = queue[waiter.caller.key]
+            waiters.remove(waiter)
+            if not waiters:
+                del queue[waiter.caller.key]
+            self.queued -= 1
+            waiter.future.cancel()
+            return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "active": self.active,
+                "queued": self.queued,
+                "queued_by_channel": {
+                    channel: sum(len(waiters) for waiters in queue.values()) for channel, queue in self._queues.items()
+                },
+                "admitted": self.admitted,
+                "waited": self.waited,
+                "service_time": round(self.service_time, 3) if self.service_time is not None else None
+            }
+
+
+class ProcessCount:
+    """
+    Number of live processes sharing a state store. Each process increments a
+    counter for the current window of `interval` seconds once per window from a
+    daemon thread; the count is the larger of the current and the previous
+    window's, so a new process is counted at its first beat and one that exited
+    drops out within two windows. `on_change(count)` is called from that thread.
+    """
+
+    def __init__(self, store, interval=10.0, on_change=None):
+        self.store = store
+        self.interval = interval
+        self.on_change = on_change
+        self.count = 1
+        self._safe_beat()
+        threading.Thread(target=self._run, name="admission-processes", daemon=True).start()
+
+    def beat(self):
+        index = int(time.time() // self.interval)
+        current = self.store.incr(f"admission:processes:{index}", ttl=self.interval * 3)
+        previous = self.store.get(f"admission:processes:{index - 1}", 0)
+        count = max(1, current, previous)
+        if count != self.count:
+            self.count = count
+            if self.on_change:
+                self.on_change(count)
+
+    def _safe_beat(self):
+        try:
+            self.beat()
+        except Exception as e:
+            logger.error(f"Admission process count error: {e}")
+
+    def _run(self):
+        while True:
+            # Just after the next window starts
+            time.sleep(self.interval - time.time() % self.interval + 0.05)
+            self._safe_beat()
+
+
+class AdmissionController:
+    """
+    Admission in front of the AI providers: a per-caller rate limit (Supabase
+    user id, Telegram chat id or Messenger sender id) checked once per generation,
+    and a ProviderGate per provider with a concurrency limit. Providers without a
+    limit are not gated.
+
+    Instead of letting requests pile up until they time out, a request is shed
+    right away with AdmissionRejected when its caller is over its rate, its queue
+    is full, or the expected wait exceeds `max_wait`; a request that still waits
+    `max_wait` gives up.
+
+    With several processes in front of the same providers (API workers plus a
+    polling bot), each gate gets its share of the limit and queues fairly among
+    its own requests. When `state` is shared the processes are counted live
+    (ProcessCount: every process that builds a controller on the store) and the
+    shares follow as processes start and stop; `processes` fixes the count
+    instead. The rate limit is kept in `state` when that store is shared,
+    otherwise in per-process token buckets.
+    """
+
+    def __init__(self, limits, weights=None, rate=0.5, burst=10, max_queue=64, max_queue_per_caller=4,
+                 max_wait=20.0, enabled=True, observer=None, processes=None, state=None):
+        self.enabled = enabled
+        self.weights = weights or {}
+        self.max_wait = max_wait
+        self.limits = {name: limit for name, limit in limits.items() if limit > 0}
+        self.processes = max(1, processes or 1)
+        self.gates = {
+            name: ProviderGate(name, self._share(name, limit), self.weights, max_queue, max_queue_per_caller, max_wait)
+            for name, limit in self.limits.items()
+        }
+        self.process_count = None
+        if processes is None and enabled and self.limits and state is not None and state.shared:
+            self.process_count = ProcessCount(state, on_change=self._set_processes)
+        if rate <= 0:
+            self.rate_limit = None
+        elif state is not None and state.shared:
+            self.rate_limit = SharedRateLimit(state, rate, burst)
+        else:
+            self.rate_limit = TokenBuckets(rate, burst)
+        self.observer = observer # optional fn(provider, channel, seconds waited)
+        self.rejected = collections.Counter()
+        self._lock = threading.Lock()
+
+    def _share(self, name, limit):
+        share = max(1, limit // self.processes)
+        if share * self.processes > limit:
+            logger.warning(f"Admission limit {name}={limit} is below the {self.processes} processes; "
+                           f"each admits 1, so up to {self.processes} {name} generations can run at once")
+        return share
+
+    def _set_processes(self, count):
+        logger.info(f"Admission limits shared by {count} processes")
+        self.processes = count
+        for name, limit in self.limits.items():
+            self.gates[name].resize(self._share(name, limit))
+
+    def _reject(self, error):
+        with self._lock:
+            self.rejected[error.reason] += 1
+        logger.warning(f"Shedding request: {error}")
+        raise error
+
+    def check_rate(self, caller):
+        """
+        Takes a token from the caller's bucket; raises AdmissionRejected when it is empty.
+        """
+        if not self.enabled or self.rate_limit is None:
+            return
+        retry_after = self.rate_limit.take(caller.key)
+        if retry_after:
+            self._reject(AdmissionRejected("rate_limited", retry_after=retry_after))
+
+    async def check_rate_async(self, caller):
+        """
+        check_rate for the event loop; a shared limit is counted off the loop.
+        """
+        if not self.enabled or self.rate_limit is None:
+            return
+        retry_after = await self.rate_limit.atake(caller.key)
+        if retry_after:
+            self._reject(AdmissionRejected("rate_limited", retry_after=retry_after))
+
+    def _enter(self, gate):
+        caller = current_caller.get() or ANONYMOUS
+        try:
+            return caller, gate.enter(caller)
+        except AdmissionRejected as e:
+            self._reject(e)
+
+    def _admitted(self, gate, caller, waited):
+        if self.observer:
+            self.observer(gate.name, caller.channel, waited)
+
+    @contextlib.contextmanager
+    def slot(self, provider):
+        """
+        Holds one of the provider's slots; blocks the calling thread while queued.
+        """
+        gate = self.gates.get(provider) if self.enabled else None
+        if gate is None:
+            yield
+            return
+        caller, waiter = self._enter(gate)
+        waited = 0.0
+        if waiter is not None:
+            try:
+                waited = waiter.future.result(timeout=self.max_wait)
+            except concurrent.futures.TimeoutError:
+                if gate.cancel(waiter):
+                    self._reject(AdmissionRejected("timeout", provider, self.max_wait))
+                waited = waiter.future.result()
+        self._admitted(gate, caller, waited)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            gate.leave(time.monotonic() - started)
+
+    @contextlib.asynccontextmanager
+    async def slot_async(self, provider):
+        """
+        Holds one of the provider's slots; queued callers wait without blocking the loop.
+        """
+        gate = self.gates.get(provider) if self.enabled else None
+        if gate is None:
+            yield
+            return
+        caller, waiter = self._enter(gate)
+        waited = 0.0
+        if waiter is not None:
+            try:
+                waited = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(waiter.future)), self.max_wait)
+            except asyncio.TimeoutError:
+                if gate.cancel(waiter):
+                    self._reject(AdmissionRejected("timeout", provider, self.max_wait))
+                waited = waiter.future.result()
+            except asyncio.CancelledError:
+                # A slot granted while we were being cancelled goes to the next waiter
+                if not gate.cancel(waiter):
+                    gate.leave()
+                raise
+        self._admitted(gate, caller, waited)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            gate.leave(time.monotonic() - started)
+
+    def stats(self):
+        with self._lock:
+            rejected = {reason: self.rejected[reason] for reason in REJECTION_REASONS}
+        return {
+            "enabled": self.enabled,
+            "weights": self.weights,
+            "max_wait": self.max_wait,
+            "processes": self.processes,
+            "rate_limit": self.rate_limit.stats() if self.rate_limit is not None else None,
+            "rejected": rejected,
+            "providers": {name: gate.stats() for name, gate in self.gates.items()}
+        }
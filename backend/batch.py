@@ -0,0 +1,398 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import collections
+
+from json_stream import iter_records
+
+logger = logging.getLogger(__name__)
+
+# Fields that hold the question of an input record, in order of preference
+QUESTION_FIELDS = ("question", "message", "text", "input", "prompt", "body")
+ID_FIELDS = ("id", "request_id", "question_id")
+FINISHED_BATCH_STATES = ("completed", "failed", "expired", "cancelled")
+
+
+def question_of(record, field=None):
+    if isinstance(record, str):
+        return record
+    if not isinstance(record, dict):
+        return ""
+    for name in (field,) if field else QUESTION_FIELDS:
+        value = record.get(name)
+        if isinstance(value, str) and value.strip():
+            return value
+    return ""
+
+
+def id_of(record, index, field=None):
+    """
+    The record's own id (e.g. request_id in a backlog file), else its line number.
+    """
+    if isinstance(record, dict):
+        for name in (field,) if field else ID_FIELDS:
+            if record.get(name) is not None:
+                return str(record[name])
+    return str(index)
+
+
+def read_inputs(path, field=None, id_field=None, done=()):
+    """
+    Streams (index, id, question, channel) for the records of a JSONL file that are not in `done`.
+    """
+    for index, (record, _) in enumerate(iter_records(path, "ndjson")):
+        item_id = id_of(record, index, id_field)
+        question = question_of(record, field)
+        if item_id in done or not question.strip():
+            continue
+        channel = record.get("channel") if isinstance(record, dict) else None
+        yield index, item_id, question, channel
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ResultLog:
+    """
+    Output JSONL, one result per line in completion order, which is also the
+    checkpoint: on resume the ids with an answer are skipped and the lines of
+    failed items (and a torn last line) are dropped so those items run again.
+    """
+
+    def __init__(self, path, sync_every=50):
+        self.path = path
+        self.sync_every = sync_every
+        self.done = set()
+        self.dropped = 0
+        kept = []
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        result = json.loads(line)
+                    except ValueError:
+                        self.dropped += 1
+                        continue
+                    if result.get("error"):
+                        self.dropped += 1
+                        continue
+                    self.done.add(result["id"])
+                    kept.append(line if line.endswith(b"\n") else line + b"\n")
+            if self.dropped:
+                with open(path + ".tmp", "wb") as f:
+                    f.writelines(kept)
+                os.replace(path + ".tmp", path)
+        self.f = open(path, "ab")
+        self._unsynced = 0
+
+    def write(self, result):
+        self.f.write((json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.f.flush()
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            self.sync()
+
+    def sync(self):
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        self.sync()
+        self.f.close()
+
+
+class BatchStats:
+    def __init__(self, skipped=0):
+        self.items = 0
+        self.answered = 0
+        self.skipped = skipped
+        self.errors = collections.Counter() # kind -> count
+        self.error_messages = collections.Counter()
+        self.stages = collections.defaultdict(list) # stage -> [ms]
+        self.batch_wait = None
+        self._started = time.monotonic()
+
+    def add(self, result):
+        self.items += 1
+        if result["error"]:
+            self.errors[result["error"]] += 1
+            self.error_messages[result["answer"][:120]] += 1
+        else:
+            self.answered += 1
+        for stage, ms in result["ms"].items():
+            self.stages[stage].append(ms)
+
+    def as_dict(self):
+        elapsed = time.monotonic() - self._started
+        return {
+            "items": self.items,
+            "answered": self.answered,
+            "skipped": self.skipped,
+            "errors": dict(self.errors),
+            "top_errors": dict(self.error_messages.most_common(5)),
+            "elapsed": round(elapsed, 3),
+            "items_per_s": round(self.items / elapsed, 2) if elapsed else None,
+            "batch_wait": round(self.batch_wait, 3) if self.batch_wait is not None else None,
+            "stages_ms": {
+                stage: {"p50": round(percentile(samples, 0.5), 1), "p95": round(percentile(samples, 0.95), 1),
+                        "max": round(max(samples), 1)}
+                for stage, samples in self.stages.items()
+            }
+        }
+
+    def summary(self):
+        s = self.as_dict()
+        stages = ", ".join(f"{stage} p50 {v['p50']} / p95 {v['p95']} ms" for stage, v in s["stages_ms"].items())
+        return (f"{s['items']} items in {s['elapsed']:.1f} s ({s['items_per_s']}/s): {s['answered']} answered, "
+                f"{sum(s['errors'].values())} errors {s['errors'] or ''}, {s['skipped']} already done; {stages}")
+
+
+class BatchRunner:
+    """
+    Runs input questions through the live pipeline (get_context, then the
+    provider router via get_ai_response_async) with at most `concurrency` in
+    flight, writing each result to the ResultLog as it completes.
+    """
+
+    def __init__(self, log, stats, channel="messenger", use_cache=False, concurrency=8, progress_interval=10.0):
+        import core
+        from metrics import trace_request
+        self.core = core
+        self.trace_request = trace_request
+        self.log = log
+        self.stats = stats
+        self.channel = channel
+        self.use_cache = use_cache
+        self.concurrency = concurrency
+        self.progress_interval = progress_interval
+        self._last_report = time.monotonic()
+        # --concurrency is the limit for a batch run; admission control would shed
+        # the queued items as one burst
+        core.ADMISSION.enabled = False
+
+    def result(self, index, item_id, question, channel, answer, ms):
+        core = self.core
+        if answer == core.BUSY_REPLY:
+            error = "busy"
+        elif core.is_error_reply(answer):
+            error = "provider"
+        else:
+            error = None
+        return {
+            "id": item_id,
+            "index": index,
+            "channel": channel,
+            "question": question,
+            "answer": answer,
+            "error": error,
+            "provider": core.AI_PROVIDER,
+            "model": core.get_model_name(),
+            "prompt": core.PROMPT_REGISTRY.prefix(channel).digest,
+            "ms": ms
+        }
+
+    def record(self, result):
+        self.log.write(result)
+        self.stats.add(result)
+        if time.monotonic() - self._last_report >= self.progress_interval:
+            logger.info(self.stats.summary())
+            self._last_report = time.monotonic()
+
+    async def answer(self, index, item_id, question, channel):
+        channel = channel or self.channel
+        started = time.perf_counter()
+        with self.trace_request("batch.item", channel, item=item_id) as traced:
+            try:
+                context = await asyncio.to_thread(self.core.get_context, question)
+                answer = await self.core.get_ai_response_async(question, context, use_cache=self.use_cache,
+                                                               channel=channel, user=f"batch:{item_id}")
+            except Exception as e:
+                logger.error(f"Item {item_id} failed: {e}")
+                answer = f"Error contacting AI Provider: {e}"
+        ms = {span["stage"]: span["ms"] for span in getattr(traced, "trace", {}).get("spans", ())}
+        ms["total"] = round((time.perf_counter() - started) * 1000, 3)
+        return self.result(index, item_id, question, channel, answer, ms)
+
+    async def run(self, items):
+        items = iter(items)
+
+        async def worker():
+            # Workers share one iterator, so the input is read lazily and never held in memory
+            for index, item_id, question, channel in items:
+                self.record(await self.answer(index, item_id, question, channel))
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        await self.core.close_http_clients()
+
+    def run_openai_batch(self, items, state_path, poll_interval=30.0):
+        """
+        Answers through the OpenAI Batch API (half the price, results within 24 h)
+        instead of one call per item. Contexts are retrieved and prompts built
+        locally, uploaded as one JSONL, and the batch is polled until it finishes.
+        The batch id is kept in `state_path`, so an interrupted run resumes polling
+        the same batch rather than submitting it again.
+        """
+        core = self.core
+        client = core.get_openai_client()
+        if client is None:
+            raise SystemExit("--provider-batch needs OPENAI_API_KEY")
+
+        if os.path.exists(state_path):
+            with open(state_path) as f:
+                state = json.load(f)
+            logger.info(f"Resuming OpenAI batch {state['batch_id']}")
+        else:
+            state = {"items": {}}
+            requests_path = state_path + ".requests.jsonl"
+            with open(requests_path, "w", encoding="utf-8") as f:
+                for index, item_id, question, channel in items:
+                    channel = channel or self.channel
+                    started = time.perf_counter()
+                    context = core.get_context(question)
+                    system_instruction = core.build_system_instruction(context, "", channel)
+                    body = {
+                        "model": core.OPENAI_MODEL,
+                        "messages": [{"role": "system", "content": system_instruction}, {"role": "user", "content": question}],
+                        **core.openai_cache_args(system_instruction)
+                    }
+                    f.write(json.dumps({"custom_id": item_id, "method": "POST", "url": "/v1/chat/completions", "body": body},
+                                       ensure_ascii=False) + "\n")
+                    state["items"][item_id] = [index, question, channel, round((time.perf_counter() - started) * 1000, 3)]
+            if not state["items"]:
+                return
+            with open(requests_path, "rb") as f:
+                uploaded = client.files.create(file=f, purpose="batch")
+            batch = client.batches.create(input_file_id=uploaded.id, endpoint="/v1/chat/completions", completion_window="24h")
+            state["batch_id"] = batch.id
+            with open(state_path + ".tmp", "w") as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(state_path + ".tmp", state_path)
+            logger.info(f"Submitted OpenAI batch {batch.id} with {len(state['items'])} requests")
+
+        started = time.monotonic()
+        while True:
+            batch = client.batches.retrieve(state["batch_id"])
+            if batch.status in FINISHED_BATCH_STATES:
+                break
+            counts = batch.request_counts
+            logger.info(f"Batch {batch.id} {batch.status}: {counts.completed if counts else 0}/{counts.total if counts else '?'} done")
+            time.sleep(poll_interval)
+        self.stats.batch_wait = time.monotonic() - started
+
+        replies = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                response = row.get("response") or {}
+                body = response.get("body") or {}
+                if response.get("status_code") == 200 and body.get("choices"):
+                    usage = body.get("usage") or {}
+                    core.record_usage("openai", usage.get("prompt_tokens"), usage.get("completion_tokens"))
+                    replies[row["custom_id"]] = body["choices"][0]["message"]["content"]
+                else:
+                    error = row.get("error") or body.get("error") or {}
+                    replies[row["custom_id"]] = f"Error contacting AI Provider: {error.get('message', batch.status)}"
+        for item_id, (index, question, channel, context_ms) in state["items"].items():
+            answer = replies.get(item_id, f"Error contacting AI Provider: no result (batch {batch.status})")
+            self.record(self.result(index, item_id, question, channel, answer, {"context": context_ms}))
+        # Items without an answer are resubmitted by the next run
+        for path in (state_path, state_path + ".requests.jsonl"):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def use_stub(latency, provider_batch=False):
+    """
+    Points the pipeline at an in-process fake provider (Ollama, or OpenAI with the
+    Batch API for --provider-batch), so a run needs no API key or network.
+    """
+    if provider_batch:
+        from benchmarks.fakes import start_fake, FakeOpenAIHandler
+        server, url = start_fake(FakeOpenAIHandler, latency)
+        os.environ.update({"AI_PROVIDER": "openai", "OPENAI_API_KEY": "sk-fake", "OPENAI_BASE_URL": f"{url}/v1"})
+    else:
+        from benchmarks.fake_ollama import start_fake_ollama
+        server, url = start_fake_ollama(latency=latency, token_interval=0.0)
+        os.environ.update({"AI_PROVIDER": "local", "OLLAMA_URL": url, "OLLAMA_WARMUP": "off"})
+    os.environ["AI_PROVIDER_FALLBACKS"] = ""
+    return server
+
+
+if __name__ == "__main__":
+    # Usage: python batch.py questions.jsonl --output answers.jsonl [--concurrency 8] [--stub]
+    parser = argparse.ArgumentParser(description="Answers a JSONL file of questions through the assistant pipeline.")
+    parser.add_argument("input", help="JSONL, one question per line: a string or an object with a question field")
+    parser.add_argument("--output", required=True, help="results JSONL; also the checkpoint for resuming")
+    parser.add_argument("--field", help=f"question field (default: first of {', '.join(QUESTION_FIELDS)})")
+    parser.add_argument("--id-field", help=f"id field (default: first of {', '.join(ID_FIELDS)}, else the line number)")
+    parser.add_argument("--channel", default="messenger", choices=("web", "messenger", "telegram"),
+                        help="prompt and length limits to answer with, unless a record has its own 'channel'")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--use-cache", action="store_true", help="serve repeated questions from the response cache")
+    parser.add_argument("--provider-batch", action="store_true",
+                        help="submit through the OpenAI Batch API (AI_PROVIDER=openai) instead of concurrent calls")
+    parser.add_argument("--poll", type=float, default=30.0, help="seconds between batch status checks")
+    parser.add_argument("--stub", action="store_true", help="answer with an in-process fake provider (offline runs)")
+    parser.add_argument("--stub-latency", type=float, default=0.2)
+    parser.add_argument("--restart", action="store_true", help="discard existing results and start over")
+    parser.add_argument("--stats", help="also write the run's stats as JSON to this file")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    # One trace line per item would drown the progress reports; the stats cover it
+    os.environ.setdefault("TRACE_LOG", "off")
+    stub = use_stub(args.stub_latency, args.provider_batch) if args.stub else None
+
+    state_path = args.output + ".batch.json"
+    if args.restart:
+        for path in (args.output, state_path):
+            if os.path.exists(path):
+                os.remove(path)
+    log = ResultLog(args.output)
+    if log.done or log.dropped:
+        logger.info(f"Resuming: {len(log.done)} answered items skipped, {log.dropped} failed or torn results to redo")
+    stats = BatchStats(skipped=len(log.done))
+    runner = BatchRunner(log, stats, args.channel, args.use_cache, args.concurrency)
+    items = read_inputs(args.input, args.field, args.id_field, log.done)
+
+    try:
+        if args.provider_batch:
+            if runner.core.PRIMARY_PROVIDER != "openai":
+                raise SystemExit("--provider-batch is only available for AI_PROVIDER=openai")
+            runner.run_openai_batch(items, state_path, args.poll)
+        else:
+            asyncio.run(runner.run(items))
+    except KeyboardInterrupt:
+        print(f"Interrupted; run the same command again to resume from {args.output}")
+        sys.exit(130)
+    finally:
+        log.close()
+        if stub:
+            stub.shutdown()
+
+    result = stats.as_dict()
+    router = runner.core.PROVIDER_ROUTER.stats()
+    result["providers"] = {
+        "fallbacks": router["fallbacks"],
+        "hedges": router["hedges"],
+        **{name: {"circuit": info["circuit"], "calls": info["latency"]["count"], "errors": info["latency"]["errors"]}
+           for name, info in router["providers"].items()}
+    }
+    logger.info(f"Done: {stats.summary()}")
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if args.stats:
+        with open(args.stats, "w") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
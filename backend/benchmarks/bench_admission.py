@@ -0,0 +1,135 @@
+"""
+Admission control and fair queueing against a stub Ollama that runs only a few
+generations at once.
+
+Run from the backend directory:
+    python -m benchmarks.bench_admission --chats 4 --burst 10 --web-users 6
+
+--chats Telegram chats each fire --burst distinct questions at once (Telegram
+workers are threads). Shortly after, --web-users authenticated web users ask
+one question each, --web-interval seconds apart, through the async /chat path.
+The stub answers --parallel generations at a time, --latency seconds each, and
+queues the rest, like a local Ollama container.
+
+Each round is run with ADMISSION off and on. Off, every request goes straight
+to the engine, and web users wait behind the whole Telegram burst. On, the
+backend keeps at most --parallel generations in flight, serves web users ahead
+of the queued Telegram messages (weighted round-robin) and answers the excess
+of the burst at once with the busy reply. The report has per-channel latency,
+busy replies and the admission queue wait.
+"""
+import os
+import sys
+import time
+import json
+import asyncio
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_ollama import start_fake_ollama
+from benchmarks.bench_suite import git_commit, percentile
+
+
+def summarize(samples):
+    latencies = [latency for latency, busy in samples if not busy]
+    return {
+        "requests": len(samples),
+        "answered": len(latencies),
+        "busy": sum(1 for _, busy in samples if busy),
+        "p50_s": round(percentile(latencies, 0.5), 3) if latencies else None,
+        "p95_s": round(percentile(latencies, 0.95), 3) if latencies else None,
+        "max_s": round(max(latencies), 3) if latencies else None
+    }
+
+
+async def round_trip(core, args, label):
+    """
+    One Telegram burst plus the web users; returns {channel: [(latency, busy), ...]}.
+    """
+    samples = {"telegram": [], "web": []}
+    loop = asyncio.get_running_loop()
+
+    def telegram_caller(chat, i):
+        started = time.perf_counter()
+        reply = core.get_ai_response(f"{label} chat {chat} question {i}", use_cache=False,
+                                     channel="telegram", user=f"{label}-{chat}")
+        samples["telegram"].append((time.perf_counter() - started, reply == core.BUSY_REPLY))
+
+    async def web_caller(i):
+        await asyncio.sleep(args.web_delay + i * args.web_interval)
+        started = time.perf_counter()
+        reply = await core.get_ai_response_async(f"{label} web question {i}", use_cache=False,
+                                                 channel="web", user=f"{label}-user-{i}")
+        samples["web"].append((time.perf_counter() - started, reply == core.BUSY_REPLY))
+
+    threads = [threading.Thread(target=telegram_caller, args=(chat, i))
+               for chat in range(args.chats) for i in range(args.burst)]
+    for thread in threads:
+        thread.start()
+    await asyncio.gather(*(web_caller(i) for i in range(args.web_users)))
+    await loop.run_in_executor(None, lambda: [thread.join() for thread in threads])
+    return samples
+
+
+def queue_wait(core):
+    """
+    Mean admission queue wait (s) per channel, from the metrics histogram.
+    """
+    series = core.ADMISSION_WAIT_SECONDS._series
+    return {
+        channel: round(values[-1] / sum(values[:-1]), 3)
+        for (provider, channel), values in series.items() if sum(values[:-1])
+    }
+
+
+async def main(args):
+    stub, url = start_fake_ollama(latency=args.latency, token_interval=0.0, parallel=args.parallel)
+    os.environ.update({
+        "OLLAMA_URL": url, "AI_PROVIDER": "local", "RESPONSE_CACHE": "off", "OLLAMA_WARMUP": "off",
+        "SINGLE_FLIGHT": "off", "ADMISSION_CONCURRENCY": f"local={args.parallel}",
+        "ADMISSION_MAX_WAIT": str(args.max_wait)
+    })
+    import core
+
+    results = {}
+    print(f"{args.chats} Telegram chats x {args.burst} messages, then {args.web_users} web users; "
+          f"stub runs {args.parallel} generations at a time, {args.latency:.2f} s each")
+    print(f"{'admission':<10} {'channel':<9} {'answered':>8} {'busy':>5} {'p50 s':>7} {'p95 s':>7} {'max s':>7}")
+    for enabled in (False, True):
+        core.ADMISSION.enabled = enabled
+        label = "on" if enabled else "off"
+        started = time.perf_counter()
+        samples = await round_trip(core, args, label)
+        row = {channel: summarize(values) for channel, values in samples.items()}
+        row["wall_s"] = round(time.perf_counter() - started, 3)
+        results[label] = row
+        for channel in ("web", "telegram"):
+            stats = row[channel]
+            print(f"{label:<10} {channel:<9} {stats['answered']:>8} {stats['busy']:>5} "
+                  + " ".join(f"{stats[k]:>7.2f}" if stats[k] is not None else f"{'-':>7}" for k in ("p50_s", "p95_s", "max_s")))
+    results["queue_wait_s"] = queue_wait(core)
+    results["stats"] = core.ADMISSION.stats()
+    print(f"mean admission queue wait: {results['queue_wait_s']}, shed: {results['stats']['rejected']}")
+
+    stub.shutdown()
+    await core.close_http_clients()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"commit": git_commit(), "config": vars(args), **results}, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=4)
+    parser.add_argument("--burst", type=int, default=10, help="questions each Telegram chat sends at once")
+    parser.add_argument("--web-users", type=int, default=6)
+    parser.add_argument("--web-delay", type=float, default=0.2, help="seconds after the burst the first web user asks")
+    parser.add_argument("--web-interval", type=float, default=0.3)
+    parser.add_argument("--parallel", type=int, default=2, help="generations the stub runs at once")
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds the stub takes per generation")
+    parser.add_argument("--max-wait", type=float, default=5.0, help="ADMISSION_MAX_WAIT for the run")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,87 @@
+"""
+Microbenchmark of per-request authentication overhead in get_current_user.
+
+Run from the backend directory:
+    python -m benchmarks.bench_auth --latency 0.15 --requests 200
+
+Compares the Supabase round-trip (simulated with a fixed latency), local JWT
+verification, and the token -> user cache.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SECRET = "bench-jwt-secret-with-at-least-32-bytes"
+
+
+class StubSupabaseAuth:
+    """
+    Stands in for supabase.auth: answers get_user after `latency` seconds.
+    """
+
+    def __init__(self, latency, claims):
+        self.latency = latency
+        self.claims = claims
+
+    def get_user(self, token):
+        time.sleep(self.latency)
+        return SimpleNamespace(user=SimpleNamespace(id=self.claims["sub"], email=self.claims["email"]))
+
+
+def measure(label, requests, call):
+    started = time.perf_counter()
+    for _ in range(requests):
+        call()
+    per_request = (time.perf_counter() - started) / requests
+    print(f"{label:<28} {per_request * 1000:>10.3f} ms/request")
+    return per_request
+
+
+def main(args):
+    import jwt
+    import server
+    from fastapi.security import HTTPAuthorizationCredentials
+    from db.database import Base, engine, SessionLocal
+
+    Base.metadata.create_all(bind=engine)
+    claims = {"sub": "bench-user", "email": "bench@example.com", "aud": "authenticated", "exp": int(time.time()) + 3600}
+    token = jwt.encode(claims, SECRET, algorithm="HS256")
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    server.supabase = SimpleNamespace(auth=StubSupabaseAuth(args.latency, claims))
+    db = SessionLocal()
+
+    def remote_uncached():
+        server.user_cache.clear()
+        server.get_current_user(credentials, db)
+
+    def local_uncached():
+        server.user_cache.clear()
+        server.get_current_user(credentials, db)
+
+    def cached():
+        server.get_current_user(credentials, db)
+
+    print(f"{'mode':<28} {'overhead':>10}")
+    server.can_verify_locally = lambda: False
+    before = measure("supabase get_user + select", args.requests, remote_uncached)
+    server.can_verify_locally = lambda: True
+    measure("local JWT + select", args.requests, local_uncached)
+    after = measure("local JWT + user cache", args.requests, cached)
+    print(f"speed-up: {before / after:.0f}x")
+    db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.15, help="simulated Supabase get_user latency in seconds")
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ["SUPABASE_JWT_SECRET"] = SECRET
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+    main(args)
@@ -0,0 +1,70 @@
+"""
+Load benchmark for POST /chat against a local fake Ollama provider.
+
+Run from the backend directory:
+    python -m benchmarks.bench_chat_concurrency --latency 0.2 --levels 1 4 16 32
+
+With the async provider layer, throughput should grow roughly linearly with
+the number of in-flight requests (about levels / latency requests per second).
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_ollama import start_fake_ollama
+
+
+async def run_level(client, concurrency, rounds):
+    async def worker():
+        for _ in range(rounds):
+            response = await client.post("/chat", json={"message": "Docker install လုပ်နည်း"})
+            response.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return concurrency * rounds / elapsed
+
+
+async def main(args):
+    import httpx
+    import server
+    from db.database import Base, engine, SessionLocal
+    from db.models import User
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    user = db.get(User, "bench-user") or User(id="bench-user", email="bench@example.com")
+    db.merge(user)
+    db.commit()
+    db.close()
+    server.app.dependency_overrides[server.get_current_user] = lambda: User(id="bench-user", email="bench@example.com")
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        print(f"{'in-flight':>10} {'req/s':>10} {'ideal':>10}")
+        for level in args.levels:
+            throughput = await run_level(client, level, args.rounds)
+            print(f"{level:>10} {throughput:>10.1f} {level / args.latency:>10.1f}")
+    await server.close_http_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.2, help="fake provider latency in seconds")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--rounds", type=int, default=3, help="requests per in-flight slot")
+    args = parser.parse_args()
+
+    _, base_url = start_fake_ollama(latency=args.latency)
+    os.environ["AI_PROVIDER"] = "local"
+    os.environ["OLLAMA_URL"] = base_url
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+    # Every request generates: no busy replies, cache hits or coalesced identical questions
+    os.environ.update({"ADMISSION": "off", "RESPONSE_CACHE": "off", "SINGLE_FLIGHT": "off", "OLLAMA_WARMUP": "off"})
+    asyncio.run(main(args))
@@ -0,0 +1,103 @@
+"""
+Counts DB round-trips per POST /chat with write-behind persistence on and off.
+
+Run from the backend directory:
+    python -m benchmarks.bench_chat_persistence --requests 200
+
+A round-trip is one statement sent to the database (including COMMIT). With
+write-behind, warm requests make none on the request path; the buffered
+messages are written by one bulk insert per batch.
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_ollama import start_fake_ollama
+
+
+class RoundTripCounter:
+    """
+    Counts statements and commits, split into request path and the background writer.
+    """
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        self.background = 0
+        event.listen(engine, "before_cursor_execute", self._statement)
+        event.listen(engine, "commit", self._statement)
+
+    def _statement(self, *args, **kwargs):
+        if threading.current_thread().name == "chat-write-buffer":
+            self.background += 1
+        else:
+            self.count += 1
+
+
+def run(client, requests, users):
+    started = time.perf_counter()
+    for i in range(requests):
+        response = client.post("/chat", json={"message": f"question {i}", "no_cache": True}, headers={"X-User": f"user-{i % users}"})
+        response.raise_for_status()
+    return time.perf_counter() - started
+
+
+def main(args):
+    import server
+    from fastapi import Request
+    from fastapi.testclient import TestClient
+    from db.database import Base, engine, SessionLocal
+    from db.models import User, DbChatMessage
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    for u in range(args.users):
+        db.merge(User(id=f"user-{u}", email=f"user-{u}@example.com"))
+    db.commit()
+    db.close()
+
+    def bench_user(request: Request):
+        return User(id=request.headers["X-User"], email="bench@example.com")
+
+    server.app.dependency_overrides[server.get_current_user] = bench_user
+    counter = RoundTripCounter(engine)
+
+    print(f"{'mode':<14} {'request path':>13} {'background':>11} {'ms/chat':>9}   (DB round-trips per chat)")
+    with TestClient(server.app) as client:
+        for write_behind in (False, True):
+            server.chat_writer.stop()
+            server.chat_writer.write_behind = write_behind
+            server.chat_writer.start()
+            server.active_sessions._data.clear()
+            run(client, args.users, args.users) # warm the session/memory caches
+            server.chat_writer.flush()
+            counter.count = counter.background = 0
+            elapsed = run(client, args.requests, args.users)
+            server.chat_writer.stop() # drain from the writer's point of view
+            server.chat_writer.start()
+            label = "write-behind" if write_behind else "write-through"
+            print(f"{label:<14} {counter.count / args.requests:>13.2f} {counter.background / args.requests:>11.2f} {elapsed / args.requests * 1000:>9.2f}")
+
+    db = SessionLocal()
+    print(f"messages stored: {db.query(DbChatMessage).count()}")
+    db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--users", type=int, default=10)
+    args = parser.parse_args()
+
+    _, base_url = start_fake_ollama(latency=0.0)
+    os.environ["AI_PROVIDER"] = "local"
+    os.environ["OLLAMA_URL"] = base_url
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+    # Every request is answered and persisted, none shed with a busy reply
+    os.environ.update({"ADMISSION": "off", "OLLAMA_WARMUP": "off"})
+    main(args)
@@ -0,0 +1,115 @@
+"""
+Import time and cold start of the backend.
+
+Run from the backend directory:
+    python -m benchmarks.bench_cold_start --runs 5
+
+Measures, each in fresh interpreters (median of --runs):
+  * import time of the entry modules: server (API) and main's imports
+    (Telegram polling), plus server with the provider SDKs and pgvector
+    imported up front, which is what every start used to pay;
+  * cold start to the first served request: from launching run.py to the
+    first answered request, then the first and second authenticated /chat
+    against fake Supabase and Ollama. The first /chat includes the lazy
+    import of the Supabase client.
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+import statistics
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import fakes
+from benchmarks.bench_suite import BACKEND_DIR, backend_environment, free_port, git_commit, user_token
+
+IMPORTS = {
+    "server": "import server",
+    "telegram (main.py)": "import telegram_runtime, core",
+    "server + SDKs up front": "import google.generativeai, openai, supabase, pgvector.sqlalchemy, server",
+}
+
+
+def import_seconds(statement, env):
+    code = f"import time; started = time.perf_counter(); {statement}; print(time.perf_counter() - started)"
+    result = subprocess.run([sys.executable, "-W", "ignore", "-c", code], cwd=BACKEND_DIR, env=env,
+                            capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def cold_start(env, workdir):
+    """
+    Returns seconds from launch to the first answered request, and of the first two /chat calls.
+    """
+    import httpx
+
+    port = free_port()
+    env = dict(env, TELEGRAM_WEBHOOK_URL=f"http://127.0.0.1:{port}/telegram/webhook")
+    with open(os.path.join(workdir, "backend.log"), "a") as log_file:
+        launched = time.perf_counter()
+        process = subprocess.Popen([sys.executable, "run.py", "--host", "127.0.0.1", "--port", str(port)],
+                                   cwd=BACKEND_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError(f"Backend exited with status {process.returncode}")
+                try:
+                    if httpx.get(f"{base_url}/webhook/stats", timeout=1).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    time.sleep(0.01)
+            ready = time.perf_counter() - launched
+            chats = []
+            headers = {"Authorization": f"Bearer {user_token(0)}"}
+            for i in range(2):
+                started = time.perf_counter()
+                response = httpx.post(f"{base_url}/chat", json={"message": f"cold start {i}", "no_cache": True},
+                                      headers=headers, timeout=60)
+                response.raise_for_status()
+                chats.append(time.perf_counter() - started)
+            return ready, chats[0], chats[1]
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+def main(args):
+    started = fakes.start_all()
+    workdir = tempfile.mkdtemp()
+    env = backend_environment(started, 0, workdir, "local")
+    env["DATABASE_URL"] = f"sqlite:///{workdir}/cold.db"
+
+    results = {"imports": {}, "cold_start": {}}
+    print(f"{'import':<24} {'median s':>9} {'min s':>7}")
+    for name, statement in IMPORTS.items():
+        samples = [import_seconds(statement, env) for _ in range(args.runs)]
+        results["imports"][name] = {"median_s": round(statistics.median(samples), 3),
+                                    "min_s": round(min(samples), 3)}
+        print(f"{name:<24} {statistics.median(samples):>9.3f} {min(samples):>7.3f}")
+
+    runs = [cold_start(env, workdir) for _ in range(args.runs)]
+    for i, name in enumerate(("ready", "first_chat", "second_chat")):
+        samples = [run[i] for run in runs]
+        results["cold_start"][name] = {"median_s": round(statistics.median(samples), 3), "min_s": round(min(samples), 3)}
+    cold = results["cold_start"]
+    print(f"\ncold start: ready {cold['ready']['median_s']:.3f} s, first /chat {cold['first_chat']['median_s']:.3f} s, "
+          f"second /chat {cold['second_chat']['median_s']:.3f} s (medians of {args.runs})")
+
+    for server, _ in started.values():
+        server.shutdown()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"commit": git_commit(), "runs": args.runs, **results}, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    main(parser.parse_args())
@@ -0,0 +1,170 @@
+"""
+Chat history pagination on a seeded SQLite database.
+
+Run from the backend directory:
+    python -m benchmarks.bench_history --messages 50000 --sessions 500
+
+Seeds one user with --sessions sessions, one of which holds --messages
+messages, plus --other-users users with their own history. Then it reads the
+big session page by page at increasing depth. Each page is read two ways:
+  * keyset: `before` the last id seen, as GET /sessions/{id}/messages does;
+  * offset: LIMIT/OFFSET, the usual alternative.
+It reports the median milliseconds per page (--repeat reads); keyset times
+include rendering the page body and its ETag. Keyset pages should cost the
+same at any depth; offset pages grow with the depth. It also
+prints the query plan, page body sizes and an ETag revalidation.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_suite import git_commit
+
+SAMPLE_TEXT = [
+    "ပို့ဆောင်ခ ဘယ်လောက်ကျလဲ ခင်ဗျာ",
+    "ရန်ကုန်မြို့တွင်း အိမ်အရောက်ပို့ပေးပါတယ်ရှင့်၊ ပို့ခ ၂၀၀၀ ကျပ်ပါ။",
+    "How long does delivery to Mandalay take?",
+    "မန္တလေးကို ၂ ရက်ကနေ ၃ ရက်အတွင်း ရောက်ပါတယ်။",
+]
+
+
+def seed(args):
+    """
+    Creates the tables and bulk-inserts the history; returns (user id, big session id, its message ids).
+    """
+    from sqlalchemy import insert
+    from db.database import engine, Base
+    from db.models import User, ChatSession, DbChatMessage
+
+    Base.metadata.create_all(bind=engine)
+    started = datetime.now(timezone.utc) - timedelta(days=365)
+    rng = random.Random(7)
+    with engine.begin() as conn:
+        users = [{"id": f"user-{i:04d}", "email": f"user{i}@example.com"} for i in range(args.other_users + 1)]
+        conn.execute(insert(User), users)
+        sessions = [{"user_id": "user-0000", "title": f"Chat {i}", "created_at": started + timedelta(hours=i)}
+                    for i in range(args.sessions)]
+        sessions += [{"user_id": user["id"], "title": "Main Chat", "created_at": started} for user in users[1:]]
+        conn.execute(insert(ChatSession), sessions)
+        big_session = args.sessions # the newest session of user-0000
+
+        def messages(session_id, count):
+            return [{"session_id": session_id, "role": "user" if i % 2 == 0 else "ai",
+                     "content": rng.choice(SAMPLE_TEXT), "created_at": started + timedelta(seconds=30 * i)}
+                    for i in range(count)]
+
+        # Interleave other sessions' messages so the big session's rows are not contiguous
+        batch = 5000
+        for first in range(0, args.messages, batch):
+            conn.execute(insert(DbChatMessage), messages(big_session, min(batch, args.messages - first)))
+            others = [row for session_id in rng.sample(range(1, len(sessions) + 1), 20)
+                      for row in messages(session_id, args.other_messages // 20)]
+            conn.execute(insert(DbChatMessage), others)
+    with engine.connect() as conn:
+        ids = [row[0] for row in conn.execute(
+            DbChatMessage.__table__.select().with_only_columns(DbChatMessage.id)
+            .where(DbChatMessage.session_id == big_session).order_by(DbChatMessage.id.desc())
+        )]
+    return "user-0000", big_session, ids
+
+
+def timed_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main(args):
+    workdir = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/history.db"
+    from sqlalchemy import select, text
+    from db.database import SessionLocal
+    from db.models import DbChatMessage
+    from chat_history import session_page, message_page
+
+    started = time.perf_counter()
+    user_id, session_id, ids = seed(args)
+    print(f"seeded {len(ids)} messages in the big session, {args.sessions} sessions for the user "
+          f"in {time.perf_counter() - started:.1f} s")
+
+    db = SessionLocal()
+
+    def offset_page(offset):
+        return db.execute(
+            select(DbChatMessage.id, DbChatMessage.role, DbChatMessage.content, DbChatMessage.created_at)
+            .where(DbChatMessage.session_id == session_id)
+            .order_by(DbChatMessage.id.desc()).limit(args.limit).offset(offset)
+        ).all()
+
+    results = {"pages": {}}
+    print(f"\n{'depth':>8} {'keyset ms':>10} {'offset ms':>10}")
+    for fraction in (0, 0.1, 0.5, 0.9, 0.99):
+        depth = int(fraction * (len(ids) - args.limit))
+        before = ids[depth - 1] if depth else None
+        page = message_page(db, session_id, before, args.limit)
+        assert [item["id"] for item in reversed(page.items)] == ids[depth:depth + args.limit]
+        keyset = timed_ms(lambda: message_page(db, session_id, before, args.limit), args.repeat)
+        offset = timed_ms(lambda: offset_page(depth), args.repeat)
+        results["pages"][str(depth)] = {"keyset_ms": round(keyset, 3), "offset_ms": round(offset, 3)}
+        print(f"{depth:>8} {keyset:>10.3f} {offset:>10.3f}")
+
+    walked, before, pages = 0, None, 0
+    started = time.perf_counter()
+    while True:
+        page = message_page(db, session_id, before, args.limit)
+        walked += len(page.items)
+        pages += 1
+        if page.next is None:
+            break
+        before = page.next
+    walk = time.perf_counter() - started
+    assert walked == len(ids)
+    results["walk"] = {"pages": pages, "total_s": round(walk, 3), "ms_per_page": round(walk * 1000 / pages, 3)}
+    print(f"\nwalked all {walked} messages in {pages} pages: {walk:.2f} s ({walk * 1000 / pages:.3f} ms/page)")
+
+    sessions = timed_ms(lambda: session_page(db, user_id, None, 20), args.repeat)
+    deep_sessions = timed_ms(lambda: session_page(db, user_id, args.sessions // 10, 20), args.repeat)
+    results["sessions"] = {"first_page_ms": round(sessions, 3), "deep_page_ms": round(deep_sessions, 3)}
+    print(f"session list: first page {sessions:.3f} ms, deep page {deep_sessions:.3f} ms")
+
+    plan = db.execute(text(
+        "EXPLAIN QUERY PLAN SELECT id, role, content, created_at FROM chat_messages "
+        "WHERE session_id = :session AND id < :before ORDER BY id DESC LIMIT 51"
+    ), {"session": session_id, "before": ids[len(ids) // 2]}).all()
+    results["query_plan"] = [row[-1] for row in plan]
+    print(f"query plan: {'; '.join(results['query_plan'])}")
+
+    page = message_page(db, session_id, None, args.limit)
+    results["body_bytes"] = len(page.body)
+    results["etag_revalidates"] = page.matches(message_page(db, session_id, None, args.limit).etag)
+    print(f"page body: {len(page.body)} bytes for {len(page.items)} messages; "
+          f"unchanged page revalidates with 304: {results['etag_revalidates']}")
+    db.close()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"commit": git_commit(), "config": vars(args), **results}, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=50000, help="messages in the big session")
+    parser.add_argument("--sessions", type=int, default=500, help="sessions of the paging user")
+    parser.add_argument("--other-users", type=int, default=200)
+    parser.add_argument("--other-messages", type=int, default=20000, help="other sessions' messages per 5000 of the big session's")
+    parser.add_argument("--limit", type=int, default=50, help="messages per page")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    main(parser.parse_args())
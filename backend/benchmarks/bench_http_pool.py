@@ -0,0 +1,89 @@
+"""
+Connection-setup cost per outbound message: a fresh connection per call
+(module-level requests.post, as before) against the shared keep-alive pool.
+
+Run from the backend directory:
+    python -m benchmarks.bench_http_pool --messages 500 --handshake 0.02
+
+The stub answers immediately, so the difference is connection setup only.
+Localhost TCP setup is nearly free; --handshake adds a fixed delay to every
+new connection to stand in for network round-trips and the TLS handshake
+to a remote API (Graph, Telegram, a remote Ollama host).
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_ollama import FakeServer, start_fake_ollama
+
+
+class HandshakeServer(FakeServer):
+    """
+    Fake Ollama that charges `handshake` seconds for every new connection.
+    """
+    handshake = 0.0
+
+    def get_request(self):
+        request = super().get_request()
+        time.sleep(self.handshake)
+        return request
+
+
+def report(label, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{label:<26} {statistics.mean(samples) * 1000:>9.3f} {samples[len(samples) // 2] * 1000:>9.3f} {p95 * 1000:>9.3f}")
+    return statistics.mean(samples)
+
+
+def main(args):
+    import requests
+    from http_pool import HttpPool
+
+    HandshakeServer.handshake = args.handshake
+    stub, url = start_fake_ollama(latency=0.0, server_class=HandshakeServer)
+    endpoint = f"{url}/api/generate"
+    payload = {"model": "bench", "prompt": "hello", "stream": False}
+    pool = HttpPool()
+
+    def timed(call):
+        samples = []
+        for _ in range(args.messages):
+            started = time.perf_counter()
+            call().raise_for_status()
+            samples.append(time.perf_counter() - started)
+        return samples
+
+    print(f"{'mode':<26} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    fresh = report("requests.post (fresh)", timed(lambda: requests.post(endpoint, json=payload, timeout=10)))
+    pooled = report("HttpPool.request", timed(lambda: pool.request("ollama", "POST", endpoint, json=payload)))
+
+    async def run_async():
+        samples = []
+        for _ in range(args.messages):
+            started = time.perf_counter()
+            (await pool.arequest("ollama", "POST", endpoint, json=payload)).raise_for_status()
+            samples.append(time.perf_counter() - started)
+        await pool.aclose()
+        return samples
+
+    report("HttpPool.arequest", asyncio.run(run_async()))
+
+    stats = pool.stats()["destinations"]["ollama"]
+    print(f"connections opened by the pool: {stats['connections_opened']} for {stats['requests']} requests "
+          f"(fresh mode: {args.messages})")
+    print(f"saved per message: {(fresh - pooled) * 1000:.3f} ms")
+    pool.close()
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--handshake", type=float, default=0.0, help="simulated cost of opening a connection, in seconds")
+    main(parser.parse_args())
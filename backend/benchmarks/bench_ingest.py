@@ -0,0 +1,135 @@
+"""
+Throughput and peak memory of ingest.py on a synthetic Facebook page export.
+
+Run from the backend directory:
+    python -m benchmarks.bench_ingest --posts 200000 --duplicates 0.2 --zawgyi 0.3
+
+The export is written as a {"data": [...]} JSON file (or NDJSON with --ndjson)
+with a share of exact and near duplicates (case/punctuation changes) and of
+posts typed in Zawgyi. The ingestion runs in a child process, so its peak RSS
+(VmHWM) is its own; it should stay flat as --posts grows, unlike json.load of
+the same file, which is measured the same way for comparison.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_scaling import VOCABULARY
+from benchmarks.bench_suite import git_commit
+
+# Zawgyi spellings (with the Unicode they convert to) of common shop words
+ZAWGYI_WORDS = ["ေစ်းႏႈန္း", "ပို႔ေဆာင္ခ", "ဆိုင္ခြဲ", "ဖြင့္ခ်ိန္", "ဖုန္းနံပါတ္", "ေက်းဇူးတင္ပါတယ္"]
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+INGEST = """
+import sys, json
+from ingest import Checkpoint, IndexSink, ingest
+source, output = sys.argv[1:3]
+checkpoint = Checkpoint(output + ".checkpoint.json")
+sink = IndexSink(output)
+stats = ingest([source], sink, checkpoint, batch_size=int(sys.argv[3]), progress_interval=3600)
+sink.close()
+print(json.dumps(stats.as_dict()))
+"""
+
+LOAD = """
+import sys, json
+with open(sys.argv[1], encoding="utf-8") as f:
+    posts = json.load(f)
+print(json.dumps({"records": len(posts["data"] if isinstance(posts, dict) else posts)}))
+"""
+
+
+def write_export(path, posts, duplicates, zawgyi, ndjson, seed=7):
+    rng = random.Random(seed)
+    written = []
+    with open(path, "w", encoding="utf-8") as f:
+        if not ndjson:
+            f.write('{"data": [\n')
+        for i in range(posts):
+            if written and rng.random() < duplicates:
+                text = rng.choice(written)
+                if rng.random() < 0.5:
+                    text = text.upper() + "!"
+            else:
+                words = rng.choices(VOCABULARY, k=rng.randint(40, 200))
+                if rng.random() < zawgyi:
+                    words = [rng.choice(ZAWGYI_WORDS) if rng.random() < 0.5 else word for word in words
+                             if not "က" <= word[0] <= "႟"]
+                text = " ".join(words)
+                written.append(text)
+            record = json.dumps({"id": f"page_{i}", "message": text, "created_time": "2024-01-01T00:00:00+0000"},
+                                ensure_ascii=False)
+            if ndjson:
+                f.write(record + "\n")
+            else:
+                f.write(("" if i == 0 else ",\n") + record)
+        if not ndjson:
+            f.write('\n], "paging": {}}\n')
+
+
+def run_child(code, *args):
+    """
+    Runs code in a fresh interpreter; returns (its JSON output, wall seconds, peak RSS MiB).
+    """
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-c", code, *map(str, args)], cwd=BACKEND,
+                               stdout=subprocess.PIPE, text=True)
+    peak = 0
+    while process.poll() is None:
+        try:
+            with open(f"/proc/{process.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        peak = max(peak, int(line.split()[1]))
+        except OSError:
+            pass
+        time.sleep(0.05)
+    output = process.stdout.read()
+    if process.returncode:
+        raise RuntimeError(f"child failed with exit code {process.returncode}")
+    return json.loads(output.strip().splitlines()[-1]), time.perf_counter() - started, peak / 1024
+
+
+def main(args):
+    workdir = tempfile.mkdtemp()
+    source = os.path.join(workdir, "export.ndjson" if args.ndjson else "export.json")
+    write_export(source, args.posts, args.duplicates, args.zawgyi, args.ndjson)
+    size = os.path.getsize(source)
+    print(f"export: {args.posts} posts, {size / 1e6:.1f} MB ({'ndjson' if args.ndjson else 'json'})")
+
+    stats, wall, peak = run_child(INGEST, source, os.path.join(workdir, "posts.ndjson"), args.batch)
+    print(f"ingest:    {wall:6.2f} s  {stats['records_per_s']:>9.0f} records/s  {stats['mb_per_s']:6.2f} MB/s  "
+          f"peak rss {peak:7.1f} MiB")
+    print(f"           {stats['posts']} posts, {stats['chunks']} chunks, {stats['duplicates']} duplicates, "
+          f"{stats['zawgyi']} converted from Zawgyi")
+    results = {"ingest": {"wall_s": round(wall, 3), "peak_rss_mb": round(peak, 1), **stats}}
+
+    if not args.ndjson:
+        _, wall, peak = run_child(LOAD, source)
+        print(f"json.load: {wall:6.2f} s  (parse only)                          peak rss {peak:7.1f} MiB")
+        results["json_load"] = {"wall_s": round(wall, 3), "peak_rss_mb": round(peak, 1)}
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"commit": git_commit(), "config": vars(args), "export_bytes": size, **results}, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=100000)
+    parser.add_argument("--duplicates", type=float, default=0.2, help="share of posts repeating an earlier one")
+    parser.add_argument("--zawgyi", type=float, default=0.3, help="share of posts typed in Zawgyi")
+    parser.add_argument("--ndjson", action="store_true", help="write the export as NDJSON")
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    main(parser.parse_args())
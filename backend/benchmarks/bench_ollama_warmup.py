@@ -0,0 +1,56 @@
+"""
+First-request latency of the local model with and without the engine manager.
+
+Run from the backend directory:
+    python -m benchmarks.bench_ollama_warmup --load 2.0 --requests 5
+
+The stub Ollama charges --load seconds whenever the model is not in memory.
+"cold" is the old behaviour: no warm-up and keep_alive 0 standing in for the
+model being evicted between idle users. "warm" warms at startup and pins the
+model with keep_alive -1.
+"""
+import os
+import sys
+import time
+import argparse
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_ollama import start_fake_ollama
+
+
+def run(label, args, keep_alive, warm):
+    import core
+    from ollama_engine import OllamaEngine
+
+    stub, url = start_fake_ollama(latency=args.latency, load_latency=args.load)
+    engine = OllamaEngine(url, "bench-model", core.HTTP_POOL, keep_alive=keep_alive)
+    core.OLLAMA_ENGINE = engine
+    if warm:
+        started = time.perf_counter()
+        engine.warm_up(attempts=1)
+        print(f"{label:<6} warm-up at startup: {time.perf_counter() - started:.3f} s")
+
+    latencies = []
+    for _ in range(args.requests):
+        started = time.perf_counter()
+        core.ask_ollama("hello", "You are a helpful assistant.")
+        latencies.append(time.perf_counter() - started)
+    stats = engine.stats()
+    print(f"{label:<6} first request {latencies[0]:.3f} s, later mean {sum(latencies[1:]) / max(1, len(latencies) - 1):.3f} s, "
+          f"cold loads {stats['cold_loads']}/{stats['generations']}")
+    print(f"{'':<6} options sent: {stub.payloads[-1]['options']}, keep_alive {stub.payloads[-1]['keep_alive']}")
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--load", type=float, default=2.0, help="simulated model load time in seconds")
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated generation time in seconds")
+    parser.add_argument("--requests", type=int, default=5)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    run("cold", args, keep_alive=0, warm=False)
+    run("warm", args, keep_alive=-1, warm=True)
@@ -0,0 +1,104 @@
+"""
+Throughput of the API as run.py --workers grows, for a CPU-bound pipeline.
+
+Run from the backend directory:
+    python -m benchmarks.bench_scaling --workers 1 2 4 --posts 5000 --requests 600
+
+The model APIs answer instantly, so each request is dominated by work done in
+the backend itself: BM25 retrieval over a synthetic --posts corpus, prompt
+assembly and JSON handling. One worker process is bound by the GIL to one core;
+N workers should scale close to N times up to the number of cores. The default
+scenario is the Messenger webhook, which writes nothing to the app database,
+so SQLite locking does not mask the scaling; --scenario chat includes it.
+
+Speed-up is reported against the first --workers value. Expect it to flatten
+once the worker count exceeds the cores available (printed at the start).
+"""
+import os
+import sys
+import json
+import random
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import fakes
+from benchmarks.bench_suite import backend_environment, free_port, git_commit, process_memory, run_scenario, start_backend
+
+VOCABULARY = (
+    "order delivery price shipping return payment warranty size colour stock discount branch opening hours "
+    "contact phone address service repair install account refund "
+    "မင်္ဂလာပါ ဈေးနှုန်း ပို့ဆောင်ခ ငွေပေးချေမှု အာမခံ ဆိုင်ခွဲ ဖွင့်ချိန် ဖုန်းနံပါတ် လိပ်စာ ဝန်ဆောင်မှု"
+).split()
+
+
+def write_corpus(path, posts, seed=7):
+    """
+    Synthetic posts.json: posts of 40-120 words drawn from a shop's vocabulary.
+    """
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([{"content": " ".join(rng.choices(VOCABULARY, k=rng.randint(40, 120)))} for _ in range(posts)],
+                  f, ensure_ascii=False)
+
+
+def main(args):
+    started = fakes.start_all()
+    fake_servers = {name: server for name, (server, _) in started.items()}
+    workdir = tempfile.mkdtemp()
+    posts_path = os.path.join(workdir, "posts.json")
+    write_corpus(posts_path, args.posts)
+    print(f"cpu cores available: {len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()}, "
+          f"corpus: {args.posts} posts, scenario: {args.scenario}, concurrency {args.concurrency}")
+    print(f"{'workers':>7} {'rps':>9} {'speed-up':>9} {'efficiency':>10} {'p50 ms':>9} {'p95 ms':>9} {'errors':>6} {'rss MiB':>8}")
+
+    results = []
+    baseline = None
+    for workers in args.workers:
+        port = free_port()
+        env = backend_environment(started, port, os.path.join(workdir), "local")
+        env.update({"POSTS_PATH": posts_path, "RESPONSE_CACHE": "off",
+                    "SHARED_STATE_PATH": os.path.join(workdir, f"shared_state_{workers}.db"),
+                    "DATABASE_URL": f"sqlite:///{workdir}/bench_{workers}.db"})
+        with open(os.path.join(workdir, f"backend_{workers}.log"), "w") as log_file:
+            backend = start_backend(env, port, log_file, workers)
+            try:
+                scenario = asyncio.run(run_scenario(args.scenario, args, f"http://127.0.0.1:{port}", fake_servers, workers))
+                memory = process_memory(backend.pid)
+            finally:
+                backend.terminate()
+                backend.wait(timeout=30)
+
+        rps = scenario["throughput_rps"] or 0
+        baseline = baseline or (rps, workers)
+        speedup = rps / baseline[0] if baseline[0] else 0
+        efficiency = speedup / (workers / baseline[1])
+        print(f"{workers:>7} {rps:>9.1f} {speedup:>8.2f}x {efficiency:>10.0%} {scenario['p50_ms'] or 0:>9.2f} "
+              f"{scenario['p95_ms'] or 0:>9.2f} {scenario['errors']:>6} {memory.get('rss_mb', 0):>8.1f}")
+        results.append({"workers": workers, "speedup": round(speedup, 3), "efficiency": round(efficiency, 3),
+                        "memory": memory, **scenario})
+
+    for server in fake_servers.values():
+        server.shutdown()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"commit": git_commit(), "config": {"scenario": args.scenario, "posts": args.posts,
+                       "concurrency": args.concurrency, "requests": args.requests}, "runs": results}, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--scenario", choices=("webhook", "chat"), default="webhook")
+    parser.add_argument("--posts", type=int, default=5000, help="size of the synthetic retrieval corpus")
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+    args.cache = False
+    main(args)
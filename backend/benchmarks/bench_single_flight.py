@@ -0,0 +1,127 @@
+"""
+Request coalescing (single flight) against a slow stub Ollama.
+
+Run from the backend directory:
+    python -m benchmarks.bench_single_flight --callers 50 --latency 1.0
+
+A burst of --callers identical questions arrives at once, as when a post goes
+viral: half through the async path (FastAPI handlers, including streaming),
+half from plain threads (Telegram workers). Each round is run with
+SINGLE_FLIGHT on and off and reports the generations the stub received, the
+burst's wall time and the per-caller latency. Coalescing should cut the
+generations to one and the wall time to about one --latency.
+
+It also checks that a leader cancelled mid-generation (client disconnect)
+does not strand its followers: they start a new flight and still get a reply.
+"""
+import os
+import sys
+import time
+import json
+import asyncio
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_ollama import start_fake_ollama
+from benchmarks.bench_suite import git_commit, percentile
+
+QUESTION = "ပို့ဆောင်ခဘယ်လောက်လဲ How much is delivery to Mandalay?"
+
+
+def generations(stub):
+    return sum(1 for payload in stub.payloads if payload.get("prompt"))
+
+
+async def burst(core, callers, channel="messenger"):
+    """
+    Fires `callers` identical questions at once; returns per-caller latencies (s) and replies.
+    """
+    latencies, replies = [], []
+    loop = asyncio.get_running_loop()
+
+    def thread_caller():
+        started = time.perf_counter()
+        reply = core.get_ai_response(QUESTION, use_cache=False, channel=channel)
+        latencies.append(time.perf_counter() - started)
+        replies.append(reply)
+
+    async def async_caller():
+        started = time.perf_counter()
+        reply = await core.get_ai_response_async(QUESTION, use_cache=False, channel=channel)
+        latencies.append(time.perf_counter() - started)
+        replies.append(reply)
+
+    async def stream_caller():
+        started = time.perf_counter()
+        reply = "".join([token async for token in core.get_ai_response_stream(QUESTION, use_cache=False, channel=channel)])
+        latencies.append(time.perf_counter() - started)
+        replies.append(reply)
+
+    threads = [threading.Thread(target=thread_caller) for _ in range(callers // 2)]
+    for thread in threads:
+        thread.start()
+    tasks = [async_caller() if i % 2 else stream_caller() for i in range(callers - len(threads))]
+    await asyncio.gather(*tasks)
+    await loop.run_in_executor(None, lambda: [thread.join() for thread in threads])
+    return latencies, replies
+
+
+async def cancelled_leader(core, latency):
+    """
+    Cancels the leading request halfway; returns what its followers got.
+    """
+    leader = asyncio.ensure_future(core.get_ai_response_async(QUESTION, use_cache=False))
+    await asyncio.sleep(0.05)
+    followers = [asyncio.ensure_future(core.get_ai_response_async(QUESTION, use_cache=False)) for _ in range(5)]
+    await asyncio.sleep(latency / 2)
+    leader.cancel()
+    replies = await asyncio.gather(*followers)
+    return replies
+
+
+async def main(args):
+    stub, url = start_fake_ollama(latency=args.latency, token_interval=0.0)
+    os.environ.update({"OLLAMA_URL": url, "AI_PROVIDER": "local", "RESPONSE_CACHE": "off", "OLLAMA_WARMUP": "off"})
+    import core
+
+    results = {}
+    print(f"{args.callers} identical questions, stub latency {args.latency:.2f} s")
+    print(f"{'single flight':<14} {'generations':>11} {'wall s':>8} {'p50 s':>8} {'p95 s':>8} {'errors':>6}")
+    for enabled in (False, True):
+        core.SINGLE_FLIGHT.enabled = enabled
+        before = generations(stub)
+        started = time.perf_counter()
+        latencies, replies = await burst(core, args.callers)
+        wall = time.perf_counter() - started
+        errors = sum(1 for reply in replies if core.is_error_reply(reply))
+        row = {"generations": generations(stub) - before, "wall_s": round(wall, 3),
+               "p50_s": round(percentile(latencies, 0.5), 3), "p95_s": round(percentile(latencies, 0.95), 3),
+               "errors": errors, "distinct_replies": len(set(replies))}
+        results["on" if enabled else "off"] = row
+        print(f"{'on' if enabled else 'off':<14} {row['generations']:>11} {row['wall_s']:>8.2f} {row['p50_s']:>8.2f} "
+              f"{row['p95_s']:>8.2f} {row['errors']:>6}")
+    results["stats"] = core.SINGLE_FLIGHT.stats()
+    print(f"saved generations: {results['off']['generations'] - results['on']['generations']}, stats: {results['stats']}")
+
+    replies = await cancelled_leader(core, args.latency)
+    ok = all(not core.is_error_reply(reply) for reply in replies)
+    results["cancelled_leader_followers_ok"] = ok
+    print(f"cancelled leader: {len(replies)} followers {'all answered' if ok else 'FAILED'} "
+          f"(abandoned flights: {core.SINGLE_FLIGHT.stats()['abandoned']})")
+
+    stub.shutdown()
+    await core.close_http_clients()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"commit": git_commit(), "config": vars(args), **results}, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--callers", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=1.0, help="seconds the stub takes per generation")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    asyncio.run(main(parser.parse_args()))
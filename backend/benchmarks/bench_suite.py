@@ -0,0 +1,406 @@
+"""
+End-to-end load test of the backend against local fakes of every external service.
+
+Run from the backend directory:
+    python -m benchmarks.bench_suite --concurrency 16 --requests 400 --output results.json
+    python -m benchmarks.bench_suite --output new.json --compare results.json
+
+The backend runs as a separate uvicorn process (as in production) with Ollama,
+the OpenAI-compatible API, Supabase auth, Telegram and the Graph API replaced
+by the fakes in benchmarks/fakes.py. Scenarios:
+
+    chat         POST /chat, latency to the full JSON reply
+    chat_stream  POST /chat/stream, time to first token and to the last line
+    webhook      POST /webhook, latency until the fake Graph API receives the reply
+    telegram     POST /telegram/webhook, latency until the fake Telegram receives sendMessage
+
+Each scenario keeps --concurrency requests in flight. The report has p50/p95/p99
+latency, throughput and errors per scenario, plus the server's RSS after the
+scenario and its peak (summed over the workers with --workers). --output writes the results as JSON, tagged with the
+git commit; --compare prints the change against an earlier file and exits with
+status 1 if a latency or throughput figure regressed by more than --threshold.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import statistics
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks import fakes
+
+SCENARIOS = ("chat", "chat_stream", "webhook", "telegram")
+# Compared figures: 1 if an increase is a regression, -1 if a decrease is
+COMPARED = {"p50_ms": 1, "p95_ms": 1, "p99_ms": 1, "throughput_rps": -1}
+
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, max(0, round(q * len(samples)) - 1))]
+
+
+def summarize(latencies):
+    return {
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3) if latencies else None,
+        "max_ms": round(max(latencies) * 1000, 3) if latencies else None
+    }
+
+
+def process_tree(pid):
+    """
+    pid and all its descendants (uvicorn's supervisor and its workers), from Linux /proc.
+    """
+    pids = [pid]
+    for parent in pids:
+        try:
+            with open(f"/proc/{parent}/task/{parent}/children") as f:
+                pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return pids
+
+
+def process_memory(pid):
+    """
+    Current and peak resident set size of a process and its children, in MiB.
+    Peaks are summed per process, so they are an upper bound for the tree.
+    """
+    memory = {}
+    for member in process_tree(pid):
+        try:
+            with open(f"/proc/{member}/status") as f:
+                for line in f:
+                    if line.startswith(("VmRSS:", "VmHWM:")):
+                        key = "rss_mb" if line.startswith("VmRSS") else "peak_rss_mb"
+                        memory[key] = round(memory.get(key, 0) + int(line.split()[1]) / 1024, 1)
+        except OSError:
+            pass
+    return memory
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_backend(env, port, log_file, workers=1):
+    """
+    Starts the backend through run.py, logging to log_file, and waits until it answers.
+    """
+    import httpx
+
+    process = subprocess.Popen(
+        [sys.executable, "run.py", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)],
+        cwd=BACKEND_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Backend exited with status {process.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/webhook/stats", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Backend did not start within 60 s")
+
+
+def user_token(i):
+    """
+    An unsigned JWT for bench user i. The backend has no JWT secret configured,
+    so it resolves the token through the fake Supabase auth and caches it.
+    """
+    import jwt
+    return jwt.encode({"sub": f"bench-{i}", "aud": "authenticated", "exp": int(time.time()) + 86400},
+                      "bench-signing-key-not-checked-by-backend", algorithm="HS256")
+
+
+class ReplyWaiter:
+    """
+    Resolves a future when a fake receives the outbound message for a key
+    (Messenger recipient or Telegram chat), called from the fake's thread.
+    """
+
+    def __init__(self, loop, key):
+        self.loop = loop
+        self.key = key
+        self.pending = {}
+
+    def expect(self, key):
+        future = self.loop.create_future()
+        self.pending[str(key)] = future
+        return future
+
+    def __call__(self, received, payload):
+        self.loop.call_soon_threadsafe(self._resolve, str(self.key(payload)), received)
+
+    def _resolve(self, key, received):
+        future = self.pending.pop(key, None)
+        if future and not future.done():
+            future.set_result(received)
+
+
+async def run_load(requests, concurrency, call, first=0):
+    """
+    Runs call(i) for i in [first, first + requests) with `concurrency` in flight;
+    returns (latencies, extra samples, errors, wall time). call returns a latency
+    or (latency, extra) and raises on failure.
+    """
+    latencies, extra, errors = [], [], []
+    counter = iter(range(first, first + requests))
+
+    async def worker():
+        for i in counter:
+            try:
+                result = await call(i)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+                continue
+            if isinstance(result, tuple):
+                result, sample = result
+                extra.append(sample)
+            latencies.append(result)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, extra, errors, time.perf_counter() - started
+
+
+async def run_scenario(name, args, base_url, fake_servers, run_id):
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    tokens = [user_token(i) for i in range(args.users)]
+    timeout = httpx.Timeout(args.timeout)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        if name == "chat":
+            async def call(i):
+                headers = {"Authorization": f"Bearer {tokens[i % len(tokens)]}"}
+                started = time.perf_counter()
+                response = await client.post("/chat", json={"message": f"question {run_id}-{i}", "no_cache": not args.cache}, headers=headers)
+                response.raise_for_status()
+                return time.perf_counter() - started
+
+        elif name == "chat_stream":
+            async def call(i):
+                headers = {"Authorization": f"Bearer {tokens[i % len(tokens)]}"}
+                started = time.perf_counter()
+                first_token = None
+                async with client.stream("POST", "/chat/stream", json={"message": f"question {run_id}-{i}", "no_cache": not args.cache},
+                                         headers=headers) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if first_token is None and '"token"' in line:
+                            first_token = time.perf_counter() - started
+                if first_token is None:
+                    raise RuntimeError("stream produced no tokens")
+                return time.perf_counter() - started, first_token
+
+        elif name == "webhook":
+            waiter = ReplyWaiter(loop, lambda payload: payload.get("recipient", {}).get("id"))
+            fake_servers["graph"].on_message = waiter
+
+            async def call(i):
+                sender = f"{run_id}-{i}"
+                reply = waiter.expect(sender)
+                event = {"object": "page", "entry": [{"messaging": [{
+                    "sender": {"id": sender}, "message": {"mid": f"mid-{sender}", "text": f"question {i}"}
+                }]}]}
+                sent = time.monotonic()
+                response = await client.post("/webhook", json=event)
+                response.raise_for_status()
+                return await asyncio.wait_for(reply, args.timeout) - sent
+
+        elif name == "telegram":
+            waiter = ReplyWaiter(loop, lambda params: params.get("chat_id"))
+            fake_servers["telegram"].on_message = waiter
+
+            async def call(i):
+                chat_id = run_id * 1_000_000 + i
+                reply = waiter.expect(chat_id)
+                update = {"update_id": chat_id, "message": {
+                    "message_id": i + 1, "date": int(time.time()), "text": f"question {i}",
+                    "chat": {"id": chat_id, "type": "private"},
+                    "from": {"id": chat_id, "is_bot": False, "first_name": "Bench"}
+                }}
+                sent = time.monotonic()
+                response = await client.post("/telegram/webhook", json=update)
+                response.raise_for_status()
+                return await asyncio.wait_for(reply, args.timeout) - sent
+
+        # Warm-up: connections, the user cache and the first-call costs are not measured.
+        # Its indices follow the measured ones so message ids are never reused.
+        await run_load(min(args.concurrency, args.requests), args.concurrency, call, first=args.requests)
+        latencies, first_tokens, errors, elapsed = await run_load(args.requests, args.concurrency, call)
+
+    result = {
+        "requests": args.requests,
+        "ok": len(latencies),
+        "errors": len(errors),
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None
+    }
+    result.update(summarize(latencies))
+    if first_tokens:
+        result["ttft"] = summarize(first_tokens)
+    if errors:
+        result["error_samples"] = sorted(set(errors))[:5]
+    return result
+
+
+def print_results(results):
+    print(f"{'scenario':<12} {'ok':>6} {'err':>5} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rss MiB':>8}")
+    for name, r in results["scenarios"].items():
+        print(f"{name:<12} {r['ok']:>6} {r['errors']:>5} {r['throughput_rps'] or 0:>9.1f} {r['p50_ms'] or 0:>9.2f} "
+              f"{r['p95_ms'] or 0:>9.2f} {r['p99_ms'] or 0:>9.2f} {r['memory'].get('rss_mb', 0):>8.1f}")
+        if "ttft" in r:
+            print(f"{'  ttft':<12} {'':>6} {'':>5} {'':>9} {r['ttft']['p50_ms']:>9.2f} {r['ttft']['p95_ms']:>9.2f} {r['ttft']['p99_ms']:>9.2f}")
+        for sample in r.get("error_samples", []):
+            print(f"  error: {sample}")
+    memory = results["memory"]
+    print(f"server memory: start {memory['start'].get('rss_mb')} MiB, end {memory['end'].get('rss_mb')} MiB, "
+          f"peak {memory['end'].get('peak_rss_mb')} MiB")
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints per-figure changes against a baseline file; returns the regressions.
+    """
+    regressions = []
+    print(f"\ncompared with {baseline.get('commit') or '?'} ({baseline.get('timestamp')}):")
+    if baseline.get("config") != results["config"]:
+        print(f"  note: the runs used different settings: {baseline.get('config')} vs {results['config']}")
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        changes = []
+        for figure, direction in COMPARED.items():
+            old, new = previous.get(figure), current.get(figure)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            flag = ""
+            if change * direction > threshold:
+                flag = " REGRESSION"
+                regressions.append(f"{name}.{figure}")
+            changes.append(f"{figure} {old:g} -> {new:g} ({change:+.1%}){flag}")
+        print(f"  {name:<12} " + "; ".join(changes))
+    return regressions
+
+
+def backend_environment(started, port, workdir, provider="local"):
+    """
+    Environment for a backend that talks only to the fakes and keeps its files in workdir.
+    """
+    env = dict(os.environ)
+    env.update(fakes.environment(started))
+    env.update({
+        "AI_PROVIDER": provider,
+        "DATABASE_URL": f"sqlite:///{workdir}/bench.db",
+        "SHARED_STATE_PATH": os.path.join(workdir, "shared_state.db"),
+        "RESPONSE_CACHE_PATH": os.path.join(workdir, "response_cache.db"),
+        "TELEGRAM_WEBHOOK_URL": f"http://127.0.0.1:{port}/telegram/webhook",
+        "OLLAMA_WARMUP": "off",
+        "TRACE_LOG": "off",
+        # The fakes serve any number of generations at once; load scenarios measure the backend itself
+        "ADMISSION": "off"
+    })
+    for name in ("SUPABASE_JWT_SECRET", "SUPABASE_JWKS_URL", "TELEGRAM_WEBHOOK_SECRET"):
+        env.pop(name, None)
+    return env
+
+
+def main(args):
+    token_interval = 1 / args.token_rate if args.token_rate else 0.0
+    started = fakes.start_all(latency=args.latency, token_interval=token_interval, api_latency=args.api_latency)
+    fake_servers = {name: server for name, (server, _) in started.items()}
+
+    port = free_port()
+    workdir = tempfile.mkdtemp()
+    env = backend_environment(started, port, workdir, args.provider)
+
+    log_path = os.path.join(workdir, "backend.log")
+    log_file = open(log_path, "w")
+    backend = start_backend(env, port, log_file, args.workers)
+    try:
+        results = {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "config": {
+                "provider": args.provider, "concurrency": args.concurrency, "requests": args.requests,
+                "users": args.users, "latency_s": args.latency, "token_rate": args.token_rate,
+                "api_latency_s": args.api_latency, "cache": args.cache, "workers": args.workers
+            },
+            "memory": {"start": process_memory(backend.pid)},
+            "scenarios": {}
+        }
+        for run_id, name in enumerate(args.scenarios, start=1):
+            scenario = asyncio.run(run_scenario(name, args, f"http://127.0.0.1:{port}", fake_servers, run_id))
+            scenario["memory"] = process_memory(backend.pid)
+            results["scenarios"][name] = scenario
+        results["memory"]["end"] = process_memory(backend.pid)
+    finally:
+        backend.terminate()
+        backend.wait(timeout=30)
+        log_file.close()
+        for server in fake_servers.values():
+            server.shutdown()
+
+    print_results(results)
+    print(f"backend log: {log_path}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"regressions beyond {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--provider", choices=("local", "openai"), default="local", help="which fake model API answers")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=300, help="measured requests per scenario")
+    parser.add_argument("--users", type=int, default=50, help="distinct web users (auth tokens)")
+    parser.add_argument("--latency", type=float, default=0.05, help="model API time to first token, seconds")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="model API tokens per second (0 = instant)")
+    parser.add_argument("--api-latency", type=float, default=0.01, help="Supabase/Telegram/Graph latency, seconds")
+    parser.add_argument("--workers", type=int, default=1, help="API worker processes (run.py --workers)")
+    parser.add_argument("--cache", action="store_true", help="allow response-cache hits for /chat")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+    sys.exit(main(parser.parse_args()))
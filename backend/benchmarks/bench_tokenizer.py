@@ -0,0 +1,113 @@
+"""
+Microbenchmarks of the Burmese-aware tokenizer on the per-message hot path.
+
+Run from the backend directory:
+    python -m benchmarks.bench_tokenizer --iterations 20000
+
+Times each stage (normalisation incl. Zawgyi detection, syllable segmentation,
+dictionary word breaking, full tokenize, cached query terms) on short chat
+messages and on a post-sized text, against the previous tokenizer (runs of
+Myanmar script as single terms) and a plain lower().split(). It then searches
+a synthetic corpus with Burmese questions typed without spaces and reports how
+many find a post with each tokenizer.
+"""
+import os
+import re
+import sys
+import json
+import random
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import burmese
+from tokenizer import TOKENIZER, tokenize
+from benchmarks.bench_suite import git_commit
+
+LEGACY_PATTERN = re.compile(r"[က-႟ꩠ-ꩿ]+|[^\W_]+")
+
+MESSAGES = {
+    "burmese": "ပို့ဆောင်ခဘယ်လောက်ကျလဲခင်ဗျာ",
+    "zawgyi": "ေစ်းႏႈန္းဘယ္ေလာက္လဲ",
+    "english": "What is the delivery price to Mandalay?",
+    "mixed": "iPhone 15 ဈေးနှုန်းဘယ်လောက်လဲ",
+}
+
+# (question without spaces, words a relevant post contains)
+QUESTIONS = [
+    ("ပို့ဆောင်ခဘယ်လောက်လဲ", "ပို့ဆောင်ခ"),
+    ("ဆိုင်ခွဲဘယ်မှာရှိလား", "ဆိုင်ခွဲ"),
+    ("ဖွင့်ချိန်သိချင်ပါတယ်", "ဖွင့်ချိန်"),
+    ("ဖုန်းနံပါတ်ပေးပါ", "ဖုန်းနံပါတ်"),
+    ("အာမခံရှိလား", "အာမခံ"),
+    ("ငွေလွှဲလို့ရလား", "ငွေလွှဲ"),
+]
+FILLER = "ကျွန်ုပ်တို့ ဝန်ဆောင်မှု အရည်အသွေး ကုန်ပစ္စည်း ရန်ကုန် မန္တလေး customer service quality".split()
+
+
+def per_call(function, argument, iterations):
+    return min(timeit.repeat(lambda: function(argument), number=iterations, repeat=3)) / iterations * 1e6
+
+
+def bench_stages(iterations):
+    post = " ".join([MESSAGES["burmese"], MESSAGES["english"], MESSAGES["mixed"]] * 10)
+    texts = dict(MESSAGES, post=post)
+    stages = {
+        "split": lambda t: t.lower().split(),
+        "legacy": lambda t: LEGACY_PATTERN.findall(t.lower()),
+        "normalize": TOKENIZER.normalize,
+        "syllables": burmese.syllables,
+        "segment": TOKENIZER.breaker.segment,
+        "tokenize": tokenize,
+        "query (cached)": TOKENIZER.query_terms,
+    }
+    results = {}
+    print(f"{'stage':<15}" + "".join(f"{name:>10}" for name in texts) + "   (us per call)")
+    for stage, function in stages.items():
+        row = {name: per_call(function, text, iterations if name != "post" else max(iterations // 20, 1))
+               for name, text in texts.items()}
+        results[stage] = {name: round(us, 3) for name, us in row.items()}
+        print(f"{stage:<15}" + "".join(f"{us:>10.2f}" for us in row.values()))
+    return results
+
+
+def bench_recall(posts, seed=7):
+    from context_index import ContextIndex
+
+    rng = random.Random(seed)
+    corpus = [{"content": " ".join(rng.choices(FILLER, k=30) + [rng.choice(QUESTIONS)[1] + "ကို"])} for _ in range(posts)]
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "_bench_tokenizer_posts.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(corpus, f, ensure_ascii=False)
+    try:
+        index = ContextIndex(path)
+        index.refresh()
+        found = {"legacy": 0, "tokenizer": 0}
+        for question, word in QUESTIONS:
+            legacy = set(LEGACY_PATTERN.findall(question.lower()))
+            if any(term in legacy for post in corpus for term in LEGACY_PATTERN.findall(post["content"].lower())):
+                found["legacy"] += 1
+            if any(word in post for post in index.search(question, limit=5)):
+                found["tokenizer"] += 1
+    finally:
+        os.remove(path)
+    print(f"\nquestions typed without spaces that find a relevant post ({posts} posts): "
+          f"legacy {found['legacy']}/{len(QUESTIONS)}, tokenizer {found['tokenizer']}/{len(QUESTIONS)}")
+    return found
+
+
+def main(args):
+    results = {"stages_us": bench_stages(args.iterations), "recall": bench_recall(args.posts)}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"commit": git_commit(), "iterations": args.iterations, **results}, f, indent=2)
+        print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--posts", type=int, default=500, help="size of the synthetic corpus for the recall check")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    main(parser.parse_args())
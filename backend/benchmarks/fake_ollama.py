@@ -0,0 +1,123 @@
+import json
+import time
+import threading
+import contextlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+REPLY_TOKENS = ["ဟုတ်ကဲ့", "၊ ", "fake ", "reply", "."]
+
+
+class FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """
+    Answers /api/generate like a busy Ollama engine: waits `latency` seconds
+    before the first token, then emits one token every `token_interval` seconds.
+    The first request (or any after a keep_alive of 0) also waits `load_latency`
+    seconds to "load" the model. With `parallel` set, only that many generations
+    run at once and the rest wait their turn, like OLLAMA_NUM_PARALLEL. Replies
+    carry Ollama's timing fields, and every payload is kept in `server.payloads`.
+    """
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; avoid Nagle/delayed-ACK stalls on keep-alive
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        self.server.payloads.append(payload)
+        load_duration = self._load(payload)
+        if not payload.get("prompt"):
+            # Empty prompt: Ollama only loads the model
+            self._send_json(dict(self._timings(load_duration, 0, 0), model=payload.get("model"), response="", done=True, done_reason="load"))
+            return
+
+        with self.server.slots:
+            self._generate(payload, load_duration)
+
+    def _generate(self, payload, load_duration):
+        started = time.monotonic()
+        time.sleep(self.server.latency)
+        if payload.get("stream"):
+            self._stream(payload, load_duration, started)
+            return
+
+        time.sleep(self.server.token_interval * (len(REPLY_TOKENS) - 1))
+        self._send_json(dict(
+            self._timings(load_duration, started, len(REPLY_TOKENS)),
+            model=payload.get("model"),
+            response="".join(REPLY_TOKENS),
+            done=True
+        ))
+
+    def _load(self, payload):
+        with self.server.load_lock:
+            if self.server.loaded:
+                load_duration = 0.0
+            else:
+                time.sleep(self.server.load_latency)
+                load_duration = self.server.load_latency
+                self.server.loaded = True
+            if str(payload.get("keep_alive")) == "0":
+                self.server.loaded = False
+        return load_duration
+
+    def _timings(self, load_duration, started, eval_count):
+        eval_duration = time.monotonic() - started if started else 0.0
+        return {
+            "load_duration": int(load_duration * 1e9),
+            "prompt_eval_count": 12 if eval_count else 0,
+            "prompt_eval_duration": int(self.server.latency * 1e9) if eval_count else 0,
+            "eval_count": eval_count,
+            "eval_duration": int(eval_duration * 1e9)
+        }
+
+    def _send_json(self, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, payload, load_duration, started):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, token in enumerate(REPLY_TOKENS):
+            if i:
+                time.sleep(self.server.token_interval)
+            self._write_chunk({"model": payload.get("model"), "response": token, "done": False})
+        self._write_chunk(dict(
+            self._timings(load_duration, started, len(REPLY_TOKENS)),
+            model=payload.get("model"), response="", done=True
+        ))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, data):
+        line = (json.dumps(data, ensure_ascii=False) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_ollama(latency=0.2, token_interval=0.0, load_latency=0.0, host="127.0.0.1", port=0, server_class=FakeServer, parallel=None):
+    """
+    Starts the fake provider in a background thread and returns (server, base_url).
+    """
+    server = server_class((host, port), FakeOllamaHandler)
+    server.latency = latency
+    server.token_interval = token_interval
+    server.load_latency = load_latency
+    server.loaded = False
+    server.load_lock = threading.Lock()
+    server.slots = threading.Semaphore(parallel) if parallel else contextlib.nullcontext()
+    server.payloads = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
@@ -0,0 +1,260 @@
+"""
+Local stand-ins for the external services, for benchmarks and load tests.
+
+Each fake is a threaded HTTP server with a configurable `latency` (seconds per
+request) and, for the model APIs, `token_interval` (seconds per streamed token).
+Fakes that receive outbound messages (Telegram, Graph) keep a receive timestamp
+per message, and call `server.on_message(received, payload)` if it is set, so
+end-to-end latency can be measured from the sender's side.
+"""
+import json
+import time
+import uuid
+import threading
+from email.parser import BytesParser
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler
+
+from benchmarks.fake_ollama import FakeServer, REPLY_TOKENS, start_fake_ollama
+
+
+class JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+        if not body:
+            return {}
+        if "application/x-www-form-urlencoded" in self.headers.get("Content-Type", ""):
+            return {k: v[0] for k, v in parse_qs(body.decode("utf-8")).items()}
+        return json.loads(body)
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+    def record(self, payload):
+        received = time.monotonic()
+        with self.server.lock:
+            self.server.messages.append((received, payload))
+            count = len(self.server.messages)
+        if self.server.on_message:
+            self.server.on_message(received, payload)
+        return count
+
+
+class FakeOpenAIHandler(JSONHandler):
+    """
+    OpenAI-compatible POST /v1/chat/completions, streaming (SSE) or not, with usage,
+    and the Batch API (file upload, batch create/retrieve, file content). A batch
+    completes after one `latency`; its output file has a completion per request.
+    """
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        if path == "/v1/files":
+            return self._upload()
+        if path == "/v1/batches":
+            return self._create_batch()
+        payload = self.read_json()
+        time.sleep(self.server.latency)
+        if payload.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i, token in enumerate(REPLY_TOKENS):
+                if i:
+                    time.sleep(self.server.token_interval)
+                self._chunk({"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": payload.get("model"),
+                             "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]})
+            self._write(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+            return
+
+        time.sleep(self.server.token_interval * (len(REPLY_TOKENS) - 1))
+        self.send_json(self._completion(payload))
+
+    def do_GET(self):
+        parts = urlsplit(self.path).path.strip("/").split("/")
+        if parts[:2] == ["v1", "batches"] and len(parts) == 3 and parts[2] in self._store("batches"):
+            return self.send_json(self._store("batches")[parts[2]])
+        if parts[:2] == ["v1", "files"] and len(parts) == 4 and parts[2] in self._store("files"):
+            body = self._store("files")[parts[2]]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        self.send_json({"error": {"message": "not found"}}, status=404)
+
+    def _store(self, name):
+        with self.server.lock:
+            return self.server.__dict__.setdefault(name, {})
+
+    def _completion(self, payload):
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(REPLY_TOKENS)}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 12, "completion_tokens": len(REPLY_TOKENS), "total_tokens": 12 + len(REPLY_TOKENS)}
+        }
+
+    def _upload(self):
+        length = int(self.headers.get("Content-Length", 0))
+        header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode("ascii")
+        form = BytesParser().parsebytes(header + self.rfile.read(length))
+        content = next(part.get_payload(decode=True) for part in form.get_payload() if part.get_param("name", header="content-disposition") == "file")
+        file_id = f"file-{uuid.uuid4().hex[:12]}"
+        self._store("files")[file_id] = content
+        self.send_json({"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                        "filename": "batch.jsonl", "purpose": "batch", "status": "processed"})
+
+    def _create_batch(self):
+        payload = self.read_json()
+        time.sleep(self.server.latency)
+        requests = [json.loads(line) for line in self._store("files")[payload["input_file_id"]].splitlines() if line.strip()]
+        output = "".join(
+            json.dumps({"id": f"batch_req_{i}", "custom_id": request["custom_id"], "error": None,
+                        "response": {"status_code": 200, "request_id": f"req_{i}", "body": self._completion(request["body"])}},
+                       ensure_ascii=False) + "\n"
+            for i, request in enumerate(requests)
+        ).encode("utf-8")
+        output_id = f"file-{uuid.uuid4().hex[:12]}"
+        self._store("files")[output_id] = output
+        batch = {
+            "id": f"batch_{uuid.uuid4().hex[:12]}", "object": "batch", "endpoint": payload["endpoint"],
+            "input_file_id": payload["input_file_id"], "completion_window": payload["completion_window"],
+            "status": "completed", "created_at": int(time.time()), "output_file_id": output_id, "error_file_id": None,
+            "request_counts": {"total": len(requests), "completed": len(requests), "failed": 0}
+        }
+        self._store("batches")[batch["id"]] = batch
+        self.send_json(batch)
+
+    def _chunk(self, data):
+        self._write(f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+    def _write(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+class FakeSupabaseHandler(JSONHandler):
+    """
+    Supabase auth: GET /auth/v1/user resolves any bearer token to a user derived from it.
+    """
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        if urlsplit(self.path).path != "/auth/v1/user":
+            self.send_json({"msg": "not found"}, 404)
+            return
+        token = self.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        user_id = f"user-{abs(hash(token)) % 10 ** 8}"
+        self.send_json({
+            "id": user_id,
+            "aud": "authenticated",
+            "role": "authenticated",
+            "email": f"{user_id}@bench.local",
+            "app_metadata": {},
+            "user_metadata": {},
+            "created_at": "2024-01-01T00:00:00Z"
+        })
+
+
+class FakeTelegramHandler(JSONHandler):
+    """
+    Bot API: getMe, sendChatAction and sendMessage under /bot<token>/<method>.
+    Each sendMessage is recorded as (receive time, params) in `server.messages`.
+    """
+
+    def _handle(self):
+        params = self.read_json()
+        params.update({k: v[0] for k, v in parse_qs(urlsplit(self.path).query).items()})
+        method = urlsplit(self.path).path.rsplit("/", 1)[-1]
+        time.sleep(self.server.latency)
+        if method == "getMe":
+            self.send_json({"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}})
+        elif method == "sendMessage":
+            message_id = self.record(params)
+            self.send_json({"ok": True, "result": {
+                "message_id": message_id, "date": int(time.time()),
+                "chat": {"id": int(params.get("chat_id", 0)), "type": "private"}, "text": params.get("text", "")
+            }})
+        elif method in ("sendChatAction", "deleteWebhook", "setWebhook"):
+            self.send_json({"ok": True, "result": True})
+        else:
+            self.send_json({"ok": False, "error_code": 404, "description": "Not Found"}, 404)
+
+    do_GET = _handle
+    do_POST = _handle
+
+
+class FakeGraphHandler(JSONHandler):
+    """
+    Graph API POST /me/messages. Each message is recorded as (receive time, payload).
+    """
+
+    def do_POST(self):
+        payload = self.read_json()
+        time.sleep(self.server.latency)
+        self.record(payload)
+        self.send_json({"recipient_id": payload.get("recipient", {}).get("id"), "message_id": "m_fake"})
+
+
+def start_fake(handler_class, latency=0.0, token_interval=0.0, host="127.0.0.1", port=0):
+    """
+    Starts a fake in a background thread and returns (server, base_url).
+    """
+    server = FakeServer((host, port), handler_class)
+    server.latency = latency
+    server.token_interval = token_interval
+    server.messages = []
+    server.lock = threading.Lock()
+    server.on_message = None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def start_all(latency=0.0, token_interval=0.0, api_latency=0.0):
+    """
+    Starts every fake; returns {name: (server, base_url)}. `latency` and
+    `token_interval` apply to the model APIs, `api_latency` to the others.
+    """
+    return {
+        "ollama": start_fake_ollama(latency=latency, token_interval=token_interval),
+        "openai": start_fake(FakeOpenAIHandler, latency, token_interval),
+        "supabase": start_fake(FakeSupabaseHandler, api_latency),
+        "telegram": start_fake(FakeTelegramHandler, api_latency),
+        "graph": start_fake(FakeGraphHandler, api_latency)
+    }
+
+
+def environment(fakes):
+    """
+    Environment variables that point the backend at the fakes.
+    """
+    return {
+        "OLLAMA_URL": fakes["ollama"][1],
+        "OPENAI_API_KEY": "sk-fake",
+        "OPENAI_BASE_URL": f"{fakes['openai'][1]}/v1",
+        "SUPABASE_URL": fakes["supabase"][1],
+        "SUPABASE_KEY": "fake.supabase.key",
+        "TELEGRAM_API_URL": fakes["telegram"][1],
+        "GRAPH_API_URL": fakes["graph"][1],
+        "FB_PAGE_ACCESS_TOKEN": "fake-page-token",
+        "TELEGRAM_BOT_TOKEN": "123456:bench-token"
+    }
@@ -0,0 +1,94 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+BOT_HEALTH_INTERVAL = float(os.getenv("BOT_HEALTH_INTERVAL", "60"))
+BOT_HEALTH_HISTORY = int(os.getenv("BOT_HEALTH_HISTORY", "100"))
+
+
+class BotHealthMonitor:
+    """
+    Checks the Telegram bot token in the background and serves the last result.
+
+    `check(token)` is the blocking getMe probe (core.get_bot_status); it runs in a
+    worker thread every `interval` seconds, and at once when the token returned by
+    `get_token` changes. Readers get the cached status without any network call.
+    """
+
+    def __init__(self, check, get_token, interval=BOT_HEALTH_INTERVAL, history_size=BOT_HEALTH_HISTORY):
+        self.check = check
+        self.get_token = get_token
+        self.interval = interval
+        self._history = deque(maxlen=history_size)
+        self._status = {"ok": False, "message": "Checking...", "checked_at": None}
+        self._checked_token = None
+        self._wake = None
+        self._task = None
+        self._refresh_lock = None
+
+    async def start(self):
+        if self._task:
+            return
+        self._wake = asyncio.Event()
+        self._refresh_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Bot health check failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def refresh(self):
+        """
+        Runs a check now and returns the new status.
+        """
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            token = self._checked_token = await asyncio.to_thread(self.get_token)
+            started = time.monotonic()
+            ok, message = await asyncio.to_thread(self.check, token)
+            status = {
+                "ok": ok,
+                "message": message,
+                "checked_at": datetime.now(timezone.utc).isoformat(),
+                "latency_ms": round((time.monotonic() - started) * 1000, 1)
+            }
+            if ok != self._status["ok"] and self._status["checked_at"]:
+                logger.warning(f"Telegram bot status changed: {message}")
+            self._status = status
+            self._history.append(status)
+            return status
+
+    def status(self, token):
+        """
+        Last known status. A change of `token` (the current one, read by the caller)
+        since the last check schedules a refresh.
+        """
+        if self._wake is not None and token != self._checked_token:
+            self._wake.set()
+        return self._status
+
+    def history(self):
+        return list(self._history)
@@ -0,0 +1,208 @@
+import re
+import unicodedata
+
+# Zawgyi is the legacy font encoding most older Burmese Facebook posts are typed in.
+# It reuses Myanmar code points for different letters (e.g. U+103B is medial RA in
+# Zawgyi but medial YA in Unicode) and stores the E vowel and medial RA before the
+# consonant, in visual order. Text must be converted before it is indexed, or Zawgyi
+# and Unicode spellings of the same word never match.
+
+CONSONANT = "\u1000-\u1021"
+
+# (pattern, weight): sequences that only occur in Zawgyi text
+ZAWGYI_SIGNS = [
+    (re.compile("[\u105a\u1060-\u1097\u1033\u1034]"), 1.0),          # Zawgyi-only glyphs (stacked forms, kinzi, variants)
+    (re.compile(f"\u1031(?<![{CONSONANT}\u103b-\u103e\u1060-\u1097]\u1031)[{CONSONANT}\u103b\u107e-\u1084]"), 1.0),  # E vowel before its consonant
+    (re.compile(f"\u1039(?![{CONSONANT}])"), 1.0),                     # U+1039 as the visible killer (asat)
+    (re.compile(f"\u103b(?<![{CONSONANT}]\u103b)[{CONSONANT}]"), 1.0),  # medial RA before its consonant
+    (re.compile("\u103a[\u102b-\u102e\u1032\u1036]"), 1.0),          # U+103A (medial YA) before a vowel (not U: Unicode ကျွန်ုပ်)
+]
+# (pattern, weight): sequences that only occur in Unicode text. A virama before a
+# consonant is also how Zawgyi writes a killed consonant before the next syllable,
+# so it counts for little.
+UNICODE_SIGNS = [
+    (re.compile(f"\u1039[{CONSONANT}]"), 0.25),                        # stacking virama
+    (re.compile("\u103e"), 1.0),                                        # medial HA
+    (re.compile(f"\u103a(?<=[{CONSONANT}]\u103a)(?=[\\s\u104a\u104b]|$)"), 1.0),  # asat closing a word
+    (re.compile(f"[{CONSONANT}][\u103b-\u103e]*\u1031"), 1.0),          # E vowel after its consonant
+]
+
+# Zawgyi code point -> Unicode sequence. Medials and the killer are remapped at once
+# (str.translate), so the rules below can rely on Unicode meanings.
+ZAWGYI_MAP = str.maketrans({
+    "\u200b": "",
+    "\u1039": "\u103a",                             # killer -> asat
+    "\u103a": "\u103b", "\u107d": "\u103b",         # medial YA
+    "\u103b": "\u103c", "\u107e": "\u103c", "\u107f": "\u103c", "\u1080": "\u103c",
+    "\u1081": "\u103c", "\u1082": "\u103c", "\u1083": "\u103c", "\u1084": "\u103c",  # medial RA
+    "\u103c": "\u103d",                             # medial WA
+    "\u103d": "\u103e", "\u1087": "\u103e",         # medial HA
+    "\u1033": "\u102f", "\u1034": "\u1030",
+    "\u1088": "\u103e\u102f", "\u1089": "\u103e\u1030", "\u108a": "\u103d\u103e",
+    "\u105a": "\u102b\u103a",
+    "\u108e": "\u102d\u1036",
+    "\u108b": "\u1064\u102d", "\u108c": "\u1064\u102e", "\u108d": "\u1064\u1036",
+    "\u108f": "\u1014", "\u1090": "\u101b", "\u106a": "\u1009", "\u106b": "\u100a",
+    "\u1086": "\u103f", "\u1094": "\u1037", "\u1095": "\u1037",
+    "\u1060": "\u1039\u1000", "\u1061": "\u1039\u1001", "\u1062": "\u1039\u1002", "\u1063": "\u1039\u1003",
+    "\u1065": "\u1039\u1005", "\u1066": "\u1039\u1006", "\u1067": "\u1039\u1006",
+    "\u1068": "\u1039\u1007", "\u1069": "\u1039\u1008",
+    "\u106c": "\u1039\u100b", "\u106d": "\u1039\u100c",
+    "\u106e": "\u100d\u1039\u100d", "\u106f": "\u100d\u1039\u100e", "\u1070": "\u1039\u100f",
+    "\u1071": "\u1039\u1010", "\u1072": "\u1039\u1010", "\u1073": "\u1039\u1011", "\u1074": "\u1039\u1011",
+    "\u1075": "\u1039\u1012", "\u1076": "\u1039\u1013", "\u1077": "\u1039\u1014", "\u1078": "\u1039\u1015",
+    "\u1079": "\u1039\u1016", "\u107a": "\u1039\u1017", "\u107b": "\u1039\u1018", "\u1093": "\u1039\u1018",
+    "\u107c": "\u1039\u1019", "\u1085": "\u1039\u101c",
+    "\u1091": "\u100f\u1039\u100d", "\u1092": "\u100b\u1039\u100c", "\u1096": "\u1039\u1010\u103d",
+    "\u1097": "\u100b\u1039\u100b",
+})
+
+# Kinzi is typed after its consonant; in Unicode it is NGA + asat + virama before it
+KINZI = re.compile(f"(\u1031)?(\u103c)?([{CONSONANT}])\u1064")
+
+# Reordering from visual (Zawgyi) to logical (Unicode) order, applied in sequence
+ZAWGYI_RULES = [
+    # Medial RA and the E vowel are typed before the consonant (and its stacked consonant)
+    (re.compile(f"\u103c([{CONSONANT}])(\u1039[{CONSONANT}])?"), "\\1\\2\u103c"),
+    (re.compile(f"\u1031((?:\u1004\u103a\u1039)?[{CONSONANT}](?:\u1039[{CONSONANT}])?[\u103b-\u103e]*)"), "\\1\u1031"),
+    # Dot below goes after the vowels and before asat
+    (re.compile("\u1037([\u102b-\u1030\u1032\u1036]+)"), "\\1\u1037"),
+    (re.compile("\u103a\u1037"), "\u1037\u103a"),
+    (re.compile("\u1036\u102f"), "\u102f\u1036"),
+    (re.compile("([\u102f\u1030])([\u102d\u102e\u1032])"), "\\2\\1"),
+    # NYA / U confusions
+    (re.compile("\u1025(?=[\u103a\u102c])"), "\u1009"),
+    (re.compile("\u1025\u102e"), "\u1026"),
+    # Digits typed for look-alike letters: zero for WA, seven for RA
+    (re.compile(f"\u1040(?=[\u102b-\u1032\u1036-\u103a])|\u1040(?<=[\u1031{CONSONANT}]\u1040)(?=[{CONSONANT}])"), "\u101d"),
+    (re.compile("\u1047(?=[\u102b-\u1032\u1036-\u103a])"), "\u101b"),
+    # Repeated signs left over from visual typing
+    (re.compile("([\u102d\u102e\u102f\u1030\u1032\u1036\u1037\u103a])\\1+"), "\\1"),
+]
+
+MEDIALS = re.compile("[\u103b-\u103e]{2,}")
+MYANMAR = re.compile("[\u1000-\u109f]")
+SPACES = re.compile("[ \t\u00a0]{2,}|[\t\u00a0]")
+
+
+def zawgyi_score(text):
+    """
+    Evidence that text is Zawgyi: weighted Zawgyi-only minus Unicode-only matches,
+    normalised to [-1, 1]. 0 for text without distinguishing sequences.
+    """
+    zawgyi = sum(weight * len(pattern.findall(text)) for pattern, weight in ZAWGYI_SIGNS)
+    unicode = sum(weight * len(pattern.findall(text)) for pattern, weight in UNICODE_SIGNS)
+    total = zawgyi + unicode
+    return (zawgyi - unicode) / total if total else 0.0
+
+
+def is_zawgyi(text, threshold=0.2):
+    return zawgyi_score(text) > threshold
+
+
+def zawgyi_to_unicode(text):
+    """
+    Converts Zawgyi-encoded Burmese to standard Unicode; other characters pass through.
+    """
+    text = text.translate(ZAWGYI_MAP)
+    if "\u1064" in text:
+        text = KINZI.sub("\u1004\u103a\u1039\\3\\2\\1", text)
+    for pattern, replacement in ZAWGYI_RULES:
+        text = pattern.sub(replacement, text)
+    # Unicode stores medials as YA, RA, WA, HA whatever order they were typed in
+    return MEDIALS.sub(lambda m: "".join(sorted(m.group())), text)
+
+
+def normalize(text, encoding="auto"):
+    """
+    Returns (text, converted): NFC Unicode with Zawgyi converted when `encoding`
+    is 'zawgyi', or when it is 'auto' and the text is detected as Zawgyi.
+    Zero-width spaces are removed and runs of spaces/tabs collapsed.
+    """
+    converted = MYANMAR.search(text) is not None and (encoding == "zawgyi" or (encoding == "auto" and is_zawgyi(text)))
+    if converted:
+        text = zawgyi_to_unicode(text)
+    text = unicodedata.normalize("NFC", text.replace("\u200b", "").replace("\ufeff", ""))
+    text = SPACES.sub(" ", text)
+    return text.strip(), converted
+
+
+# Syllable segmentation (the rules of Ye Kyaw Thu's sylbreak): a syllable starts at
+# every consonant that is not killed (asat) or stacked (virama) and not itself the
+# lower half of a stack, and at independent vowels, digits and symbols.
+SYLLABLE_START = re.compile(f"(?<!္)[{CONSONANT}](?![်္])|[ဣ-ဪဿ၀-၏]")
+
+# Common words of shop and customer-service posts, in Unicode. Extended at run time
+# with a word list (see tokenizer.BURMESE_DICTIONARY).
+WORDS = """
+မင်္ဂလာပါ မင်္ဂလာ ကျေးဇူးတင်ပါတယ် ကျေးဇူးတင် ကျေးဇူး ဟုတ်ကဲ့ ဟုတ်တယ် မဟုတ်ဘူး ရပါတယ် ဆောရီး
+ဈေးနှုန်း စျေးနှုန်း ဈေး စျေး နှုန်း လျှော့ဈေး ပရိုမိုးရှင်း လက်ဆောင် အခမဲ့
+ပို့ဆောင်ခ ပို့ဆောင်ရေး ပို့ဆောင် ပို့ခ ပို့ပေး ပစ္စည်း ကုန်ပစ္စည်း ထုတ်ကုန် အော်ဒါ မှာယူ မှာချင် ဝယ်ယူ ဝယ်ချင်
+ရောင်းချ ရောင်းရေး ငွေပေးချေမှု ငွေပေးချေ ငွေလွှဲ ငွေသား ငွေ ကျပ် ဒေါ်လာ ဘဏ် ကတ်
+အာမခံ ပြန်အမ်း ပြန်လဲ လဲလှယ် ပြုပြင် ပြင်ဆင် တပ်ဆင် ဝန်ဆောင်မှု ဝန်ထမ်း ဖောက်သည် အသင်းဝင်
+ဆိုင်ခွဲ ဆိုင် ရုံး ဌာန ကုမ္ပဏီ လိပ်စာ တည်နေရာ ဖုန်းနံပါတ် ဖုန်း အီးမေးလ် ဆက်သွယ် ဆက်သွယ်ရေး
+ဖွင့်ချိန် ပိတ်ချိန် ဖွင့် ပိတ် အချိန် ရက် နေ့ ပတ် လ နှစ် မနက် ညနေ ည ယနေ့ မနက်ဖြန် မနေ့က တနင်္ဂနွေ
+အရွယ်အစား အရောင် အမျိုးအစား အရည်အသွေး အသေးစိတ် လက်ကျန် ပမာဏ အရေအတွက် အလေးချိန်
+အကောင့် စကားဝှက် အင်တာနက် ကွန်ပျူတာ ဆော့ဖ်ဝဲ အက်ပ် ဝက်ဘ်ဆိုက် မက်ဆေ့ချ် စာ ဓာတ်ပုံ ဗီဒီယို
+မေးခွန်း အဖြေ ပြဿနာ အကူအညီ ကူညီ လုပ်ပေး လုပ်ဆောင် စီစဉ် အတည်ပြု ပယ်ဖျက် စာရင်းသွင်း
+ဘယ်လောက် ဘယ်မှာ ဘယ်လို ဘယ်တော့ ဘယ်သူ ဘယ်နှစ် ဘာလဲ ဘာကြောင့် ဘယ်အချိန်
+ရှိလား ရှိပါတယ် ရှိတယ် မရှိ မရှိဘူး ရနိုင် ရမလဲ ရောက် ကြာ သိချင် သိရ ပြော မေး ဖြေ
+မြို့ ရန်ကုန် မန္တလေး နေပြည်တော် မြန်မာ နိုင်ငံ ပြည်ပ ပြည်တွင်း နယ် မြို့နယ် ရပ်ကွက် လမ်း
+ကျန်းမာရေး ပညာရေး သင်တန်း ကျောင်း ဆရာ ကလေး လူကြီး အမျိုးသမီး အမျိုးသား
+""".split()
+
+STOPWORDS = frozenset("""
+က ကို မှာ မှ နဲ့ နှင့် ၏ ရဲ့ သည် သော သည့် တဲ့ ဟာ များ တွေ ပါ ပါတယ် ပါသည် တယ် မယ် ပြီ ပြီး
+လား လဲ ပဲ ဘဲ လည်း လို့ ဖို့ ရင် တော့ နော် ဗျာ ဗျ ရှင် ရှင့် ခင်ဗျာ ခင်ဗျား ကျွန်တော် ကျွန်မ
+ဒါ ဒီ ဟို အဲ့ဒါ အဲဒီ သူ သူတို့ ကျွန်ုပ် ကျွန်ုပ်တို့ နင် မင်း
+""".split())
+
+
+def syllables(text):
+    """
+    Splits a run of Myanmar script into syllables.
+    """
+    starts = [m.start() for m in SYLLABLE_START.finditer(text)]
+    if not starts or starts[0]:
+        starts.insert(0, 0)
+    return [text[a:b] for a, b in zip(starts, starts[1:] + [len(text)])]
+
+
+class WordBreaker:
+    """
+    Dictionary word breaking over syllables by longest match from the left.
+    Syllables not covered by a dictionary word come out on their own.
+    """
+
+    def __init__(self, words=WORDS):
+        self._lengths = {}  # first syllable -> word lengths in syllables, longest first
+        self.words = set()
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        parts = syllables(word)
+        if not parts or word in self.words:
+            return
+        self.words.add(word)
+        lengths = self._lengths.setdefault(parts[0], [])
+        if len(parts) not in lengths:
+            lengths.append(len(parts))
+            lengths.sort(reverse=True)
+
+    def segment(self, text):
+        """
+        Splits a run of Myanmar script into words.
+        """
+        parts = syllables(text)
+        words = []
+        i, n = 0, len(parts)
+        while i < n:
+            step = 1
+            for length in self._lengths.get(parts[i], ()):
+                if i + length <= n and length > 1 and "".join(parts[i:i + length]) in self.words:
+                    step = length
+                    break
+            words.append("".join(parts[i:i + step]))
+            i += step
+        return words
@@ -0,0 +1,88 @@
+import json
+import hashlib
+
+from sqlalchemy import select
+
+from db.models import ChatSession, DbChatMessage
+
+DEFAULT_SESSION_PAGE = 20
+DEFAULT_MESSAGE_PAGE = 50
+
+
+class HistoryPage:
+    """
+    One page of a keyset-paginated listing, rendered once as compact JSON.
+
+    `next` is the `before` cursor of the following (older) page, or None on the
+    last page. The ETag is a digest of the body, so a client revalidating an
+    unchanged page gets a 304 without the body being sent again.
+    """
+
+    def __init__(self, name, items, next_cursor):
+        self.items = items
+        self.next = next_cursor
+        # ensure_ascii=False: Burmese text is 3 bytes per character instead of a 6-byte \u escape
+        self.body = json.dumps({name: items, "next": next_cursor}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.etag = '"' + hashlib.blake2b(self.body, digest_size=12).hexdigest() + '"'
+
+    def matches(self, if_none_match):
+        """
+        True if an If-None-Match header value names this page's ETag.
+        """
+        if not if_none_match:
+            return False
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or self.etag in tags
+
+
+def _timestamp(value):
+    return value.isoformat() if value else None
+
+
+def _keyset(query, id_column, before, limit):
+    """
+    Newest-first rows with id < before, one extra to tell whether there is a next page.
+    Ids grow with insertion, so they order rows the same way created_at does and
+    the filter is a range scan on the (owner, id) index whatever the depth.
+    """
+    if before is not None:
+        query = query.where(id_column < before)
+    return query.order_by(id_column.desc()).limit(limit + 1)
+
+
+def session_page(db, user_id, before=None, limit=DEFAULT_SESSION_PAGE):
+    """
+    A user's chat sessions, newest first.
+    """
+    query = select(ChatSession.id, ChatSession.title, ChatSession.created_at).where(ChatSession.user_id == user_id)
+    rows = db.execute(_keyset(query, ChatSession.id, before, limit)).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    items = [{"id": row.id, "title": row.title, "created_at": _timestamp(row.created_at)} for row in rows]
+    return HistoryPage("sessions", items, rows[-1].id if more else None)
+
+
+def session_owner(db, session_id):
+    """
+    The user id owning a session, or None if there is no such session.
+    """
+    return db.execute(select(ChatSession.user_id).where(ChatSession.id == session_id)).scalar()
+
+
+def message_page(db, session_id, before=None, limit=DEFAULT_MESSAGE_PAGE):
+    """
+    The newest `limit` messages of a session older than `before`, oldest first
+    (the order a chat window shows them); `next` pages further back.
+    """
+    query = (
+        select(DbChatMessage.id, DbChatMessage.role, DbChatMessage.content, DbChatMessage.created_at)
+        .where(DbChatMessage.session_id == session_id)
+    )
+    rows = db.execute(_keyset(query, DbChatMessage.id, before, limit)).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    items = [
+        {"id": row.id, "role": row.role, "content": row.content or "", "created_at": _timestamp(row.created_at)}
+        for row in reversed(rows)
+    ]
+    return HistoryPage("messages", items, rows[-1].id if more else None)
@@ -0,0 +1,203 @@
+import time
+import queue
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+
+from db.models import DbChatMessage
+
+logger = logging.getLogger(__name__)
+
+# The rows themselves are bad (a deleted session, an oversized value): retrying cannot succeed
+ROW_ERRORS = (IntegrityError, DataError)
+
+
+class ChatWriteBuffer:
+    """
+    Write-behind persistence for chat messages.
+
+    `add` only enqueues; a background thread bulk-inserts the queued rows in one
+    statement per batch once `max_batch` rows are waiting or `flush_interval` seconds
+    have passed. `stop` (also registered with atexit) drains the queue, so messages
+    accepted before shutdown are written. With write_behind=False every add is written
+    and committed immediately.
+
+    A batch the database rejects is split until the offending rows are found; those
+    are logged and dropped so they cannot block later messages. A batch that fails
+    otherwise (the database is unreachable) is retried with backoff, and dropped
+    after `max_attempts` failed writes.
+    """
+
+    def __init__(self, session_factory, max_batch=100, flush_interval=0.5, write_behind=True, max_attempts=8):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.write_behind = write_behind
+        self.max_attempts = max_attempts
+        self._queue = queue.Queue()
+        self._retry = [] # rows of a failed batch, written first on the next flush
+        self._attempts = 0 # failed writes of the rows in _retry
+        self._retry_at = 0.0
+        self._thread = None
+        self._stopping = threading.Event()
+        self._flush_lock = threading.Lock()
+        self.rows_written = 0
+        self.batches = 0
+        self.failures = 0
+        self.dropped = 0
+
+    def start(self):
+        if not self.write_behind or self._thread:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="chat-write-buffer", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """
+        Stops the writer thread and flushes everything still queued.
+        """
+        if self._thread:
+            self._stopping.set()
+            self._thread.join()
+            self._thread = None
+        self.flush(final=True)
+
+    def add(self, session_id, role, content):
+        row = {
+            "session_id": session_id,
+            "role": role,
+            "content": content,
+            "created_at": datetime.now(timezone.utc)
+        }
+        if self.write_behind and self._thread:
+            self._queue.put(row)
+            return
+        try:
+            self._insert([row])
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Chat history write failed: {e}")
+            raise RuntimeError("Chat history write failed") from e
+
+    def pending(self):
+        return self._queue.qsize() + len(self._retry)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            deadline = time.monotonic() + self.flush_interval
+            while self._queue.qsize() < self.max_batch and time.monotonic() < deadline:
+                if self._stopping.wait(min(0.05, self.flush_interval)):
+                    break
+            self.flush()
+
+    def flush(self, final=False):
+        """
+        Writes all queued rows, one bulk insert per max_batch rows. While a failed
+        batch is backing off, nothing is written (to keep the order) unless `final`.
+        """
+        with self._flush_lock:
+            if self._retry and not final and time.monotonic() < self._retry_at:
+                return
+            while True:
+                batch, self._retry = self._retry[:self.max_batch], self._retry[self.max_batch:]
+                while len(batch) < self.max_batch:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    return
+                left = self._write(batch)
+                if not left:
+                    self._attempts = 0
+                    continue
+                self._attempts += 1
+                if self._attempts >= self.max_attempts:
+                    self.dropped += len(left)
+                    logger.error(f"Dropping {len(left)} chat messages after {self._attempts} failed writes")
+                    self._attempts = 0
+                else:
+                    # Keep the rows (in order) for the next flush
+                    self._retry = left + self._retry
+                    self._retry_at = time.monotonic() + min(30.0, self.flush_interval * 2 ** self._attempts)
+                return
+
+    def _insert(self, rows):
+        db = self.session_factory()
+        try:
+            db.execute(insert(DbChatMessage), rows)
+            db.commit()
+            self.rows_written += len(rows)
+            self.batches += 1
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _write(self, rows):
+        """
+        Writes rows; returns those to retry later (empty when done). Rows the database
+        rejects are isolated by splitting the batch, logged and dropped.
+        """
+        try:
+            self._insert(rows)
+            return []
+        except ROW_ERRORS as e:
+            self.failures += 1
+            if len(rows) == 1:
+                self.dropped += 1
+                logger.error(f"Dropping chat message for session {rows[0]['session_id']} rejected by the database: {e}")
+                return []
+            middle = len(rows) // 2
+            return self._write(rows[:middle]) + self._write(rows[middle:])
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Chat history write failed ({len(rows)} rows kept for retry): {e}")
+            return rows
+
+    def stats(self):
+        return {
+            "write_behind": self.write_behind,
+            "pending": self.pending(),
+            "rows_written": self.rows_written,
+            "batches": self.batches,
+            "failures": self.failures,
+            "dropped": self.dropped
+        }
+
+
+class ActiveSessionCache:
+    """
+    user_id -> id of the user's active ChatSession, so /chat skips the session lookup.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            session_id = self._data.get(user_id)
+            if session_id is not None:
+                self._data.move_to_end(user_id)
+            return session_id
+
+    def set(self, user_id, session_id):
+        with self._lock:
+            self._data[user_id] = session_id
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._data.pop(user_id, None)
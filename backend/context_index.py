@@ -0,0 +1,133 @@
+import os
+import math
+import heapq
+import hashlib
+import logging
+import threading
+from collections import Counter
+
+from json_stream import iter_records
+from tokenizer import tokenize, query_terms
+
+logger = logging.getLogger(__name__)
+
+
+class ContextIndex:
+    """
+    In-memory BM25 index over the posts in a JSON or NDJSON file.
+
+    The file is parsed once and kept as an inverted index (term -> {doc_id: tf}).
+    When the file's mtime changes the index is updated incrementally: only posts
+    whose content was added or removed touch the postings lists.
+    """
+
+    def __init__(self, path, k1=1.5, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._mtime = None
+        self._next_id = 0
+        self._postings = {}      # term -> {doc_id: term frequency}
+        self._docs = {}          # doc_id -> post content
+        self._doc_terms = {}     # doc_id -> Counter of terms
+        self._doc_len = {}       # doc_id -> number of terms
+        self._by_hash = {}       # content hash -> doc_id
+        self._total_len = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def refresh(self):
+        """
+        Re-reads the backing file if its mtime changed since the last build.
+        Returns True when the index was updated.
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            stat = None
+
+        mtime = (stat.st_mtime_ns, stat.st_size) if stat else None
+        if mtime == self._mtime:
+            return False
+
+        with self._lock:
+            if mtime == self._mtime:
+                return False
+            posts = self._load_posts() if stat and stat.st_size else []
+            self._sync(posts)
+            self._mtime = mtime
+        logger.info(f"Context index built from {self.path}: {len(self._docs)} posts, {len(self._postings)} terms")
+        return True
+
+    def _load_posts(self):
+        # Streamed, so large exports and the NDJSON written by ingest.py load without a full parse tree
+        contents = []
+        try:
+            for post, _ in iter_records(self.path):
+                content = post.get("content") if isinstance(post, dict) else None
+                if content:
+                    contents.append(content)
+        except Exception as e:
+            logger.error(f"Error reading context: {e}")
+            # Keep serving the previous index rather than dropping everything
+            return [self._docs[doc_id] for doc_id in self._docs]
+        return contents
+
+    def _sync(self, contents):
+        wanted = {}
+        for content in contents:
+            wanted.setdefault(hashlib.sha1(content.encode("utf-8")).hexdigest(), content)
+
+        for digest in [h for h in self._by_hash if h not in wanted]:
+            self._remove(self._by_hash.pop(digest))
+        for digest, content in wanted.items():
+            if digest not in self._by_hash:
+                self._by_hash[digest] = self._add(content)
+
+    def _add(self, content):
+        doc_id = self._next_id
+        self._next_id += 1
+        terms = Counter(tokenize(content))
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+        self._docs[doc_id] = content
+        self._doc_terms[doc_id] = terms
+        self._doc_len[doc_id] = sum(terms.values())
+        self._total_len += self._doc_len[doc_id]
+        return doc_id
+
+    def _remove(self, doc_id):
+        for term in self._doc_terms.pop(doc_id):
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+        self._total_len -= self._doc_len.pop(doc_id)
+        del self._docs[doc_id]
+
+    def search(self, query, limit=5):
+        """
+        Returns up to `limit` post contents ranked by BM25 relevance to the query.
+        Only the postings of the query terms are visited.
+        """
+        self.refresh()
+        with self._lock:
+            n_docs = len(self._docs)
+            if not n_docs:
+                return []
+            avgdl = self._total_len / n_docs or 1.0
+            scores = {}
+            for term in set(query_terms(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                df = len(postings)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avgdl)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+            return [self._docs[doc_id] for doc_id, _ in best]
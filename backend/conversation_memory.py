@@ -0,0 +1,181 @@
+import re
+import logging
+import threading
+from collections import OrderedDict, deque, namedtuple
+
+from sqlalchemy import select
+
+from db.models import DbChatMessage
+
+logger = logging.getLogger(__name__)
+
+Turn = namedtuple("Turn", ["seq", "role", "content"])
+
+SENTENCE_END = re.compile(r"(?<=[.!?။])\s")
+
+
+def estimate_tokens(text):
+    """
+    Cheap token estimate without a tokenizer: ~4 ASCII characters per token,
+    and ~1.5 characters per token for Burmese and other non-ASCII script.
+    """
+    ascii_chars = sum(1 for ch in text if ch < "\x80")
+    return int(ascii_chars / 4 + (len(text) - ascii_chars) / 1.5) + 1
+
+
+def condense(turn, max_chars=160):
+    """
+    One summary line per dropped turn: its first sentence, clipped.
+    """
+    first = SENTENCE_END.split(turn.content.strip(), 1)[0]
+    if len(first) > max_chars:
+        first = first[:max_chars].rstrip() + "…"
+    speaker = "User" if turn.role == "user" else "Assistant"
+    return f"{speaker}: {first}"
+
+
+class ConversationMemory:
+    """
+    Bounded per-conversation history for prompts.
+
+    The last `max_turns` turns of each conversation are kept in memory, keyed by web
+    session, Telegram chat_id or Messenger sender_id. Web sessions are seeded from
+    chat_messages with one indexed query the first time they are seen. Turns that do
+    not fit `token_budget`, or that fall out of the `max_turns` window, are folded into
+    a running summary, cached per conversation and capped at `summary_budget` tokens,
+    so the prompt stays bounded however long the chat gets.
+
+    With several workers, a web session can be answered by any of them. Each
+    conversation carries the shared version it reflects (see server.py); a
+    worker whose copy is behind reloads it from the DB with `reseed`.
+    """
+
+    def __init__(self, max_turns=20, token_budget=1500, summary_budget=300, max_conversations=5000):
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.max_conversations = max_conversations
+        self._conversations = OrderedDict() # key -> deque of Turn
+        self._summaries = OrderedDict()     # key -> (last folded seq, [summary lines])
+        self._versions = {}                 # key -> shared version the in-memory turns reflect
+        self._last_seq = 0
+        self._lock = threading.Lock()
+
+    def load_session(self, db, session_id):
+        """
+        Returns the last max_turns turns of a web chat session, oldest first.
+        """
+        rows = db.execute(
+            select(DbChatMessage.id, DbChatMessage.role, DbChatMessage.content)
+            .where(DbChatMessage.session_id == session_id)
+            .order_by(DbChatMessage.id.desc())
+            .limit(self.max_turns)
+        ).all()
+        return [Turn(row.id, row.role, row.content or "") for row in reversed(rows)]
+
+    def turns(self, key):
+        """
+        Returns the in-memory turns of a conversation, oldest first.
+        """
+        with self._lock:
+            return list(self._conversations.get(key, ()))
+
+    def has(self, key):
+        return key in self._conversations
+
+    def seed(self, key, turns):
+        """
+        Installs turns loaded from the DB for a conversation not held in memory yet.
+        """
+        with self._lock:
+            if key in self._conversations:
+                return
+            self._conversations[key] = deque(turns, maxlen=self.max_turns)
+            self._last_seq = max([self._last_seq] + [turn.seq for turn in turns])
+
+    def reseed(self, key, turns, version=None):
+        """
+        Replaces a conversation with turns loaded from the DB, dropping its summary.
+        """
+        with self._lock:
+            self._conversations.pop(key, None)
+            self._summaries.pop(key, None)
+            self._versions[key] = version
+        self.seed(key, turns)
+
+    def version(self, key):
+        return self._versions.get(key)
+
+    def set_version(self, key, version):
+        with self._lock:
+            if key in self._conversations:
+                self._versions[key] = version
+
+    def append(self, key, role, content):
+        with self._lock:
+            turns = self._conversations.get(key)
+            if turns is None:
+                turns = self._conversations[key] = deque(maxlen=self.max_turns)
+            self._conversations.move_to_end(key)
+            if len(turns) == turns.maxlen:
+                # The oldest turn is about to leave the window; keep it in the summary
+                self._fold(key, [turns[0]])
+            self._last_seq += 1
+            turns.append(Turn(self._last_seq, role, content))
+            while len(self._conversations) > self.max_conversations:
+                evicted, _ = self._conversations.popitem(last=False)
+                self._summaries.pop(evicted, None)
+                self._versions.pop(evicted, None)
+
+    def prepare(self, key, turns):
+        """
+        Splits turns into (summary text, recent turns) that fit the token budgets.
+        """
+        recent = []
+        used = 0
+        for turn in reversed(turns):
+            cost = estimate_tokens(turn.content)
+            if used + cost > self.token_budget:
+                break
+            recent.append(turn)
+            used += cost
+        recent.reverse()
+        dropped = turns[:len(turns) - len(recent)]
+        return self._roll_summary(key, dropped), recent
+
+    def _roll_summary(self, key, dropped):
+        with self._lock:
+            return "\n".join(self._fold(key, dropped))
+
+    def _fold(self, key, dropped):
+        """
+        Adds turns not summarized yet to the conversation's summary; returns its lines.
+        Called with the lock held.
+        """
+        upto, lines = self._summaries.get(key, (0, []))
+        new_lines = [condense(turn) for turn in dropped if turn.seq > upto]
+        if new_lines:
+            lines = lines + new_lines
+            # Keep the newest lines that fit the summary budget
+            while len(lines) > 1 and sum(estimate_tokens(line) for line in lines) > self.summary_budget:
+                lines = lines[1:]
+            upto = dropped[-1].seq
+        self._summaries[key] = (upto, lines)
+        self._summaries.move_to_end(key)
+        while len(self._summaries) > self.max_conversations:
+            self._summaries.popitem(last=False)
+        return lines
+
+
+def format_history(summary, turns):
+    """
+    Renders memory for the system instruction.
+    """
+    parts = []
+    if summary:
+        parts.append(f"Summary of earlier conversation:\n{summary}")
+    if turns:
+        parts.append("Recent conversation:\n" + "\n".join(
+            f"{'User' if turn.role == 'user' else 'Assistant'}: {turn.content}" for turn in turns
+        ))
+    return "\n\n".join(parts)
@@ -1,11 +1,19 @@
 import os
-import requests
+import asyncio
 import logging
 import json
-import re
-import google.generativeai as genai
-from openai import OpenAI
-from supabase import create_client, Client
+import threading
+from context_index import ContextIndex
+from response_cache import create_response_cache, make_key
+from provider_router import ProviderRouter, ProviderError
+from conversation_memory import ConversationMemory, format_history
+from http_pool import HTTP_POOL
+from prompt_registry import PromptRegistry, GeminiPromptCache
+from ollama_engine import OllamaEngine, current_channel, OLLAMA_WARMUP
+from metrics import span, LLM_TOKENS, PROVIDER_SECONDS, ADMISSION_WAIT_SECONDS
+from shared_state import create_shared_state
+from single_flight import SingleFlight, FlightAbandoned
+from admission import AdmissionController, AdmissionRejected, Caller, current_caller, parse_mapping
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -16,36 +24,113 @@ AI_PROVIDER = os.getenv("AI_PROVIDER", "local").lower()
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://ollama-engine:11434")
 MODEL_NAME = os.getenv("MODEL_NAME", "qwen3:latest")
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+
+# Provider routing: fallback order after AI_PROVIDER, hedging budget and per-call timeout (seconds)
+AI_PROVIDER_FALLBACKS = [p.strip().lower() for p in os.getenv("AI_PROVIDER_FALLBACKS", "").split(",") if p.strip()]
+AI_HEDGE_DELAY = float(os.getenv("AI_HEDGE_DELAY", "0")) or None
+AI_PROVIDER_TIMEOUT = float(os.getenv("AI_PROVIDER_TIMEOUT", "0")) or None
 
 # Gemini Config
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
 
 # OpenAI Config
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL_NAME", "gpt-4-turbo-preview")
-client = None
-if OPENAI_API_KEY:
-    client = OpenAI(api_key=OPENAI_API_KEY)
+GEMINI_MODEL = "gemini-1.5-flash"
 
 # Supabase Config
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY) if SUPABASE_URL and SUPABASE_KEY else None
+
+# Provider SDKs take about a second to import between them, so each one is imported
+# and its client built on first use; a deployment only pays for the providers it calls.
+_clients = {}
+_clients_lock = threading.Lock()
+
+def _lazy_client(name, factory):
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = factory()
+    return client
+
+def _configure_genai():
+    import google.generativeai as genai
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai
+
+def get_genai():
+    """
+    The configured google.generativeai module, or None without GEMINI_API_KEY.
+    """
+    return _lazy_client("genai", _configure_genai) if GEMINI_API_KEY else None
+
+def get_openai_client():
+    """
+    Shared synchronous OpenAI client, or None without OPENAI_API_KEY.
+    """
+    if not OPENAI_API_KEY:
+        return None
+    def create():
+        from openai import OpenAI
+        return OpenAI(api_key=OPENAI_API_KEY)
+    return _lazy_client("openai", create)
+
+def get_async_openai_client():
+    """
+    Shared AsyncOpenAI client, or None without OPENAI_API_KEY.
+    """
+    if not OPENAI_API_KEY:
+        return None
+    def create():
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(api_key=OPENAI_API_KEY)
+    return _lazy_client("async_openai", create)
+
+def get_supabase():
+    """
+    Shared Supabase client, or None when SUPABASE_URL / SUPABASE_KEY are not set.
+    """
+    if not (SUPABASE_URL and SUPABASE_KEY):
+        return None
+    def create():
+        from supabase import create_client
+        return create_client(SUPABASE_URL, SUPABASE_KEY)
+    return _lazy_client("supabase", create)
+
+def get_http_client():
+    """
+    Returns the shared httpx.AsyncClient, so concurrent requests reuse pooled connections.
+    """
+    return HTTP_POOL.async_client()
+
+async def close_http_clients():
+    """
+    Closes the shared HTTP pool and async provider clients (called on server shutdown).
+    """
+    await HTTP_POOL.aclose()
+    async_client = _clients.pop("async_openai", None)
+    if async_client is not None:
+        await async_client.close()
+
+# Settings and counters that must agree across workers (SHARED_STATE=memory|sqlite)
+SHARED_STATE = create_shared_state()
 
 def get_bot_status(token=None):
     """
     Validates the Telegram Bot Token using the getMe API.
     Returns (status, message)
     """
-    token_to_check = token or TELEGRAM_BOT_TOKEN
+    token_to_check = token or get_bot_token()
     if not token_to_check:
         return False, "Token is missing"
     
     try:
-        url = f"https://api.telegram.org/bot{token_to_check}/getMe"
-        response = requests.get(url, timeout=5)
+        url = f"{TELEGRAM_API_URL}/bot{token_to_check}/getMe"
+        response = HTTP_POOL.request("telegram", "GET", url)
         if response.status_code == 200:
             data = response.json()
             if data.get("ok"):
@@ -55,68 +140,140 @@ def get_bot_status(token=None):
     except Exception as e:
         return False, f"Connection Error: {str(e)}"
 
+def get_bot_token():
+    """
+    The bot token set through /settings (in any worker), else TELEGRAM_BOT_TOKEN.
+    """
+    token = SHARED_STATE.get("settings:telegram_bot_token")
+    return TELEGRAM_BOT_TOKEN if token is None else token
+
 def set_bot_token(token):
     """
-    Updates the global bot token (in memory).
+    Updates the bot token for every worker sharing SHARED_STATE.
     """
-    global TELEGRAM_BOT_TOKEN
-    TELEGRAM_BOT_TOKEN = token
+    SHARED_STATE.set("settings:telegram_bot_token", token)
+
+async def get_bot_token_async():
+    token = await SHARED_STATE.aget("settings:telegram_bot_token")
+    return TELEGRAM_BOT_TOKEN if token is None else token
+
+async def set_bot_token_async(token):
+    await SHARED_STATE.aset("settings:telegram_bot_token", token)
+
+# Named system prompts, reloaded when prompts/system_prompts.md changes
+PROMPT_REGISTRY = PromptRegistry()
+
+# Local model options (keep_alive, num_ctx/num_thread, per-channel num_predict), warm-up and timings
+OLLAMA_ENGINE = OllamaEngine(OLLAMA_URL, MODEL_NAME, HTTP_POOL)
+
+# Provider-side prompt caching for the stable system prompt prefix
+OPENAI_PROMPT_CACHE_KEY = os.getenv("OPENAI_PROMPT_CACHE_KEY", "on").lower() != "off"
+GEMINI_PROMPT_CACHE = None
+if GEMINI_API_KEY and os.getenv("GEMINI_PROMPT_CACHE", "off").lower() == "on":
+    # Cached content needs an explicitly versioned model name
+    GEMINI_CACHE_MODEL = os.getenv("GEMINI_CACHE_MODEL", f"models/{GEMINI_MODEL}-001")
 
-def load_prompts():
+    def create_gemini_cached_content(text, ttl):
+        get_genai()
+        from google.generativeai import caching
+        return caching.CachedContent.create(model=GEMINI_CACHE_MODEL, system_instruction=text, ttl=ttl)
+
+    def gemini_cache_refused(error):
+        """
+        A 400 (e.g. prefix below the minimum cacheable token count) or 404 (model
+        without caching support) will not change on retry; quota, auth and server
+        errors might.
+        """
+        from google.api_core import exceptions
+        return isinstance(error, (exceptions.InvalidArgument, exceptions.NotFound))
+
+    GEMINI_PROMPT_CACHE = GeminiPromptCache(
+        PROMPT_REGISTRY,
+        create_gemini_cached_content,
+        ttl=int(os.getenv("GEMINI_PROMPT_CACHE_TTL", "3600")),
+        definitive=gemini_cache_refused,
+        retry_after=float(os.getenv("GEMINI_PROMPT_CACHE_RETRY", "60"))
+    )
+
+def get_gemini_model(system_instruction):
     """
-    Parses prompts/system_prompts.md and returns a dictionary of prompts.
+    Returns (model, extra instruction). With GEMINI_PROMPT_CACHE=on the stable prefix
+    comes from cached content and the rest of the instruction is sent with the message.
     """
-    prompts = {
-        "analysis": "You are a professional assistant.",
-        "chat": "You are a helpful assistant."
-    }
-    prompt_file = "prompts/system_prompts.md"
-    try:
-        if os.path.exists(prompt_file):
-            with open(prompt_file, "r", encoding="utf-8") as f:
-                content = f.read()
-                
-            analysis_match = re.search(r"## Analysis Prompt\n(.*?)(?=\n##|$)", content, re.DOTALL)
-            chat_match = re.search(r"## Chat Prompt\n(.*?)(?=\n##|$)", content, re.DOTALL)
-            
-            if analysis_match:
-                prompts["analysis"] = analysis_match.group(1).strip()
-            if chat_match:
-                prompts["chat"] = chat_match.group(1).strip()
-                
-            logger.info(f"System prompts loaded from {prompt_file}")
-    except Exception as e:
-        logger.error(f"Error loading prompts: {e}")
-    return prompts
+    genai = get_genai()
+    cached = GEMINI_PROMPT_CACHE.lookup(system_instruction) if GEMINI_PROMPT_CACHE else None
+    if cached:
+        cached_content, remainder = cached
+        return genai.GenerativeModel.from_cached_content(cached_content), remainder
+    return genai.GenerativeModel(model_name=GEMINI_MODEL, system_instruction=system_instruction), ""
+
+async def get_gemini_model_async(system_instruction):
+    if GEMINI_PROMPT_CACHE is None:
+        return get_gemini_model(system_instruction)
+    # Creating cached content is a blocking API call
+    return await asyncio.to_thread(get_gemini_model, system_instruction)
+
+def gemini_contents(user_input, extra):
+    return [extra, user_input] if extra else user_input
+
+def openai_cache_args(system_instruction):
+    """
+    Routes requests sharing a system prompt prefix to the same OpenAI prompt cache.
+    """
+    if not OPENAI_PROMPT_CACHE_KEY:
+        return {}
+    prefix, _ = PROMPT_REGISTRY.split(system_instruction)
+    return {"prompt_cache_key": f"prompt-{prefix.digest}"} if prefix else {}
+
+# Built once at startup; refreshed incrementally when posts.json changes
+CONTEXT_INDEX = ContextIndex(os.getenv("POSTS_PATH", "data/posts.json"))
+CONTEXT_INDEX.refresh()
+
+# Context retrieval: 'keyword' (BM25 over posts.json) or 'semantic' (vector search over DocumentEmbedding)
+CONTEXT_RETRIEVAL = os.getenv("CONTEXT_RETRIEVAL", "keyword").lower()
+_retrieval_engine = None
 
-# Initial load
-SYSTEM_PROMPTS = load_prompts()
+def get_retrieval_engine():
+    """
+    Returns the shared semantic RetrievalEngine, created on first use.
+    """
+    global _retrieval_engine
+    if _retrieval_engine is None:
+        from db.database import SessionLocal
+        from retrieval import RetrievalEngine, get_embedder
+        embedder = os.getenv("EMBEDDING_PROVIDER", "local").lower()
+        _retrieval_engine = RetrievalEngine(SessionLocal, get_embedder(embedder, get_openai_client() if embedder == "openai" else None))
+    return _retrieval_engine
 
 def get_context(query):
     """
-    Searches data/posts.json for relevant context based on the query.
-    Simple keyword-based search for now.
+    Returns the most relevant page content for the query.
+    Uses semantic search when enabled and populated, otherwise the in-memory BM25 index.
     """
-    context_file = "data/posts.json"
-    if not os.path.exists(context_file):
-        return ""
-    
+    with span("context"):
+        return _get_context(query)
+
+async def get_context_async(query):
+    """
+    get_context for async handlers. Semantic retrieval (an embedding call and a
+    pgvector query) runs in a worker thread; the in-memory index stays on the loop.
+    """
+    if CONTEXT_RETRIEVAL == "semantic":
+        return await asyncio.to_thread(get_context, query)
+    return get_context(query)
+
+def _get_context(query):
+    if CONTEXT_RETRIEVAL == "semantic":
+        try:
+            results = get_retrieval_engine().search(query, k=5)
+            if results:
+                return "\n\n".join(content for content, _ in results)
+        except Exception as e:
+            logger.error(f"Semantic retrieval error, falling back to keyword search: {e}")
+
     try:
-        if not os.path.exists(context_file) or os.path.getsize(context_file) == 0:
-            return ""
-            
-        with open(context_file, "r", encoding="utf-8") as f:
-            posts = json.load(f)
-            
-        # Basic keyword matching
-        keywords = query.lower().split()
-        relevant_posts = []
-        for post in posts:
-            content = post.get("content", "").lower()
-            if any(kw in content for kw in keywords):
-                relevant_posts.append(post.get("content"))
-        
-        return "\n\n".join(relevant_posts[:5]) # Limit to top 5 matches
+        relevant_posts = CONTEXT_INDEX.search(query, limit=5) # Limit to top 5 matches
+        return "\n\n".join(relevant_posts)
     except Exception as e:
         logger.error(f"Error reading context: {e}")
         return ""
@@ -125,16 +282,13 @@ def ask_ollama(prompt, system_prompt="You are a helpful AI assistant."):
     """
     Generic function to send a prompt to Ollama.
     """
-    payload = {
-        "model": MODEL_NAME,
-        "prompt": f"{system_prompt}\n\nUser: {prompt}\n\nAssistant:",
-        "stream": False
-    }
+    payload = OLLAMA_ENGINE.payload(prompt, system_prompt)
     
     try:
-        response = requests.post(f"{OLLAMA_URL}/api/generate", json=payload)
+        response = HTTP_POOL.request("ollama", "POST", OLLAMA_ENGINE.generate_url, json=payload)
         response.raise_for_status()
         result = response.json()
+        OLLAMA_ENGINE.record(result)
         return result.get("response", "No response from AI.")
     except Exception as e:
         logger.error(f"Error from Ollama: {e}")
@@ -146,17 +300,16 @@ def ask_gemini(user_input, system_instruction):
     """
     if not GEMINI_API_KEY:
         return "Gemini API Key is not configured."
-    model = genai.GenerativeModel(
-        model_name="gemini-1.5-flash",
-        system_instruction=system_instruction
-    )
-    response = model.generate_content(user_input)
+    model, extra = get_gemini_model(system_instruction)
+    response = model.generate_content(gemini_contents(user_input, extra))
+    record_gemini_usage(response)
     return response.text
 
 def ask_openai(user_input, system_instruction):
     """
     Helper for OpenAI.
     """
+    client = get_openai_client()
     if not client:
         return "OpenAI client is not configured."
     response = client.chat.completions.create(
@@ -164,30 +317,453 @@ def ask_openai(user_input, system_instruction):
         messages=[
             {"role": "system", "content": system_instruction},
             {"role": "user", "content": user_input}
-        ]
+        ],
+        **openai_cache_args(system_instruction)
     )
+    record_openai_usage(response)
     return response.choices[0].message.content
 
-def get_ai_response(user_input, context=""):
+def record_usage(provider, prompt_tokens, completion_tokens):
+    LLM_TOKENS.inc(provider, "prompt", amount=prompt_tokens or 0)
+    LLM_TOKENS.inc(provider, "completion", amount=completion_tokens or 0)
+
+def record_openai_usage(response):
+    if getattr(response, "usage", None):
+        record_usage("openai", response.usage.prompt_tokens, response.usage.completion_tokens)
+
+def record_gemini_usage(response):
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        record_usage("gemini", usage.prompt_token_count, usage.candidates_token_count)
+
+def build_system_instruction(context="", history="", channel="web"):
+    """
+    Combines the channel's system prompt with the retrieved context and conversation history.
+    """
+    return PROMPT_REGISTRY.build(channel, context, history)
+
+# Bounded per-conversation memory shared by the web chat and the bots
+CONVERSATION_MEMORY = ConversationMemory(
+    max_turns=int(os.getenv("MEMORY_MAX_TURNS", "20")),
+    token_budget=int(os.getenv("MEMORY_TOKEN_BUDGET", "1500")),
+    summary_budget=int(os.getenv("MEMORY_SUMMARY_BUDGET", "300"))
+)
+
+def get_conversation_history(key):
+    """
+    Returns the formatted, token-bounded history for a conversation.
+    """
+    summary, recent = CONVERSATION_MEMORY.prepare(key, CONVERSATION_MEMORY.turns(key))
+    return format_history(summary, recent)
+
+def remember_turn(key, user_input, response):
+    """
+    Records an exchange in conversation memory (key: web session, chat_id or sender_id).
+    Error and busy replies are not recorded, so they never reach the next prompt.
+    Returns True if the exchange was recorded.
+    """
+    if is_error_reply(response):
+        return False
+    CONVERSATION_MEMORY.append(key, "user", user_input)
+    CONVERSATION_MEMORY.append(key, "ai", response)
+    return True
+
+def without_failed_turns(turns):
+    """
+    Drops failed exchanges (an error or busy reply and the question it answered)
+    from turns loaded from the DB, as remember_turn does for live ones.
+    """
+    kept = []
+    for turn in turns:
+        if turn.role == "ai" and is_error_reply(turn.content):
+            if kept and kept[-1].role == "user":
+                kept.pop()
+            continue
+        kept.append(turn)
+    return kept
+
+# Reply cache in front of the providers (RESPONSE_CACHE=memory|sqlite|off)
+RESPONSE_CACHE = create_response_cache()
+
+def get_model_name(provider=None):
+    """
+    Returns the model used by the given (or configured) provider.
+    """
+    provider = provider or AI_PROVIDER
+    if provider == "gemini":
+        return GEMINI_MODEL
+    if provider == "openai":
+        return OPENAI_MODEL
+    return MODEL_NAME
+
+def is_error_reply(response):
+    """
+    True for the error/config messages the helpers return instead of raising; these are never cached.
+    """
+    return (not response or response.startswith("Error contacting") or response.endswith("is not configured.")
+            or response == BUSY_REPLY)
+
+def get_cached_response(user_input, context="", channel="web"):
+    """
+    Returns (cache_key, cached reply or None). The key is None when caching is disabled.
+    Keys include the prompt digest, so editing the prompts file invalidates old replies.
+    """
+    if RESPONSE_CACHE is None:
+        return None, None
+    key = response_cache_key(user_input, context, channel)
+    return key, RESPONSE_CACHE.get(key)
+
+async def get_cached_response_async(user_input, context="", channel="web"):
+    if RESPONSE_CACHE is None:
+        return None, None
+    key = response_cache_key(user_input, context, channel)
+    return key, await RESPONSE_CACHE.aget(key)
+
+def response_cache_key(user_input, context, channel):
+    return make_key(AI_PROVIDER, get_model_name(), user_input, PROMPT_REGISTRY.prefix(channel).digest, context)
+
+def store_cached_response(cache_key, response):
+    if cache_key and not is_error_reply(response):
+        RESPONSE_CACHE.set(cache_key, response)
+
+async def store_cached_response_async(cache_key, response):
+    if cache_key and not is_error_reply(response):
+        await RESPONSE_CACHE.aset(cache_key, response)
+
+# Identical generations in flight at the same time (a viral post's question) run once
+SINGLE_FLIGHT = SingleFlight(enabled=os.getenv("SINGLE_FLIGHT", "on").lower() != "off")
+
+# Follow-up turns carry conversation history, so by default their replies are not cached
+# and only share a generation within the same conversation. With CACHE_FOLLOW_UPS=on they
+# are keyed on the question and context alone, like first turns: more hits, at the cost
+# of answers that may not take the earlier turns into account.
+CACHE_FOLLOW_UPS = os.getenv("CACHE_FOLLOW_UPS", "off").lower() == "on"
+
+def cacheable(use_cache, history):
+    return use_cache and (CACHE_FOLLOW_UPS or not history)
+
+def flight_key(user_input, system_instruction, context="", history="", channel="web"):
+    """
+    Key of a generation: provider, model, full system prompt (context and history included)
+    and the normalized question. With CACHE_FOLLOW_UPS the history is left out.
+    """
+    if CACHE_FOLLOW_UPS and history:
+        system_instruction = build_system_instruction(context, "", channel)
+    return make_key(AI_PROVIDER, get_model_name(), user_input, system_instruction)
+
+# Admission control in front of the providers: concurrent generations per provider
+# (the local Ollama engine only runs a few at once), fair queueing by channel and
+# caller, per-caller rate limits; shed requests get BUSY_REPLY right away.
+# The concurrency limits are split between the live processes on a shared SHARED_STATE
+# (API workers and the polling bot alike), or ADMISSION_PROCESSES if set
+ADMISSION = AdmissionController(
+    limits=parse_mapping(os.getenv("ADMISSION_CONCURRENCY", ""), default={"local": 2}),
+    weights=parse_mapping(os.getenv("ADMISSION_WEIGHTS", ""), default={"web": 4, "messenger": 1, "telegram": 1}),
+    rate=float(os.getenv("ADMISSION_USER_RATE", "0.5")),
+    burst=int(os.getenv("ADMISSION_USER_BURST", "10")),
+    max_queue=int(os.getenv("ADMISSION_QUEUE_SIZE", "64")),
+    max_queue_per_caller=int(os.getenv("ADMISSION_QUEUE_PER_USER", "4")),
+    max_wait=float(os.getenv("ADMISSION_MAX_WAIT", "20")),
+    enabled=os.getenv("ADMISSION", "on").lower() != "off",
+    observer=lambda provider, channel, seconds: ADMISSION_WAIT_SECONDS.observe(seconds, provider, channel),
+    processes=int(os.getenv("ADMISSION_PROCESSES", "0")) or None,
+    state=SHARED_STATE
+)
+BUSY_REPLY = os.getenv("BUSY_REPLY", "ခဏစောင့်ပေးပါ၊ အခုမေးခွန်းများလွန်းနေလို့ ခဏနေမှ ပြန်မေးပေးပါ။ "
+                                     "The assistant is busy right now, please try again in a minute.")
+
+def admit(user, channel):
+    """
+    Marks the generation about to run as `user`'s (Supabase user id, Telegram chat id or
+    Messenger sender id) for fair queueing, and takes from their rate limit.
+    Raises AdmissionRejected when they are over it.
+    """
+    caller = Caller(f"{channel}:{user}" if user is not None else f"{channel}:anonymous", channel)
+    current_caller.set(caller)
+    ADMISSION.check_rate(caller)
+
+async def admit_async(user, channel):
+    """
+    admit for the async paths; a rate limit in SHARED_STATE is checked off the event loop.
+    """
+    caller = Caller(f"{channel}:{user}" if user is not None else f"{channel}:anonymous", channel)
+    current_caller.set(caller)
+    await ADMISSION.check_rate_async(caller)
+
+def get_ai_response(user_input, context="", use_cache=True, history="", channel="web", user=None):
     """
     Universal AI response function that selects provider based on config.
+    Identical (normalized) questions with the same context are served from the response cache
+    unless use_cache is False. Returns BUSY_REPLY when admission control sheds the request.
     """
-    system_instruction = SYSTEM_PROMPTS.get("chat", "You are a helpful assistant.")
-    if context:
-        system_instruction += f"\n\nUse the following context to answer:\n{context}"
+    cache_key = None
+    # Replies that depend on earlier turns are not reusable across conversations (see CACHE_FOLLOW_UPS)
+    if cacheable(use_cache, history):
+        with span("cache"):
+            cache_key, cached = get_cached_response(user_input, context, channel)
+        if cached is not None:
+            return cached
+
+    current_channel.set(channel)
+    system_instruction = build_system_instruction(context, history, channel)
 
     try:
-        if AI_PROVIDER == "gemini":
-            return ask_gemini(user_input, system_instruction)
-        elif AI_PROVIDER == "openai":
-            return ask_openai(user_input, system_instruction)
-        else:
-            # Fallback to local (Ollama)
-            return ask_ollama(user_input, system_instruction)
+        admit(user, channel)
+        with span("llm"):
+            _, response = SINGLE_FLIGHT.run(flight_key(user_input, system_instruction, context, history, channel),
+                                            PROVIDER_ROUTER.generate_sync, SYNC_PROVIDERS, user_input, system_instruction)
+    except AdmissionRejected:
+        return BUSY_REPLY
     except Exception as e:
         logger.error(f"Error from AI provider ({AI_PROVIDER}): {e}")
         return f"Error contacting AI Provider: {str(e)}"
 
+    store_cached_response(cache_key, response)
+    return response
+
+async def ask_ollama_async(prompt, system_prompt="You are a helpful AI assistant."):
+    """
+    Async version of ask_ollama using the shared HTTP client.
+    """
+    payload = OLLAMA_ENGINE.payload(prompt, system_prompt)
+
+    try:
+        response = await HTTP_POOL.arequest("ollama", "POST", OLLAMA_ENGINE.generate_url, json=payload)
+        response.raise_for_status()
+        result = response.json()
+        OLLAMA_ENGINE.record(result)
+        return result.get("response", "No response from AI.")
+    except Exception as e:
+        logger.error(f"Error from Ollama: {e}")
+        return f"Error contacting AI Engine: {str(e)}"
+
+async def ask_gemini_async(user_input, system_instruction):
+    """
+    Async helper for Gemini.
+    """
+    if not GEMINI_API_KEY:
+        return "Gemini API Key is not configured."
+    model, extra = await get_gemini_model_async(system_instruction)
+    response = await model.generate_content_async(gemini_contents(user_input, extra))
+    record_gemini_usage(response)
+    return response.text
+
+async def ask_openai_async(user_input, system_instruction):
+    """
+    Async helper for OpenAI.
+    """
+    async_client = get_async_openai_client()
+    if not async_client:
+        return "OpenAI client is not configured."
+    response = await async_client.chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=[
+            {"role": "system", "content": system_instruction},
+            {"role": "user", "content": user_input}
+        ],
+        **openai_cache_args(system_instruction)
+    )
+    record_openai_usage(response)
+    return response.choices[0].message.content
+
+async def get_ai_response_async(user_input, context="", use_cache=True, history="", channel="web", user=None):
+    """
+    Async counterpart of get_ai_response for the FastAPI handlers.
+    Never blocks the event loop while the provider is generating.
+    """
+    cache_key = None
+    # Replies that depend on earlier turns are not reusable across conversations (see CACHE_FOLLOW_UPS)
+    if cacheable(use_cache, history):
+        with span("cache"):
+            cache_key, cached = await get_cached_response_async(user_input, context, channel)
+        if cached is not None:
+            return cached
+
+    current_channel.set(channel)
+    system_instruction = build_system_instruction(context, history, channel)
+
+    try:
+        await admit_async(user, channel)
+        with span("llm"):
+            _, response = await SINGLE_FLIGHT.run_async(flight_key(user_input, system_instruction, context, history, channel),
+                                                        PROVIDER_ROUTER.generate, user_input, system_instruction)
+    except AdmissionRejected:
+        return BUSY_REPLY
+    except Exception as e:
+        logger.error(f"Error from AI provider ({AI_PROVIDER}): {e}")
+        return f"Error contacting AI Provider: {str(e)}"
+
+    await store_cached_response_async(cache_key, response)
+    return response
+
+async def stream_ollama(prompt, system_prompt="You are a helpful AI assistant."):
+    """
+    Yields tokens from Ollama's streaming /api/generate as they are produced.
+    """
+    payload = OLLAMA_ENGINE.payload(prompt, system_prompt, stream=True)
+    async with HTTP_POOL.stream("ollama", "POST", OLLAMA_ENGINE.generate_url, json=payload) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if chunk.get("response"):
+                yield chunk["response"]
+            if chunk.get("done"):
+                OLLAMA_ENGINE.record(chunk)
+                break
+
+async def stream_gemini(user_input, system_instruction):
+    """
+    Yields text chunks from Gemini's streaming API.
+    """
+    if not GEMINI_API_KEY:
+        raise ProviderError("Gemini API Key is not configured.")
+    model, extra = await get_gemini_model_async(system_instruction)
+    response = await model.generate_content_async(gemini_contents(user_input, extra), stream=True)
+    async for chunk in response:
+        if chunk.text:
+            yield chunk.text
+
+async def stream_openai(user_input, system_instruction):
+    """
+    Yields content deltas from OpenAI's streaming chat completions.
+    """
+    async_client = get_async_openai_client()
+    if not async_client:
+        raise ProviderError("OpenAI client is not configured.")
+    stream = await async_client.chat.completions.create(
+        model=OPENAI_MODEL,
+        messages=[
+            {"role": "system", "content": system_instruction},
+            {"role": "user", "content": user_input}
+        ],
+        stream=True,
+        **openai_cache_args(system_instruction)
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+async def get_ai_response_stream(user_input, context="", use_cache=True, history="", channel="web", user=None):
+    """
+    Streaming counterpart of get_ai_response_async; yields tokens as the provider emits them.
+    A cached reply is yielded as a single chunk.
+    """
+    cache_key = None
+    # Replies that depend on earlier turns are not reusable across conversations (see CACHE_FOLLOW_UPS)
+    if cacheable(use_cache, history):
+        with span("cache"):
+            cache_key, cached = await get_cached_response_async(user_input, context, channel)
+        if cached is not None:
+            yield cached
+            return
+
+    current_channel.set(channel)
+    system_instruction = build_system_instruction(context, history, channel)
+    try:
+        await admit_async(user, channel)
+    except AdmissionRejected:
+        yield BUSY_REPLY
+        return
+
+    # An identical generation already in flight is awaited and sent as one chunk, like a cache hit;
+    # otherwise this stream leads and the reply it assembles is shared with later identical requests
+    flight = None
+    while SINGLE_FLIGHT.enabled:
+        flight, leading = SINGLE_FLIGHT.begin(flight_key(user_input, system_instruction, context, history, channel))
+        if leading:
+            break
+        try:
+            with span("llm"):
+                _, reply = await SINGLE_FLIGHT.wait_async(flight)
+            yield reply
+            return
+        except FlightAbandoned:
+            continue
+        except AdmissionRejected:
+            yield BUSY_REPLY
+            return
+        except Exception as e:
+            logger.error(f"Error from AI provider ({AI_PROVIDER}): {e}")
+            yield f"Error contacting AI Provider: {str(e)}"
+            return
+
+    tokens = []
+    try:
+        with span("llm"):
+            async for token in PROVIDER_ROUTER.stream(STREAM_PROVIDERS, user_input, system_instruction):
+                tokens.append(token)
+                yield token
+    except AdmissionRejected as e:
+        if flight:
+            SINGLE_FLIGHT.finish(flight, error=e)
+        yield BUSY_REPLY
+        return
+    except Exception as e:
+        if flight:
+            SINGLE_FLIGHT.finish(flight, error=e)
+        logger.error(f"Error from AI provider ({AI_PROVIDER}): {e}")
+        yield f"Error contacting AI Provider: {str(e)}"
+        return
+    except BaseException:
+        # Client went away mid-stream: anyone waiting generates for themselves
+        if flight:
+            SINGLE_FLIGHT.abandon(flight)
+        raise
+
+    if flight:
+        SINGLE_FLIGHT.finish(flight, (None, "".join(tokens)))
+    await store_cached_response_async(cache_key, "".join(tokens))
+
+def _raise_on_error_reply(ask):
+    """
+    Adapts a provider helper (which returns error strings) to the router's raise-on-failure contract.
+    """
+    if asyncio.iscoroutinefunction(ask):
+        async def call(user_input, system_instruction):
+            reply = await ask(user_input, system_instruction)
+            if is_error_reply(reply):
+                raise ProviderError(reply)
+            return reply
+    else:
+        def call(user_input, system_instruction):
+            reply = ask(user_input, system_instruction)
+            if is_error_reply(reply):
+                raise ProviderError(reply)
+            return reply
+    return call
+
+SYNC_PROVIDERS = {
+    "gemini": _raise_on_error_reply(ask_gemini),
+    "openai": _raise_on_error_reply(ask_openai),
+    "local": _raise_on_error_reply(ask_ollama)
+}
+ASYNC_PROVIDERS = {
+    "gemini": _raise_on_error_reply(ask_gemini_async),
+    "openai": _raise_on_error_reply(ask_openai_async),
+    "local": _raise_on_error_reply(ask_ollama_async)
+}
+STREAM_PROVIDERS = {
+    "gemini": stream_gemini,
+    "openai": stream_openai,
+    "local": stream_ollama
+}
+
+# Any unknown AI_PROVIDER value falls back to local (Ollama), as before
+PRIMARY_PROVIDER = AI_PROVIDER if AI_PROVIDER in ("gemini", "openai") else "local"
+PROVIDER_ROUTER = ProviderRouter(
+    ASYNC_PROVIDERS,
+    order=[PRIMARY_PROVIDER] + [p for p in AI_PROVIDER_FALLBACKS if p != PRIMARY_PROVIDER],
+    hedge_delay=AI_HEDGE_DELAY,
+    timeout=AI_PROVIDER_TIMEOUT,
+    observer=lambda provider, seconds, ok: PROVIDER_SECONDS.observe(seconds, provider, "ok" if ok else "error"),
+    admission=ADMISSION
+)
+
 # Alias for backward compatibility if needed, but we should update callers
 def get_gemini_response(user_input, context=""):
     return get_ai_response(user_input, context)
+
+def should_warm_ollama():
+    return OLLAMA_WARMUP and "local" in PROVIDER_ROUTER.order
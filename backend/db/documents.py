@@ -0,0 +1,34 @@
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Index
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from pgvector.sqlalchemy import Vector
+from .database import Base
+
+class CompanyDocument(Base):
+    __tablename__ = "company_documents"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    title = Column(String, index=True)
+    description = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    embeddings = relationship("DocumentEmbedding", back_populates="document", cascade="all, delete-orphan")
+
+class DocumentEmbedding(Base):
+    __tablename__ = "document_embeddings"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("company_documents.id"))
+    content = Column(Text) # The chunk of text
+    embedding = Column(Vector(1536)) # Dimension matches OpenAI text-embedding-3-small or Gemini
+    
+    document = relationship("CompanyDocument", back_populates="embeddings")
+
+# Approximate nearest-neighbour index for cosine search (pgvector only; SQLite uses brute force)
+Index(
+    "ix_document_embeddings_embedding_hnsw",
+    DocumentEmbedding.embedding,
+    postgresql_using="hnsw",
+    postgresql_with={"m": 16, "ef_construction": 64},
+    postgresql_ops={"embedding": "vector_cosine_ops"},
+).ddl_if(dialect="postgresql")
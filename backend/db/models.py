@@ -1,7 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Boolean, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from pgvector.sqlalchemy import Vector
 from .database import Base
 
 import uuid
@@ -21,6 +20,12 @@ class User(Base):
 
 class ChatSession(Base):
     __tablename__ = "chat_sessions"
+    __table_args__ = (
+        # Serves "newest session of a user" without a sort
+        Index("ix_chat_sessions_user_id_created_at", "user_id", "created_at"),
+        # Serves keyset pages of a user's sessions (GET /sessions)
+        Index("ix_chat_sessions_user_id_id", "user_id", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     # Map to Supabase UUID
@@ -33,6 +38,11 @@ class ChatSession(Base):
 
 class DbChatMessage(Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        # Serves "last N messages of a session" (conversation memory) and keyset
+        # pages of a session's history (GET /sessions/{id}/messages)
+        Index("ix_chat_messages_session_id_id", "session_id", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(Integer, ForeignKey("chat_sessions.id"))
@@ -42,22 +52,18 @@ class DbChatMessage(Base):
     
     session = relationship("ChatSession", back_populates="messages")
 
-class CompanyDocument(Base):
-    __tablename__ = "company_documents"
-    
-    id = Column(Integer, primary_key=True, index=True)
-    title = Column(String, index=True)
-    description = Column(Text, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    
-    embeddings = relationship("DocumentEmbedding", back_populates="document", cascade="all, delete-orphan")
+class IngestCheckpoint(Base):
+    __tablename__ = "ingest_checkpoints"
 
-class DocumentEmbedding(Base):
-    __tablename__ = "document_embeddings"
-    
-    id = Column(Integer, primary_key=True, index=True)
-    document_id = Column(Integer, ForeignKey("company_documents.id"))
-    content = Column(Text) # The chunk of text
-    embedding = Column(Vector(1536)) # Dimension matches OpenAI text-embedding-3-small or Gemini
-    
-    document = relationship("CompanyDocument", back_populates="embeddings")
+    # Checkpoint path given to ingest.py; its hash log stays in <name>.hashes
+    name = Column(String(255), primary_key=True)
+    state = Column(Text) # JSON: per-source offsets, hash count and stats
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+def __getattr__(name):
+    # The document tables need pgvector, which is slow to import; they live in
+    # db.documents and are loaded only by semantic retrieval and the setup/ingest scripts
+    if name in ("CompanyDocument", "DocumentEmbedding"):
+        from . import documents
+        return getattr(documents, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,328 @@
+import os
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+import requests
+import httpx
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
+
+logger = logging.getLogger(__name__)
+
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "50"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+
+try:
+    import h2  # noqa: F401 (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+HTTP2_ENABLED = HTTP2_AVAILABLE and os.getenv("HTTP2", "on").lower() != "off"
+
+# Timeouts in seconds; retries apply to connection failures (see may_retry) and `retry_statuses`
+Destination = namedtuple("Destination", ["connect_timeout", "read_timeout", "retries", "backoff", "retry_statuses"])
+
+DESTINATIONS = {
+    # Generations are slow and expensive, so a read timeout is never retried
+    "ollama": Destination(5.0, float(os.getenv("OLLAMA_TIMEOUT", "300")), 1, 0.5, (502, 503)),
+    "graph": Destination(5.0, float(os.getenv("GRAPH_API_TIMEOUT", "10")), HTTP_MAX_RETRIES, 0.5, (429, 500, 502, 503, 504)),
+    "telegram": Destination(5.0, float(os.getenv("TELEGRAM_API_TIMEOUT", "10")), HTTP_MAX_RETRIES, 0.5, (429, 500, 502, 503, 504)),
+    "default": Destination(5.0, 30.0, HTTP_MAX_RETRIES, 0.5, (502, 503, 504))
+}
+
+RETRYABLE_SYNC_ERRORS = (requests.exceptions.ConnectionError,)
+RETRYABLE_ASYNC_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError, httpx.PoolTimeout)
+# Failures before the request was sent; anything later may have reached the remote,
+# so only idempotent methods are retried on it (a second POST could send a reply twice)
+NOT_SENT_ASYNC_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+def may_retry(method, error):
+    """
+    True if a request that failed with `error` can be sent again without risking a duplicate.
+    """
+    if method.upper() in IDEMPOTENT_METHODS:
+        return True
+    if isinstance(error, httpx.HTTPError):
+        return isinstance(error, NOT_SENT_ASYNC_ERRORS)
+    # requests wraps urllib3's MaxRetryError, whose reason says whether the connection was ever made
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(error, requests.exceptions.ConnectTimeout) or isinstance(reason, ConnectTimeoutError)
+
+
+def may_retry_status(method, response, retry_statuses):
+    """
+    True if a response with this status should be retried. A 5xx to a POST may come
+    after the message was delivered, so non-idempotent requests are only retried when
+    the remote says it did not process them: 429, or 503 with Retry-After.
+    """
+    if response.status_code not in retry_statuses:
+        return False
+    if method.upper() in IDEMPOTENT_METHODS:
+        return True
+    return response.status_code == 429 or (response.status_code == 503 and "Retry-After" in response.headers)
+
+
+def backoff_delay(destination, attempt, response=None):
+    """
+    Full-jitter exponential backoff; honours Retry-After when the remote sends one.
+    """
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), 30.0)
+    return random.uniform(0, destination.backoff * (2 ** attempt))
+
+
+class DestinationStats:
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.connections_opened = 0 # async client (counted by trace); sync pools are read at snapshot time
+        self.total_seconds = 0.0
+        self.hosts = set()          # hosts reached through the sync session
+
+    def snapshot(self, sync_pools):
+        opened = self.connections_opened + sum(
+            pool["opened"] for host, pool in sync_pools.items() if host.split("://", 1)[1] in self.hosts
+        )
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "errors": self.errors,
+            "connections_opened": opened,
+            "connection_reuse": round(max(0, 1 - opened / self.requests), 4) if self.requests else None,
+            "mean_seconds": round(self.total_seconds / self.requests, 4) if self.requests else None
+        }
+
+
+class HttpPool:
+    """
+    Shared outbound HTTP layer.
+
+    One requests.Session (for the Telegram bot and other thread-based callers) and one
+    httpx.AsyncClient (for the FastAPI app) keep connections alive across messages, so
+    only the first call to a host pays for the TCP/TLS handshake. The async client
+    negotiates HTTP/2 with remotes that offer it. Each call names a destination from
+    DESTINATIONS, which sets its timeouts and retry policy.
+    """
+
+    def __init__(self, pool_size=HTTP_POOL_SIZE, destinations=DESTINATIONS, http2=HTTP2_ENABLED):
+        self.pool_size = pool_size
+        self.destinations = destinations
+        self.http2 = http2
+        self._session = None
+        self._async_client = None
+        self._async_loop = None
+        self._lock = threading.Lock()
+        self._stats = {name: DestinationStats() for name in destinations}
+
+    def policy(self, destination):
+        return self.destinations.get(destination) or self.destinations["default"]
+
+    def timeout(self, destination):
+        policy = self.policy(destination)
+        return httpx.Timeout(policy.read_timeout, connect=policy.connect_timeout)
+
+    def _record(self, destination):
+        return self._stats.setdefault(destination, DestinationStats())
+
+    def session(self):
+        """
+        Returns the shared requests.Session (thread-safe for plain requests).
+        """
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=len(self.destinations), pool_maxsize=self.pool_size)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session = session
+        return self._session
+
+    def async_client(self):
+        """
+        Returns the shared httpx.AsyncClient, so concurrent requests reuse pooled connections.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        # Connections are bound to the loop that opened them (CLI tools may run several loops)
+        if self._async_client is None or self._async_client.is_closed or self._async_loop is not loop:
+            self._retire_async_client()
+            self._async_loop = loop
+            self._async_client = httpx.AsyncClient(
+                http2=self.http2,
+                timeout=self.timeout("default"),
+                limits=httpx.Limits(
+                    max_connections=self.pool_size * 2,
+                    max_keepalive_connections=self.pool_size,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+                )
+            )
+        return self._async_client
+
+    def _retire_async_client(self):
+        """
+        Closes the client being replaced, on the loop its connections belong to. Once
+        that loop has closed its sockets can no longer be released: whoever runs a loop
+        calls aclose() before it ends (the server's lifespan, the batch CLI).
+        """
+        client, loop = self._async_client, self._async_loop
+        if client is None or client.is_closed:
+            return
+        if loop is not None and loop.is_running():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        else:
+            logger.warning("Dropping an HTTP client whose event loop ended without HttpPool.aclose()")
+
+    def request(self, destination, method, url, timeout=None, **kwargs):
+        """
+        Blocking request through the shared session, retried per the destination policy.
+        `timeout` (a number or (connect, read) tuple) overrides the policy's timeouts.
+        """
+        policy = self.policy(destination)
+        stats = self._record(destination)
+        timeout = timeout or (policy.connect_timeout, policy.read_timeout)
+        session = self.session()
+        parts = urlsplit(url)
+        stats.hosts.add(f"{parts.hostname}:{parts.port or (443 if parts.scheme == 'https' else 80)}")
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            stats.requests += 1
+            try:
+                response = session.request(method, url, timeout=timeout, **kwargs)
+            except RETRYABLE_SYNC_ERRORS as e:
+                response = None
+                error = e
+            except Exception:
+                stats.errors += 1
+                raise
+            finally:
+                stats.total_seconds += time.monotonic() - started
+
+            if response is not None and not may_retry_status(method, response, policy.retry_statuses):
+                return response
+            if attempt >= policy.retries or (response is None and not may_retry(method, error)):
+                if response is not None:
+                    return response
+                stats.errors += 1
+                raise error
+            attempt += 1
+            stats.retries += 1
+            delay = backoff_delay(policy, attempt, response)
+            logger.warning(f"Retrying {destination} request in {delay:.2f}s ({response.status_code if response is not None else error})")
+            time.sleep(delay)
+
+    async def arequest(self, destination, method, url, **kwargs):
+        """
+        Async request through the shared client, retried per the destination policy.
+        """
+        policy = self.policy(destination)
+        stats = self._record(destination)
+        kwargs.setdefault("timeout", self.timeout(destination))
+        client = self.async_client()
+
+        async def trace(event_name, info):
+            if event_name == "connection.connect_tcp.complete":
+                stats.connections_opened += 1
+
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            stats.requests += 1
+            try:
+                response = await client.request(method, url, extensions={"trace": trace}, **kwargs)
+            except RETRYABLE_ASYNC_ERRORS as e:
+                response = None
+                error = e
+            except Exception:
+                stats.errors += 1
+                raise
+            finally:
+                stats.total_seconds += time.monotonic() - started
+
+            if response is not None and not may_retry_status(method, response, policy.retry_statuses):
+                return response
+            if attempt >= policy.retries or (response is None and not may_retry(method, error)):
+                if response is not None:
+                    return response
+                stats.errors += 1
+                raise error
+            attempt += 1
+            stats.retries += 1
+            delay = backoff_delay(policy, attempt, response)
+            logger.warning(f"Retrying {destination} request in {delay:.2f}s ({response.status_code if response is not None else error})")
+            await asyncio.sleep(delay)
+
+    def stream(self, destination, method, url, **kwargs):
+        """
+        Streaming request on the shared async client (no retries: tokens may already be consumed).
+        """
+        stats = self._record(destination)
+        stats.requests += 1
+        kwargs.setdefault("timeout", self.timeout(destination))
+
+        async def trace(event_name, info):
+            if event_name == "connection.connect_tcp.complete":
+                stats.connections_opened += 1
+
+        return self.async_client().stream(method, url, extensions={"trace": trace}, **kwargs)
+
+    def telegram_sender(self, method, url, **kwargs):
+        """
+        Request sender for telebot (apihelper.CUSTOM_REQUEST_SENDER), so the bot
+        reuses this pool instead of a session per thread.
+        """
+        return self.request("telegram", method, url, **kwargs)
+
+    def pool_stats(self):
+        """
+        Connections held by the sync session's per-host pools.
+        """
+        hosts = {}
+        if self._session is not None:
+            for adapter in set(self._session.adapters.values()):
+                for key in list(adapter.poolmanager.pools.keys()):
+                    pool = adapter.poolmanager.pools.get(key)
+                    if pool is not None:
+                        hosts[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                            "opened": pool.num_connections,
+                            "requests": pool.num_requests,
+                            "idle": pool.pool.qsize() if pool.pool else 0
+                        }
+        return hosts
+
+    def stats(self):
+        sync_pools = self.pool_stats()
+        return {
+            "pool_size": self.pool_size,
+            "http2": self.http2,
+            "destinations": {name: stats.snapshot(sync_pools) for name, stats in self._stats.items()},
+            "sync_pools": sync_pools
+        }
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+HTTP_POOL = HttpPool()
@@ -0,0 +1,399 @@
+import os
+import sys
+import json
+import time
+import re
+import hashlib
+import logging
+import argparse
+
+from burmese import normalize
+from json_stream import iter_records, detect_format
+from retrieval import chunk_text
+
+logger = logging.getLogger(__name__)
+
+# Fields that hold a post's text, in order of preference
+TEXT_FIELDS = ("content", "message", "text", "post", "description", "story")
+HASH_SIZE = 16
+# Ignored when comparing posts, along with whitespace: punctuation (incl. Burmese ၊ ။), symbols and emoji
+DEDUP_IGNORED = re.compile(
+    "[!-/:-@\\[-`{-~\u00a1-\u00bf\u104a\u104b\u2000-\u206f\u2190-\u2bff\u3000-\u303f\ufe0f\uff01-\uff0f"
+    "\U0001f000-\U0001faff]+"
+)
+# A UTF-8 lead byte followed by a continuation byte, read as Latin-1
+UTF8_AS_LATIN1 = re.compile("[\xc2-\xf4][\x80-\xbf]")
+BEYOND_LATIN1 = re.compile("[^\x00-\xff]")
+
+
+def fix_mojibake(text):
+    """
+    Facebook's "Download your information" export writes UTF-8 bytes as \\u00XX
+    escapes, so Burmese arrives as Latin-1 garbage ("á\\x80\\x80..."). Undo that.
+    """
+    if not UTF8_AS_LATIN1.search(text) or BEYOND_LATIN1.search(text):
+        return text
+    try:
+        return text.encode("latin-1").decode("utf-8")
+    except UnicodeError:
+        return text
+
+
+def post_text(record):
+    """
+    The text of a post from our own {"content"} records, Graph API {"message"}
+    objects or the Facebook export (text in data[].post).
+    """
+    if isinstance(record, str):
+        return fix_mojibake(record)
+    if not isinstance(record, dict):
+        return ""
+    for field in TEXT_FIELDS:
+        value = record.get(field)
+        if isinstance(value, str) and value.strip():
+            return fix_mojibake(value)
+    parts = [item["post"] for item in record.get("data") or [] if isinstance(item, dict) and isinstance(item.get("post"), str)]
+    return fix_mojibake("\n".join(parts))
+
+
+def post_title(record, text):
+    title = record.get("title") if isinstance(record, dict) else None
+    return fix_mojibake(title) if isinstance(title, str) and title.strip() else text[:80]
+
+
+def content_hash(text):
+    """
+    Dedup key: posts that differ only in case, punctuation or spacing (which Burmese
+    uses loosely) are duplicates.
+    """
+    key = DEDUP_IGNORED.sub("", "".join(text.casefold().split()))
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=HASH_SIZE).digest()
+
+
+class IngestStats:
+    def __init__(self, saved=None):
+        saved = saved or {}
+        self.records = saved.get("records", 0)
+        self.bytes = saved.get("bytes", 0)
+        self.posts = saved.get("posts", 0)
+        self.chunks = saved.get("chunks", 0)
+        self.duplicates = saved.get("duplicates", 0)
+        self.empty = saved.get("empty", 0)
+        self.zawgyi = saved.get("zawgyi", 0)
+        self.elapsed = saved.get("elapsed", 0.0)
+        self._started = time.monotonic()
+        self._elapsed_before = self.elapsed
+
+    def tick(self):
+        self.elapsed = self._elapsed_before + time.monotonic() - self._started
+
+    def as_dict(self):
+        self.tick()
+        elapsed = self.elapsed or 1e-9
+        return {
+            "records": self.records,
+            "bytes": self.bytes,
+            "posts": self.posts,
+            "chunks": self.chunks,
+            "duplicates": self.duplicates,
+            "empty": self.empty,
+            "zawgyi": self.zawgyi,
+            "elapsed": round(self.elapsed, 3),
+            "records_per_s": round(self.records / elapsed, 1),
+            "mb_per_s": round(self.bytes / elapsed / 1e6, 2),
+            "chunks_per_s": round(self.chunks / elapsed, 1)
+        }
+
+    def summary(self):
+        s = self.as_dict()
+        return (f"{s['records']} records ({s['bytes'] / 1e6:.1f} MB) in {s['elapsed']:.1f} s: {s['posts']} posts, "
+                f"{s['chunks']} chunks, {s['duplicates']} duplicates, {s['empty']} empty, {s['zawgyi']} converted from Zawgyi; "
+                f"{s['records_per_s']} records/s, {s['mb_per_s']} MB/s")
+
+
+class Checkpoint:
+    """
+    Resumable progress in a JSON file: per source (path, size, mtime) the byte
+    offset after the last committed record, the output size at that point and the
+    running stats. Hashes of all content written so far are appended to
+    <checkpoint>.hashes, so duplicates are also skipped across runs and sources.
+    Every save happens after the sink has committed, so a crash loses at most the
+    uncommitted batch, which is re-read on resume. Sinks that keep the checkpoint
+    in their own transaction (DatabaseSink) pass the saved `state` in instead and
+    commit it with the batch; the JSON file is then not used.
+    """
+
+    def __init__(self, path, state=None):
+        self.path = path
+        self.hashes_path = path + ".hashes"
+        self.state = {"sources": {}, "hash_count": 0, "output_size": None, "stats": {}}
+        if state is not None:
+            self.state.update(state)
+        elif os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.state.update(json.load(f))
+        self.seen = set()
+        self._new_hashes = []
+        self._load_hashes()
+
+    def _load_hashes(self):
+        count = self.state["hash_count"]
+        if not os.path.exists(self.hashes_path):
+            return
+        with open(self.hashes_path, "r+b") as f:
+            data = f.read(count * HASH_SIZE)
+            # Drop hashes of a batch that was written but never checkpointed
+            f.truncate(len(data))
+        self.seen = {data[i:i + HASH_SIZE] for i in range(0, len(data), HASH_SIZE)}
+
+    @staticmethod
+    def _identity(source):
+        stat = os.stat(source)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    def resume_offset(self, source):
+        """
+        Byte offset to continue a source from, or None if it was fully ingested.
+        A source that changed since the checkpoint starts over (dedup skips what was ingested).
+        """
+        entry = self.state["sources"].get(os.path.abspath(source))
+        if not entry:
+            return 0
+        if {k: entry.get(k) for k in ("size", "mtime_ns")} != self._identity(source):
+            logger.warning(f"{source} changed since the last run; reading it from the start")
+            return 0
+        return None if entry.get("done") else entry.get("offset", 0)
+
+    def add(self, digest):
+        """
+        Records a content hash; returns False if it was seen before.
+        """
+        if digest in self.seen:
+            return False
+        self.seen.add(digest)
+        self._new_hashes.append(digest)
+        return True
+
+    def update(self, source, offset, stats, output_size=None, done=False):
+        """
+        Advances the state past `offset` of `source`. New hashes are fsynced first;
+        any beyond the saved hash count are dropped again on load.
+        """
+        if self._new_hashes:
+            with open(self.hashes_path, "ab") as f:
+                f.write(b"".join(self._new_hashes))
+                f.flush()
+                os.fsync(f.fileno())
+            self.state["hash_count"] += len(self._new_hashes)
+            self._new_hashes = []
+        entry = self._identity(source)
+        entry.update({"offset": offset, "done": done})
+        self.state["sources"][os.path.abspath(source)] = entry
+        self.state["output_size"] = output_size
+        self.state["stats"] = stats.as_dict()
+
+    def save(self, source, offset, stats, output_size=None, done=False):
+        self.update(source, offset, stats, output_size, done)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+class IndexSink:
+    """
+    Appends chunks as NDJSON {"content", "post_id", "chunk"} lines: the compact
+    on-disk format ContextIndex loads (point POSTS_PATH at it).
+    """
+
+    stores_checkpoint = False
+
+    def __init__(self, path, resume_size=None):
+        self.path = path
+        self.f = open(path, "ab")
+        if resume_size is not None and self.f.tell() > resume_size:
+            # Lines written after the last checkpoint are written again on resume
+            self.f.truncate(resume_size)
+            self.f.seek(resume_size)
+
+    def write(self, post_id, title, chunks):
+        lines = [json.dumps({"content": chunk, "post_id": post_id, "chunk": i}, ensure_ascii=False) for i, chunk in enumerate(chunks)]
+        self.f.write(("\n".join(lines) + "\n").encode("utf-8"))
+
+    def commit(self):
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        return self.f.tell()
+
+    def close(self):
+        self.f.close()
+
+
+class DatabaseSink:
+    """
+    Writes posts to CompanyDocument / DocumentEmbedding through RetrievalEngine.
+    Each batch is committed in one transaction with the checkpoint state (an
+    IngestCheckpoint row named after the checkpoint path), so the documents and
+    the offset past them are stored together or not at all.
+    """
+
+    stores_checkpoint = True
+
+    def __init__(self, engine, name):
+        self.engine = engine
+        self.name = name
+        self._pending = []
+
+    def load_checkpoint(self):
+        from db.models import IngestCheckpoint
+        db = self.engine.session_factory()
+        try:
+            row = db.get(IngestCheckpoint, self.name)
+            return json.loads(row.state) if row else {}
+        finally:
+            db.close()
+
+    def clear_checkpoint(self):
+        from db.models import IngestCheckpoint
+        db = self.engine.session_factory()
+        try:
+            db.query(IngestCheckpoint).filter(IngestCheckpoint.name == self.name).delete()
+            db.commit()
+        finally:
+            db.close()
+
+    def write(self, post_id, title, chunks):
+        self._pending.append({"title": title, "content": "\n".join(chunks), "chunks": chunks})
+
+    def commit(self, state):
+        from db.models import IngestCheckpoint
+        db = self.engine.session_factory()
+        try:
+            self.engine.ingest(self._pending, db=db)
+            db.merge(IngestCheckpoint(name=self.name, state=json.dumps(state)))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        self._pending = []
+
+    def close(self):
+        pass
+
+
+def commit_batch(sink, checkpoint, source, offset, stats, done=False):
+    """
+    Commits the sink and records `offset` in the checkpoint: in the sink's own
+    transaction if it keeps the checkpoint, else right after the sink's commit
+    (output past the checkpointed size is truncated on resume).
+    """
+    if sink.stores_checkpoint:
+        checkpoint.update(source, offset, stats, done=done)
+        sink.commit(checkpoint.state)
+    else:
+        checkpoint.save(source, offset, stats, sink.commit(), done=done)
+
+
+def ingest(sources, sink, checkpoint, fmt="auto", encoding="auto", chunk_size=800, chunk_overlap=100,
+           batch_size=500, progress_interval=10.0):
+    """
+    Streams posts from JSON/NDJSON exports into a sink: Burmese normalisation
+    (Zawgyi -> Unicode), content-hash dedup, chunking, and a checkpoint after every
+    `batch_size` new posts. Returns the IngestStats (cumulative across resumed runs).
+    """
+    stats = IngestStats(checkpoint.state.get("stats"))
+    last_report = time.monotonic()
+    for source in sources:
+        start = checkpoint.resume_offset(source)
+        if start is None:
+            logger.info(f"{source}: already ingested")
+            continue
+        source_format = detect_format(source) if fmt == "auto" else fmt
+        logger.info(f"{source}: reading {source_format} from byte {start}")
+        offset, pending = start, 0
+        for record, end in iter_records(source, source_format, start):
+            stats.records += 1
+            stats.bytes += end - offset
+            offset = end
+
+            text = post_text(record)
+            if not text.strip():
+                stats.empty += 1
+                continue
+            text, converted = normalize(text, encoding)
+            if not checkpoint.add(content_hash(text)):
+                stats.duplicates += 1
+                continue
+            chunks = chunk_text(text, chunk_size, chunk_overlap)
+            record_id = record.get("id") if isinstance(record, dict) else None
+            sink.write(record_id, post_title(record, text), chunks)
+            stats.posts += 1
+            stats.chunks += len(chunks)
+            stats.zawgyi += converted
+            pending += 1
+
+            if pending >= batch_size:
+                commit_batch(sink, checkpoint, source, offset, stats)
+                pending = 0
+            if time.monotonic() - last_report >= progress_interval:
+                logger.info(f"{source}: {stats.summary()}")
+                last_report = time.monotonic()
+        commit_batch(sink, checkpoint, source, offset, stats, done=True)
+    logger.info(f"Done: {stats.summary()}")
+    return stats
+
+
+if __name__ == "__main__":
+    # Usage: python ingest.py export.json [more.ndjson ...] --output data/posts.ndjson
+    parser = argparse.ArgumentParser(description="Streams Facebook page exports (JSON or NDJSON) into the knowledge base.")
+    parser.add_argument("sources", nargs="+", help="JSON array, {\"data\": [...]} or NDJSON files")
+    parser.add_argument("--target", choices=("index", "db"), default="index",
+                        help="'index': NDJSON file for keyword retrieval (POSTS_PATH); 'db': CompanyDocument/DocumentEmbedding")
+    parser.add_argument("--output", default="data/posts.ndjson", help="output file for --target index")
+    parser.add_argument("--format", choices=("auto", "json", "ndjson"), default="auto")
+    parser.add_argument("--encoding", choices=("auto", "zawgyi", "unicode"), default="auto",
+                        help="Burmese encoding of the posts; 'auto' detects Zawgyi per post")
+    parser.add_argument("--chunk-size", type=int, default=800)
+    parser.add_argument("--chunk-overlap", type=int, default=100)
+    parser.add_argument("--batch", type=int, default=500, help="posts per commit and checkpoint")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: next to the output)")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint and start over")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+
+    checkpoint_path = args.checkpoint or (args.output if args.target == "index" else "data/ingest_db") + ".checkpoint.json"
+    if args.restart:
+        for path in (checkpoint_path, checkpoint_path + ".hashes"):
+            if os.path.exists(path):
+                os.remove(path)
+        if args.target == "index" and os.path.exists(args.output):
+            os.remove(args.output)
+
+    if args.target == "db":
+        from db.database import Base, engine, SessionLocal
+        from retrieval import RetrievalEngine, get_embedder
+        Base.metadata.create_all(bind=engine)
+        sink = DatabaseSink(RetrievalEngine(SessionLocal, get_embedder()), checkpoint_path)
+        if args.restart:
+            sink.clear_checkpoint()
+        checkpoint = Checkpoint(checkpoint_path, sink.load_checkpoint())
+    else:
+        checkpoint = Checkpoint(checkpoint_path)
+        sink = IndexSink(args.output, checkpoint.state.get("output_size"))
+
+    try:
+        stats = ingest(args.sources, sink, checkpoint, args.format, args.encoding, args.chunk_size,
+                       args.chunk_overlap, args.batch)
+    except KeyboardInterrupt:
+        print(f"Interrupted; run the same command again to resume from {checkpoint_path}")
+        sys.exit(130)
+    finally:
+        sink.close()
+    print(json.dumps(stats.as_dict(), indent=2))
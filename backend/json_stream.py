@@ -0,0 +1,139 @@
+import re
+import json
+import codecs
+
+# Arrays of posts inside a wrapping object, e.g. a Graph API dump {"data": [...], "paging": {...}}
+ARRAY_KEY = re.compile(r'"(?:data|posts|items)"\s*:\s*\[')
+WHITESPACE = " \t\r\n"
+
+
+def detect_format(path, probe=1 << 20):
+    """
+    'ndjson' for one JSON object per line (by extension, or when the first line is
+    a complete object that is not a {"data": [...]} wrapper), otherwise 'json'.
+    """
+    if path.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    with open(path, "rb") as f:
+        first_line = f.readline(probe).strip().lstrip(codecs.BOM_UTF8)
+    if first_line.startswith(b"{"):
+        try:
+            record = json.loads(first_line)
+        except ValueError:
+            return "json"
+        if not any(isinstance(record.get(key), list) for key in ("data", "posts", "items")):
+            return "ndjson"
+    return "json"
+
+
+def iter_records(path, fmt="auto", offset=0, chunk_size=1 << 20):
+    """
+    Streams the records of a JSON array (top-level, or the "data"/"posts"/"items"
+    array of a wrapping object) or an NDJSON file without loading the file.
+
+    Yields (record, end offset). The offset is in bytes and can be passed back as
+    `offset` to resume right after that record.
+    """
+    if fmt == "auto":
+        fmt = detect_format(path)
+    if fmt == "ndjson":
+        yield from _iter_ndjson(path, offset)
+    else:
+        yield from _iter_array(path, offset, chunk_size)
+
+
+def _iter_ndjson(path, offset):
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line_no, line in enumerate(f, 1):
+            offset += len(line)
+            line = line.strip().lstrip(codecs.BOM_UTF8)
+            if not line:
+                continue
+            try:
+                yield json.loads(line), offset
+            except ValueError as e:
+                raise ValueError(f"{path}: invalid JSON on line {line_no} after the start offset: {e}") from None
+
+
+class _Reader:
+    """
+    Decoded text buffer over a binary file that knows the byte offset of its start.
+    """
+
+    def __init__(self, f, offset, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.position = 0      # index into buffer
+        self.offset = offset   # byte offset of buffer[position]
+        self.eof = False
+
+    def fill(self):
+        data = self.f.read(self.chunk_size)
+        self.eof = not data
+        self.buffer = self.buffer[self.position:] + self.decoder.decode(data, final=self.eof)
+        self.position = 0
+        return not self.eof
+
+    def consume(self, end):
+        """
+        Advances to buffer index `end`, keeping the byte offset in step.
+        """
+        self.offset += len(self.buffer[self.position:end].encode("utf-8"))
+        self.position = end
+
+    def skip(self, chars):
+        """
+        Skips characters in `chars`; returns the next other character or '' at EOF.
+        """
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in chars:
+                self.consume(self.position + 1)
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self.fill():
+                return ""
+
+
+def _iter_array(path, offset, chunk_size):
+    decoder = json.JSONDecoder()
+    at_start = offset == 0
+    with open(path, "rb") as f:
+        if at_start and f.read(len(codecs.BOM_UTF8)) == codecs.BOM_UTF8:
+            offset = len(codecs.BOM_UTF8)
+        f.seek(offset)
+        reader = _Reader(f, offset, chunk_size)
+
+        if at_start:
+            first = reader.skip(WHITESPACE)
+            if first == "{":
+                # Find the records array inside the wrapping object
+                while True:
+                    match = ARRAY_KEY.search(reader.buffer, reader.position)
+                    if match:
+                        reader.consume(match.end())
+                        break
+                    if not reader.fill():
+                        raise ValueError(f"{path}: no data/posts/items array in the top-level object")
+            elif first == "[":
+                reader.consume(reader.position + 1)
+            else:
+                raise ValueError(f"{path}: expected a JSON array or object")
+
+        while True:
+            if reader.skip(WHITESPACE + ",") in ("]", ""):
+                return
+            while True:
+                try:
+                    record, end = decoder.raw_decode(reader.buffer, reader.position)
+                    # A value that ends exactly at the buffer's end may continue (numbers)
+                    if end < len(reader.buffer) or reader.eof:
+                        break
+                except ValueError:
+                    if reader.eof:
+                        raise ValueError(f"{path}: invalid JSON at byte {reader.offset}") from None
+                reader.fill()
+            reader.consume(end)
+            yield record, reader.offset
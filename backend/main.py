@@ -1,55 +1,52 @@
 import os
-import telebot
 import logging
-from core import get_context, get_ai_response, SYSTEM_PROMPTS
+from telegram_runtime import TelegramRuntime
+from core import get_bot_token
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Environment Variables
-TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+# The token saved through /settings when SHARED_STATE is shared with the API, else TELEGRAM_BOT_TOKEN
+TELEGRAM_BOT_TOKEN = get_bot_token()
+# The bot has no HTTP app; set a port to expose /metrics from a side thread
+METRICS_PORT = int(os.getenv("BOT_METRICS_PORT", "0"))
 
 if TELEGRAM_BOT_TOKEN:
-    bot = telebot.TeleBot(TELEGRAM_BOT_TOKEN)
+    # Updates are answered concurrently across chats (TELEGRAM_WORKERS), in order within a chat
+    runtime = TelegramRuntime(TELEGRAM_BOT_TOKEN)
+    bot = runtime.bot
 else:
     logger.error("TELEGRAM_BOT_TOKEN is not set. Bot will not function.")
+    runtime = None
     bot = None
 
-if bot:
-    @bot.message_handler(commands=['start', 'help'])
-    def send_welcome(message):
-        bot.reply_to(message, "Welcome to your AI Assistant! I am now powered by multiple AI providers (Gemini, OpenAI, or Local). Feel free to ask me anything.")
-
-    @bot.message_handler(func=lambda message: True)
-    def handle_chat(message):
-        """
-        Handles free conversation with the AI using selected provider and local context.
-        """
-        chat_id = message.chat.id
-        user_input = message.text
-        
-        # Show typing status
-        bot.send_chat_action(chat_id, 'typing')
-        
-        logger.info(f"User is chatting: {user_input[:50]}...")
-        
-        # 1. Get Context
-        context = get_context(user_input)
-        
-        # 2. Get AI Response
-        response = get_ai_response(user_input, context)
-        
-        bot.reply_to(message, response)
-
 if __name__ == "__main__":
-    from core import get_bot_status
+    import threading
+    from core import get_bot_status, OLLAMA_ENGINE, should_warm_ollama
     if not TELEGRAM_BOT_TOKEN:
         logger.error("TELEGRAM_BOT_TOKEN not found in environment variables!")
-    elif bot:
+    elif os.getenv("TELEGRAM_WEBHOOK_URL"):
+        logger.error("TELEGRAM_WEBHOOK_URL is set: updates are served by the API server (run.py), not by polling.")
+    elif runtime:
         status, msg = get_bot_status(TELEGRAM_BOT_TOKEN)
         if status:
             logger.info("Starting Telegram Bot...")
-            bot.infinity_polling()
+            if METRICS_PORT:
+                from metrics import REGISTRY, start_metrics_server
+
+                @REGISTRY.collector
+                def collect_bot_metrics():
+                    stats = runtime.dispatcher.stats()
+                    yield "assistant_telegram_pending", "gauge", "Telegram messages queued for a worker.", [({}, stats["pending"])]
+                    yield "assistant_telegram_busy_workers", "gauge", "Telegram workers handling a message.", [({}, stats["busy"])]
+                    yield "assistant_telegram_messages_total", "counter", "Telegram messages by outcome.", [
+                        ({"outcome": outcome}, stats[outcome]) for outcome in ("processed", "failed", "rejected")
+                    ]
+
+                start_metrics_server(METRICS_PORT)
+            if should_warm_ollama():
+                threading.Thread(target=OLLAMA_ENGINE.warm_up, name="ollama-warmup", daemon=True).start()
+            runtime.run_polling()
         else:
             logger.error(f"Telegram Bot error: {msg}. Please check the token.")
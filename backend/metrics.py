@@ -0,0 +1,311 @@
+import os
+import time
+import json
+import uuid
+import bisect
+import logging
+import threading
+from contextvars import ContextVar
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+logger = logging.getLogger(__name__)
+trace_logger = logging.getLogger("trace")
+
+METRICS_ENABLED = os.getenv("METRICS", "on").lower() != "off"
+TRACE_LOG = os.getenv("TRACE_LOG", "on").lower() != "off"
+# Requests faster than this are counted but not logged as traces
+TRACE_LOG_MIN_MS = float(os.getenv("TRACE_LOG_MIN_MS", "0"))
+
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (list(extra.items()) if extra else [])
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, total in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, values)} {total}")
+        return lines
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram; `observe` is a bisect and three additions under a lock.
+    """
+
+    def __init__(self, name, help, labels=(), buckets=STAGE_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {} # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((values, list(series)) for values, series in self._series.items())
+        for values, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, values, {'le': bound})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, values)} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, values)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Metrics rendered in the Prometheus text format.
+
+    Counters and histograms are updated on the hot path; `collector` functions are
+    called only at scrape time and read gauges (queue depths, cache hit counts)
+    from the stats the components already keep.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help, labels=()):
+        metric = Counter(name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labels=(), buckets=STAGE_BUCKETS):
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        """
+        Registers fn() -> iterable of (name, type, help, [(labels dict, value), ...]).
+        """
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            try:
+                families = list(collect())
+            except Exception as e:
+                logger.error(f"Metrics collector {getattr(collect, '__name__', collect)} failed: {e}")
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    if value is not None:
+                        lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "assistant_http_request_duration_seconds", "HTTP request latency by route and status.", ("method", "route", "status")
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "assistant_stage_duration_seconds", "Latency of each pipeline stage (auth, session, context, llm, ...).", ("channel", "stage")
+)
+PROVIDER_SECONDS = REGISTRY.histogram(
+    "assistant_provider_duration_seconds", "End-to-end LLM generation latency by provider and outcome.", ("provider", "outcome")
+)
+ADMISSION_WAIT_SECONDS = REGISTRY.histogram(
+    "assistant_admission_wait_seconds", "Time a generation queued for a provider slot, by provider and channel.", ("provider", "channel")
+)
+LLM_TOKENS = REGISTRY.counter(
+    "assistant_llm_tokens_total", "Tokens reported by the providers.", ("provider", "kind")
+)
+
+
+# The trace of the request being handled: dict with id, channel and spans, or None
+current_trace = ContextVar("current_trace", default=None)
+
+
+class _NoopSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("stage", "trace", "started")
+
+    def __init__(self, stage, trace):
+        self.stage = stage
+        self.trace = trace
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        elapsed = time.perf_counter() - self.started
+        channel = self.trace["channel"] if self.trace else "-"
+        STAGE_SECONDS.observe(elapsed, channel, self.stage)
+        if self.trace is not None:
+            self.trace["spans"].append({
+                "stage": self.stage,
+                "start_ms": round((self.started - self.trace["started"]) * 1000, 3),
+                "ms": round(elapsed * 1000, 3),
+                "error": exc_type.__name__ if exc_type else None
+            })
+        return False
+
+
+def span(stage):
+    """
+    Times a pipeline stage: `with span("context"): ...`. Works in sync and async code
+    and in worker threads started with a copied context (FastAPI's sync dependencies).
+    """
+    if not METRICS_ENABLED:
+        return NOOP_SPAN
+    return Span(stage, current_trace.get())
+
+
+def start_trace(name, channel):
+    """
+    Starts a request trace; returns (trace, contextvar token) for finish_trace.
+    """
+    trace = {"trace_id": uuid.uuid4().hex[:16], "name": name, "channel": channel, "started": time.perf_counter(), "spans": []}
+    return trace, current_trace.set(trace)
+
+
+def finish_trace(trace, token=None, **attrs):
+    """
+    Ends a trace and emits it as one structured (JSON) log line.
+    """
+    if token is not None:
+        current_trace.reset(token)
+    duration_ms = (time.perf_counter() - trace["started"]) * 1000
+    if TRACE_LOG and duration_ms >= TRACE_LOG_MIN_MS:
+        record = {
+            "trace_id": trace["trace_id"],
+            "name": trace["name"],
+            "channel": trace["channel"],
+            "duration_ms": round(duration_ms, 3),
+            "spans": trace["spans"]
+        }
+        record.update(attrs)
+        trace_logger.info(json.dumps(record, ensure_ascii=False))
+
+
+class trace_request:
+    """
+    Context manager for non-HTTP work (bot messages, webhook events).
+    """
+
+    def __init__(self, name, channel, **attrs):
+        self.name = name
+        self.channel = channel
+        self.attrs = attrs
+
+    def __enter__(self):
+        if METRICS_ENABLED:
+            self.trace, self.token = start_trace(self.name, self.channel)
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if METRICS_ENABLED:
+            elapsed = time.perf_counter() - self.trace["started"]
+            STAGE_SECONDS.observe(elapsed, self.channel, "total")
+            finish_trace(self.trace, self.token, error=exc_type.__name__ if exc_type else None, **self.attrs)
+        return False
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: per-route latency histogram and a trace per HTTP request.
+    The clock stops when the last body chunk is sent, so streamed replies are
+    measured to their end.
+    """
+
+    def __init__(self, app, channel="web"):
+        self.app = app
+        self.channel = channel
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        trace, token = start_trace(f"{scope['method']} {scope['path']}", self.channel)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - trace["started"]
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.observe(elapsed, scope["method"], route_path, str(status["code"]))
+            finish_trace(trace, token, route=route_path, status=status["code"])
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host="0.0.0.0"):
+    """
+    Serves /metrics from a background thread, for processes without an HTTP app (the Telegram bot).
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Metrics served on :{port}/metrics")
+    return server
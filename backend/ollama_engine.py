@@ -0,0 +1,217 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from contextvars import ContextVar
+
+from provider_router import LatencyHistogram
+from metrics import LLM_TOKENS
+
+logger = logging.getLogger(__name__)
+
+
+def parse_keep_alive(value):
+    """
+    Ollama reads a JSON number as seconds and a string as a Go duration ("10m", "24h").
+    A bare "-1" is not a valid duration, so numeric values are sent as numbers.
+    """
+    value = str(value).strip()
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+OLLAMA_KEEP_ALIVE = parse_keep_alive(os.getenv("OLLAMA_KEEP_ALIVE", "-1")) # -1 keeps the model loaded indefinitely
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "4096"))
+OLLAMA_NUM_THREAD = int(os.getenv("OLLAMA_NUM_THREAD", "0")) # 0: physical cores of this host
+OLLAMA_NUM_PREDICT = os.getenv("OLLAMA_NUM_PREDICT", "web=1024,telegram=768,messenger=512")
+OLLAMA_WARMUP = os.getenv("OLLAMA_WARMUP", "on").lower() != "off"
+OLLAMA_WARMUP_ATTEMPTS = int(os.getenv("OLLAMA_WARMUP_ATTEMPTS", "30"))
+
+# A load_duration above this means the request paid for (re)loading the model
+COLD_LOAD_THRESHOLD = 0.5
+
+# Channel of the request being answered; set by core.get_ai_response* so the
+# provider helpers can pick the channel's num_predict without new arguments
+current_channel = ContextVar("current_channel", default=None)
+
+
+def physical_cores():
+    """
+    Physical cores available to this process. llama.cpp runs slower on SMT siblings,
+    so hyper-threads are not counted when /proc/cpuinfo says which ones they are.
+    """
+    try:
+        available = len(os.sched_getaffinity(0))
+    except AttributeError:
+        available = os.cpu_count() or 1
+    try:
+        cores = set()
+        physical_id = core_id = None
+        with open("/proc/cpuinfo", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                key = key.strip()
+                if key == "physical id":
+                    physical_id = value.strip()
+                elif key == "core id":
+                    core_id = value.strip()
+                elif not key and core_id is not None:
+                    cores.add((physical_id, core_id))
+                    physical_id = core_id = None
+        if core_id is not None:
+            cores.add((physical_id, core_id))
+        if cores:
+            return max(1, min(available, len(cores)))
+    except OSError:
+        pass
+    return max(1, available)
+
+
+def parse_num_predict(value):
+    """
+    "web=1024,telegram=768" -> {"web": 1024, "telegram": 768}
+    """
+    limits = {}
+    for item in value.split(","):
+        channel, _, limit = item.partition("=")
+        if channel.strip() and limit.strip():
+            limits[channel.strip().lower()] = int(limit)
+    return limits
+
+
+class OllamaEngine:
+    """
+    Request options, warm-up and timing metrics for the local Ollama model.
+
+    Every generation carries the same keep_alive and num_ctx/num_thread options, so
+    Ollama never reloads the model to change them, and a per-channel num_predict
+    cap. `warm_up` loads the model before the first user arrives (Ollama loads a
+    model on an empty prompt), retrying while the engine is still starting or
+    pulling. The load/eval durations Ollama reports with each reply feed the metrics.
+    """
+
+    def __init__(self, base_url, model, http_pool, keep_alive=OLLAMA_KEEP_ALIVE, num_ctx=OLLAMA_NUM_CTX,
+                 num_thread=OLLAMA_NUM_THREAD, num_predict=OLLAMA_NUM_PREDICT):
+        self.base_url = base_url
+        self.model = model
+        self.http_pool = http_pool
+        self.keep_alive = keep_alive
+        self.num_ctx = num_ctx
+        self.num_thread = num_thread or physical_cores()
+        self.num_predict = parse_num_predict(num_predict) if isinstance(num_predict, str) else dict(num_predict)
+        self.warm = False
+        self.warmed_at = None
+        self.generations = 0
+        self.cold_loads = 0
+        self.prompt_tokens = 0
+        self.eval_tokens = 0
+        self.eval_seconds = 0.0
+        self.load = LatencyHistogram()
+        self.prompt_eval = LatencyHistogram()
+        self.eval = LatencyHistogram()
+        self._lock = threading.Lock()
+
+    @property
+    def generate_url(self):
+        return f"{self.base_url}/api/generate"
+
+    def options(self, channel=None):
+        options = {"num_ctx": self.num_ctx, "num_thread": self.num_thread}
+        limit = self.num_predict.get(channel or current_channel.get() or "")
+        if limit:
+            options["num_predict"] = limit
+        return options
+
+    def payload(self, prompt, system_prompt, stream=False, channel=None):
+        return {
+            "model": self.model,
+            "prompt": f"{system_prompt}\n\nUser: {prompt}\n\nAssistant:",
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+            "options": self.options(channel)
+        }
+
+    def record(self, result):
+        """
+        Records the timings of a finished generation (the final `done` object).
+        Durations are reported by Ollama in nanoseconds.
+        """
+        load = result.get("load_duration", 0) / 1e9
+        prompt_eval = result.get("prompt_eval_duration", 0) / 1e9
+        evaluation = result.get("eval_duration", 0) / 1e9
+        with self._lock:
+            self.generations += 1
+            if load > COLD_LOAD_THRESHOLD:
+                self.cold_loads += 1
+                logger.warning(f"Ollama reloaded {self.model} for a request ({load:.1f}s)")
+            self.load.observe(load)
+            self.prompt_eval.observe(prompt_eval)
+            self.eval.observe(evaluation)
+            self.prompt_tokens += result.get("prompt_eval_count", 0)
+            self.eval_tokens += result.get("eval_count", 0)
+            self.eval_seconds += evaluation
+        LLM_TOKENS.inc("local", "prompt", amount=result.get("prompt_eval_count", 0))
+        LLM_TOKENS.inc("local", "completion", amount=result.get("eval_count", 0))
+
+    def _warm_payload(self):
+        return {"model": self.model, "prompt": "", "stream": False, "keep_alive": self.keep_alive, "options": self.options()}
+
+    def _warmed(self, result, started):
+        self.warm = True
+        self.warmed_at = time.time()
+        load = result.get("load_duration", 0) / 1e9
+        with self._lock:
+            self.load.observe(load)
+        logger.info(f"Ollama model {self.model} warm (load {load:.2f}s, total {time.monotonic() - started:.2f}s)")
+
+    def warm_up(self, attempts=OLLAMA_WARMUP_ATTEMPTS, delay=2.0):
+        """
+        Loads the model and pins it with keep_alive. Returns True once it is loaded.
+        """
+        started = time.monotonic()
+        for attempt in range(attempts):
+            try:
+                response = self.http_pool.request("ollama", "POST", self.generate_url, json=self._warm_payload())
+                response.raise_for_status()
+                self._warmed(response.json(), started)
+                return True
+            except Exception as e:
+                logger.info(f"Ollama not ready for warm-up (attempt {attempt + 1}/{attempts}): {e}")
+                time.sleep(delay)
+        logger.error(f"Ollama warm-up gave up after {attempts} attempts")
+        return False
+
+    async def warm_up_async(self, attempts=OLLAMA_WARMUP_ATTEMPTS, delay=2.0):
+        started = time.monotonic()
+        for attempt in range(attempts):
+            try:
+                response = await self.http_pool.arequest("ollama", "POST", self.generate_url, json=self._warm_payload())
+                response.raise_for_status()
+                self._warmed(response.json(), started)
+                return True
+            except Exception as e:
+                logger.info(f"Ollama not ready for warm-up (attempt {attempt + 1}/{attempts}): {e}")
+                await asyncio.sleep(delay)
+        logger.error(f"Ollama warm-up gave up after {attempts} attempts")
+        return False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "model": self.model,
+                "warm": self.warm,
+                "warmed_at": self.warmed_at,
+                "keep_alive": self.keep_alive,
+                "options": {"num_ctx": self.num_ctx, "num_thread": self.num_thread, "num_predict": self.num_predict},
+                "generations": self.generations,
+                "cold_loads": self.cold_loads,
+                "prompt_tokens": self.prompt_tokens,
+                "eval_tokens": self.eval_tokens,
+                "tokens_per_second": round(self.eval_tokens / self.eval_seconds, 2) if self.eval_seconds else None,
+                "load_duration": self.load.snapshot(),
+                "prompt_eval_duration": self.prompt_eval.snapshot(),
+                "eval_duration": self.eval.snapshot()
+            }
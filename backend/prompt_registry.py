@@ -0,0 +1,231 @@
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+PROMPTS_FILE = os.getenv("PROMPTS_FILE", "prompts/system_prompts.md")
+PROMPTS_CHECK_INTERVAL = float(os.getenv("PROMPTS_CHECK_INTERVAL", "2"))
+
+DEFAULT_PROMPTS = {
+    "analysis": "You are a professional assistant.",
+    "chat": "You are a helpful assistant."
+}
+
+# Channels fall back to the chat prompt unless the file has a section for them
+CHANNELS = ("web", "telegram", "messenger")
+
+HEADING = re.compile(r"^##[ \t]+(.+?)[ \t]*$", re.MULTILINE)
+
+# One immutable snapshot per file version; swapped in a single assignment on reload
+PromptSet = namedtuple("PromptSet", ["version", "prompts", "prefixes", "loaded_at"])
+Prefix = namedtuple("Prefix", ["text", "digest"])
+
+
+def parse_prompts(content):
+    """
+    Splits the prompts file into named templates.
+
+    `## Chat Prompt`, `## Telegram Prompt`, ... headings start a template named by the
+    heading without the trailing "Prompt". Text before the first heading (or the whole
+    file, if it has no headings) is the chat prompt.
+    """
+    prompts = dict(DEFAULT_PROMPTS)
+    headings = list(HEADING.finditer(content))
+    preamble = content[:headings[0].start()] if headings else content
+    if preamble.strip():
+        prompts["chat"] = preamble.strip()
+    for i, match in enumerate(headings):
+        end = headings[i + 1].start() if i + 1 < len(headings) else len(content)
+        body = content[match.end():end].strip()
+        name = re.sub(r"\s+prompt$", "", match.group(1).strip(), flags=re.IGNORECASE).lower()
+        if body:
+            prompts[name] = body
+    return prompts
+
+
+class PromptRegistry:
+    """
+    Named system prompts loaded from the prompts file and reloaded when it changes.
+
+    The file is re-checked (mtime and size) at most every `check_interval` seconds
+    when a prompt is read; a changed file is parsed into a new snapshot and swapped
+    in at once, so a request never sees half of an edit. The stable prefix of each
+    channel's system instruction is assembled once per version, together with a
+    digest that response-cache keys and provider prompt caches are keyed on.
+    """
+
+    def __init__(self, path=PROMPTS_FILE, check_interval=PROMPTS_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._signature = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.reloads = 0
+        self._snapshot = self._build(DEFAULT_PROMPTS, "default")
+        self.refresh(force=True)
+
+    def _build(self, prompts, version):
+        prefixes = {}
+        for channel in set(CHANNELS) | set(prompts):
+            text = prompts.get(channel) or prompts["chat"]
+            prefixes[channel] = Prefix(text, hashlib.sha256(text.encode("utf-8")).hexdigest()[:16])
+        return PromptSet(version, prompts, prefixes, datetime.now(timezone.utc).isoformat())
+
+    def refresh(self, force=False):
+        """
+        Reloads the file if it changed. Returns True when a new version was loaded.
+        """
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return False
+        with self._lock:
+            self._next_check = now + self.check_interval
+            try:
+                stat = os.stat(self.path)
+            except OSError:
+                return False
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if signature == self._signature:
+                return False
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    content = f.read()
+                stat = os.stat(self.path)
+            except Exception as e:
+                logger.error(f"Error loading prompts: {e}")
+                return False
+            if not content.strip() or (stat.st_mtime_ns, stat.st_size) != signature:
+                # Caught mid-write (truncated or still changing); keep the current version
+                self._next_check = now
+                return False
+            self._signature = signature
+            version = hashlib.sha256(content.encode("utf-8")).hexdigest()[:12]
+            if version == self._snapshot.version:
+                return False
+            self._snapshot = self._build(parse_prompts(content), version)
+            self.reloads += 1
+            logger.info(f"System prompts loaded from {self.path} (version {version})")
+            return True
+
+    def snapshot(self):
+        self.refresh()
+        return self._snapshot
+
+    def get(self, name, default=None):
+        return self.snapshot().prompts.get(name, default)
+
+    def prefix(self, channel="web"):
+        """
+        The cached stable part of the system instruction for a channel.
+        """
+        prefixes = self.snapshot().prefixes
+        return prefixes.get(channel) or prefixes["chat"]
+
+    def build(self, channel="web", context="", history=""):
+        """
+        Stable prefix first, then the per-request context and history, so providers
+        that cache prompt prefixes can reuse the system prompt across requests.
+        """
+        parts = [self.prefix(channel).text]
+        if context:
+            parts.append(f"Use the following context to answer:\n{context}")
+        if history:
+            parts.append(history)
+        return "\n\n".join(parts)
+
+    def split(self, system_instruction):
+        """
+        Returns (Prefix, remainder) if the instruction starts with a current channel
+        prefix, else (None, system_instruction).
+        """
+        matches = [prefix for prefix in self.snapshot().prefixes.values() if system_instruction.startswith(prefix.text)]
+        if not matches:
+            return None, system_instruction
+        prefix = max(matches, key=lambda p: len(p.text))
+        return prefix, system_instruction[len(prefix.text):].lstrip("\n")
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            "path": self.path,
+            "version": snapshot.version,
+            "loaded_at": snapshot.loaded_at,
+            "reloads": self.reloads,
+            "templates": sorted(snapshot.prompts),
+            "channels": {channel: snapshot.prefixes[channel].digest for channel in CHANNELS}
+        }
+
+
+class GeminiPromptCache:
+    """
+    Gemini cached-content handles for the stable channel prefixes.
+
+    `create(text, ttl)` uploads a system instruction as cached content and returns
+    the handle; it is called once per prefix digest and again shortly before the
+    cache expires. Prefixes the API refuses to cache for good (`definitive(error)`,
+    e.g. below the model's minimum cacheable size) are remembered and sent inline
+    from then on; any other failure sends them inline for `retry_after` seconds
+    before trying to create the cache again.
+    """
+
+    def __init__(self, registry, create, ttl=3600, definitive=None, retry_after=60):
+        self.registry = registry
+        self.create = create
+        self.ttl = ttl
+        self.definitive = definitive or (lambda error: False)
+        self.retry_after = retry_after
+        self._handles = {} # digest -> (renew_at, cached content)
+        self._refused = set()
+        self._retry_at = {} # digest -> monotonic time of the next create attempt
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    def lookup(self, system_instruction):
+        """
+        Returns (cached content, remainder of the instruction) or None.
+        """
+        prefix, remainder = self.registry.split(system_instruction)
+        if prefix is None or prefix.digest in self._refused:
+            self.misses += 1
+            return None
+        with self._lock:
+            entry = self._handles.get(prefix.digest)
+            now = time.monotonic()
+            if entry is None or entry[0] <= now:
+                if self._retry_at.get(prefix.digest, 0) > now:
+                    self.misses += 1
+                    return None
+                try:
+                    handle = self.create(prefix.text, self.ttl)
+                except Exception as e:
+                    self.failures += 1
+                    self.misses += 1
+                    if self.definitive(e):
+                        logger.warning(f"Gemini refused to cache prefix {prefix.digest}, sending it inline: {e}")
+                        self._refused.add(prefix.digest)
+                    else:
+                        logger.warning(f"Gemini prompt caching failed for prefix {prefix.digest}, retrying in {self.retry_after}s: {e}")
+                        self._retry_at[prefix.digest] = now + self.retry_after
+                    return None
+                self._retry_at.pop(prefix.digest, None)
+                entry = self._handles[prefix.digest] = (time.monotonic() + self.ttl * 0.9, handle)
+        self.hits += 1
+        return entry[1], remainder
+
+    def stats(self):
+        return {
+            "cached_prefixes": len(self._handles),
+            "refused": len(self._refused),
+            "backing_off": sum(1 for retry_at in self._retry_at.values() if retry_at > time.monotonic()),
+            "failures": self.failures,
+            "hits": self.hits,
+            "misses": self.misses
+        }
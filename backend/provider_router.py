@@ -0,0 +1,319 @@
+import time
+import asyncio
+import logging
+import threading
+import contextlib
+from admission import AdmissionRejected
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class ProviderError(Exception):
+    """
+    Raised by a provider callable on failure, or by the router when every provider failed.
+    """
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for
+    `reset_timeout` seconds; then lets a single trial call through (half-open).
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def release(self):
+        """
+        Ends a half-open trial without a verdict (e.g. the call was cancelled).
+        """
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class LatencyHistogram:
+    """
+    Cumulative latency histogram with success/error counts.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.successes = 0
+        self.errors = 0
+
+    def observe(self, seconds, ok=True):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += seconds
+        if ok:
+            self.successes += 1
+        else:
+            self.errors += 1
+
+    def snapshot(self):
+        count = self.successes + self.errors
+        return {
+            "count": count,
+            "errors": self.errors,
+            "error_rate": round(self.errors / count, 4) if count else None,
+            "mean": round(self.total / count, 4) if count else None,
+            "buckets": {str(b): c for b, c in zip(list(self.buckets) + ["+Inf"], self.counts)}
+        }
+
+
+class ProviderRouter:
+    """
+    Routes a generation across providers in a configured order.
+
+    `providers` maps a name to an async callable (user_input, system_instruction) -> str
+    that raises on failure. If the current provider has not answered within
+    `hedge_delay` seconds, the next one is started in parallel (hedging); a failure
+    starts the next one immediately (fallback). The first good answer wins and the
+    other in-flight calls are cancelled. Providers whose circuit breaker is open are skipped.
+    Stub callables that sleep or raise can be passed in to exercise every path.
+
+    With an `admission` controller each call first takes one of its provider's slots;
+    a provider that sheds the request counts as unavailable (the next one is tried)
+    but not as failing, and AdmissionRejected is raised if every provider shed it.
+    """
+
+    def __init__(self, providers, order, hedge_delay=None, timeout=None, failure_threshold=3, reset_timeout=30.0, observer=None, admission=None):
+        self.providers = providers
+        self.order = [name for name in order if name in providers]
+        self.hedge_delay = hedge_delay
+        self.timeout = timeout
+        self.breakers = {name: CircuitBreaker(failure_threshold, reset_timeout) for name in self.order}
+        self.histograms = {name: LatencyHistogram() for name in self.order}
+        self.observer = observer # optional fn(provider, seconds, ok), e.g. a metrics histogram
+        self.admission = admission
+        self.hedges = 0
+        self.fallbacks = 0
+
+    def _observe(self, name, seconds, ok=True):
+        self.histograms[name].observe(seconds, ok)
+        if self.observer:
+            self.observer(name, seconds, ok)
+
+    def _slot(self, name):
+        return self.admission.slot(name) if self.admission else contextlib.nullcontext()
+
+    def _slot_async(self, name):
+        return self.admission.slot_async(name) if self.admission else contextlib.nullcontext()
+
+    @staticmethod
+    def _raise_if_shed(errors, rejections):
+        if rejections and len(rejections) == len(errors):
+            raise rejections[-1]
+
+    async def _attempt(self, name, user_input, system_instruction):
+        try:
+            async with self._slot_async(name):
+                return await self._call(name, user_input, system_instruction)
+        except (AdmissionRejected, asyncio.CancelledError):
+            # Shed, or lost the hedge race; says nothing about the provider's health
+            self.breakers[name].release()
+            raise
+
+    async def _call(self, name, user_input, system_instruction):
+        started = time.monotonic()
+        try:
+            call = self.providers[name](user_input, system_instruction)
+            result = await (asyncio.wait_for(call, self.timeout) if self.timeout else call)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._observe(name, time.monotonic() - started, ok=False)
+            self.breakers[name].record_failure()
+            logger.warning(f"Provider {name} failed: {e}")
+            raise
+        self._observe(name, time.monotonic() - started)
+        self.breakers[name].record_success()
+        return result
+
+    def _next_candidate(self, remaining):
+        while remaining:
+            name = remaining.pop(0)
+            if self.breakers[name].allow():
+                return name
+            logger.info(f"Skipping provider {name}: circuit open")
+        return None
+
+    async def generate(self, user_input, system_instruction):
+        """
+        Returns (provider name, reply). Raises ProviderError when no provider succeeded.
+        """
+        remaining = list(self.order)
+        running = {}
+        errors = []
+        rejections = []
+
+        def launch():
+            name = self._next_candidate(remaining)
+            if name:
+                task = asyncio.ensure_future(self._attempt(name, user_input, system_instruction))
+                running[task] = name
+            return name
+
+        if not launch():
+            raise ProviderError("All AI providers are unavailable (circuits open)")
+
+        try:
+            while running:
+                wait_for = self.hedge_delay if self.hedge_delay and remaining else None
+                done, _ = await asyncio.wait(running, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Latency budget exceeded: hedge with the next provider
+                    if launch():
+                        self.hedges += 1
+                    continue
+                for task in done:
+                    name = running.pop(task)
+                    if task.exception() is None:
+                        return name, task.result()
+                    errors.append(f"{name}: {task.exception()}")
+                    if isinstance(task.exception(), AdmissionRejected):
+                        rejections.append(task.exception())
+                    if launch():
+                        self.fallbacks += 1
+        finally:
+            for task in running:
+                task.cancel()
+
+        self._raise_if_shed(errors, rejections)
+        raise ProviderError("; ".join(errors) or "No AI provider available")
+
+    def generate_sync(self, sync_providers, user_input, system_instruction):
+        """
+        Blocking variant for thread-based callers (Telegram bot): tries providers in
+        order with the same circuit breakers and histograms, without hedging.
+        """
+        errors = []
+        rejections = []
+        remaining = [name for name in self.order if name in sync_providers]
+        while True:
+            name = self._next_candidate(remaining)
+            if name is None:
+                self._raise_if_shed(errors, rejections)
+                raise ProviderError("; ".join(errors) or "No AI provider available")
+            try:
+                with self._slot(name):
+                    started = time.monotonic()
+                    result = sync_providers[name](user_input, system_instruction)
+            except AdmissionRejected as e:
+                self.breakers[name].release()
+                errors.append(f"{name}: {e}")
+                rejections.append(e)
+                continue
+            except Exception as e:
+                self._observe(name, time.monotonic() - started, ok=False)
+                self.breakers[name].record_failure()
+                errors.append(f"{name}: {e}")
+                if remaining:
+                    self.fallbacks += 1
+                logger.warning(f"Provider {name} failed: {e}")
+                continue
+            self._observe(name, time.monotonic() - started)
+            self.breakers[name].record_success()
+            return name, result
+
+    async def stream(self, stream_factories, user_input, system_instruction):
+        """
+        Streams from the first provider that produces a token, falling back to the
+        next one if a provider fails before its first token. `stream_factories` maps
+        provider names to async-generator functions.
+        """
+        errors = []
+        rejections = []
+        remaining = [name for name in self.order if name in stream_factories]
+        while True:
+            name = self._next_candidate(remaining)
+            if name is None:
+                self._raise_if_shed(errors, rejections)
+                raise ProviderError("; ".join(errors) or "No AI provider available")
+            emitted = False
+            try:
+                async with self._slot_async(name):
+                    started = time.monotonic()
+                    async for token in stream_factories[name](user_input, system_instruction):
+                        if not emitted:
+                            emitted = True
+                            self._observe(name, time.monotonic() - started)
+                        yield token
+            except AdmissionRejected as e:
+                self.breakers[name].release()
+                errors.append(f"{name}: {e}")
+                rejections.append(e)
+                continue
+            except (GeneratorExit, asyncio.CancelledError):
+                # Consumer stopped reading (e.g. client disconnected)
+                self.breakers[name].release()
+                raise
+            except Exception as e:
+                self.breakers[name].record_failure()
+                if emitted:
+                    raise
+                self._observe(name, time.monotonic() - started, ok=False)
+                errors.append(f"{name}: {e}")
+                self.fallbacks += 1
+                logger.warning(f"Provider {name} failed before streaming: {e}")
+                continue
+            if not emitted:
+                self._observe(name, time.monotonic() - started)
+            self.breakers[name].record_success()
+            return
+
+    def stats(self):
+        return {
+            "order": self.order,
+            "hedge_delay": self.hedge_delay,
+            "hedges": self.hedges,
+            "fallbacks": self.fallbacks,
+            "providers": {
+                name: {"circuit": self.breakers[name].state, "latency": self.histograms[name].snapshot()}
+                for name in self.order
+            }
+        }
@@ -0,0 +1,209 @@
+import os
+import re
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """
+    Canonical form used for cache keys: NFC, case-folded, punctuation/symbols
+    (including Burmese ၊ ။) removed and whitespace collapsed.
+    """
+    text = unicodedata.normalize("NFC", text).casefold()
+    text = "".join(" " if unicodedata.category(ch)[0] in "PSZ" else ch for ch in text)
+    return WHITESPACE.sub(" ", text).strip()
+
+
+def make_key(provider, model, user_input, system_prompt, context=""):
+    """
+    Cache key over everything that determines the generated reply.
+    """
+    raw = json.dumps([provider, model, normalize_text(user_input), system_prompt, context], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class MemoryCacheBackend:
+    """
+    In-process LRU store with per-entry expiry.
+    """
+
+    blocking = False
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.time() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCacheBackend:
+    """
+    SQLite-file store, so the bot and API processes share one cache.
+    Entries are evicted by expiry and by least-recent use once max_entries is exceeded.
+    """
+
+    blocking = True # file I/O: async callers use a worker thread
+
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_response_cache_last_used ON response_cache (last_used)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        with self._conn() as conn:
+            row = conn.execute("SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE response_cache SET last_used = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now)
+            )
+            conn.execute("DELETE FROM response_cache WHERE expires_at < ?", (now,))
+            conn.execute(
+                "DELETE FROM response_cache WHERE key IN ("
+                "SELECT key FROM response_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def clear(self):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM response_cache")
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+
+class ResponseCache:
+    """
+    TTL cache of AI replies in front of the providers, with hit/miss counters.
+    """
+
+    def __init__(self, backend, ttl=3600):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def get(self, key):
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.error(f"Response cache read error: {e}")
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        try:
+            self.backend.set(key, value, self.ttl)
+            self.stores += 1
+        except Exception as e:
+            logger.error(f"Response cache write error: {e}")
+
+    async def aget(self, key):
+        """
+        get for async callers; a blocking backend is read in a worker thread.
+        """
+        if self.backend.blocking:
+            return await asyncio.to_thread(self.get, key)
+        return self.get(key)
+
+    async def aset(self, key, value):
+        if self.backend.blocking:
+            await asyncio.to_thread(self.set, key, value)
+        else:
+            self.set(key, value)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None
+        }
+
+
+def create_response_cache():
+    """
+    Builds the cache from RESPONSE_CACHE ('memory', 'sqlite' or 'off'),
+    RESPONSE_CACHE_TTL, RESPONSE_CACHE_SIZE and RESPONSE_CACHE_PATH.
+    Returns None when caching is disabled.
+    """
+    kind = os.getenv("RESPONSE_CACHE", "memory").lower()
+    ttl = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+    size = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+    if kind == "off":
+        return None
+    if kind == "sqlite":
+        backend = SQLiteCacheBackend(os.getenv("RESPONSE_CACHE_PATH", "data/response_cache.db"), max_entries=size)
+    else:
+        backend = MemoryCacheBackend(max_entries=size)
+    return ResponseCache(backend, ttl=ttl)
@@ -0,0 +1,261 @@
+import os
+import re
+import sys
+import hashlib
+import logging
+import threading
+
+import numpy as np
+from sqlalchemy import func, select
+
+from json_stream import iter_records
+from db.documents import CompanyDocument, DocumentEmbedding
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_DIM = 1536 # Must match DocumentEmbedding.embedding
+# Latin words/numbers, or runs of Myanmar script. Kept apart from tokenizer.py: changing
+# the features would silently invalidate embeddings already stored by HashingEmbedder.
+TERM_PATTERN = re.compile(r"[က-႟ꩠ-ꩿ]+|[^\W_]+")
+
+
+class HashingEmbedder:
+    """
+    Deterministic local embedder (feature hashing of terms and character trigrams).
+    Needs no network or model download, so it is used for tests and offline setups.
+    """
+    name = "local"
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+
+    def _features(self, text):
+        for term in TERM_PATTERN.findall(text.lower()):
+            yield term, 1.0
+            # Burmese is mostly written without spaces, so sub-word n-grams carry the signal
+            if len(term) > 3:
+                for i in range(len(term) - 2):
+                    yield term[i:i + 3], 0.5
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dim
+                sign = 1.0 if digest[4] & 1 else -1.0
+                vectors[row, bucket] += sign * weight
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+class OpenAIEmbedder:
+    """
+    OpenAI embeddings (text-embedding-3-small is natively 1536-dimensional).
+    """
+    name = "openai"
+
+    def __init__(self, client, model="text-embedding-3-small", dim=EMBEDDING_DIM):
+        self.client = client
+        self.model = model
+        self.dim = dim
+
+    def embed(self, texts):
+        response = self.client.embeddings.create(model=self.model, input=list(texts), dimensions=self.dim)
+        return np.array([item.embedding for item in response.data], dtype=np.float32)
+
+
+class GeminiEmbedder:
+    """
+    Gemini embeddings, truncated to the column dimension via output_dimensionality.
+    """
+    name = "gemini"
+
+    def __init__(self, model="models/gemini-embedding-001", dim=EMBEDDING_DIM):
+        import google.generativeai as genai
+        self.genai = genai
+        self.model = model
+        self.dim = dim
+
+    def embed(self, texts):
+        result = self.genai.embed_content(model=self.model, content=list(texts), output_dimensionality=self.dim)
+        vectors = np.array(result["embedding"], dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+def get_embedder(name=None, openai_client=None):
+    """
+    Returns the embedder selected by EMBEDDING_PROVIDER ('local', 'openai' or 'gemini').
+    """
+    name = (name or os.getenv("EMBEDDING_PROVIDER", "local")).lower()
+    if name == "openai":
+        if openai_client is None:
+            from openai import OpenAI
+            openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return OpenAIEmbedder(openai_client)
+    if name == "gemini":
+        return GeminiEmbedder()
+    return HashingEmbedder()
+
+
+def chunk_text(text, size=800, overlap=100):
+    """
+    Splits text into overlapping chunks, preferring paragraph and sentence boundaries.
+    """
+    text = text.strip()
+    if len(text) <= size:
+        return [text] if text else []
+
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            window = text[start:end]
+            cut = max(window.rfind("\n"), window.rfind("။"), window.rfind(". "))
+            if cut > size // 2:
+                end = start + cut + 1
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return [c for c in chunks if c]
+
+
+class RetrievalEngine:
+    """
+    Semantic retrieval over CompanyDocument / DocumentEmbedding.
+
+    On PostgreSQL the nearest-neighbour search is pushed down to pgvector (HNSW index,
+    cosine distance). On other databases (the SQLite dev DB) the embeddings are loaded
+    once into a NumPy matrix and searched by brute force; the matrix is reloaded when
+    rows are added or removed.
+    """
+
+    def __init__(self, session_factory, embedder=None, batch_size=64, chunk_size=800, chunk_overlap=100):
+        self.session_factory = session_factory
+        self.embedder = embedder or HashingEmbedder()
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._contents = []
+        self._version = None
+
+    def _is_postgres(self, db):
+        return db.get_bind().dialect.name == "postgresql"
+
+    def ingest(self, documents, db=None):
+        """
+        Chunks, embeds and stores documents in batches.
+        `documents` is an iterable of dicts with `content` and optional `title` / `description`
+        and `chunks` (already chunked content, as produced by ingest.py).
+        Each embedding batch is committed, unless a session `db` is passed: then the
+        rows are only flushed and the caller commits them (ingest.py commits them
+        together with its checkpoint).
+        Returns the number of chunks written.
+        """
+        written = 0
+        pending = [] # (document, chunk) pairs waiting for the next embedding batch
+        own_session = db is None
+        if own_session:
+            db = self.session_factory()
+        try:
+            for doc in documents:
+                content = (doc.get("content") or "").strip()
+                if not content:
+                    continue
+                document = CompanyDocument(
+                    title=doc.get("title") or content[:80],
+                    description=doc.get("description")
+                )
+                db.add(document)
+                chunks = doc.get("chunks") or chunk_text(content, self.chunk_size, self.chunk_overlap)
+                pending.extend((document, chunk) for chunk in chunks)
+                if len(pending) >= self.batch_size:
+                    written += self._flush(db, pending, own_session)
+                    pending = []
+            if pending:
+                written += self._flush(db, pending, own_session)
+        except Exception:
+            if own_session:
+                db.rollback()
+            raise
+        finally:
+            if own_session:
+                db.close()
+        return written
+
+    def _flush(self, db, pending, commit=True):
+        vectors = self.embedder.embed([chunk for _, chunk in pending])
+        for (document, chunk), vector in zip(pending, vectors):
+            db.add(DocumentEmbedding(document=document, content=chunk, embedding=vector))
+        if commit:
+            db.commit()
+        else:
+            db.flush()
+        logger.info(f"Ingested {len(pending)} chunks")
+        return len(pending)
+
+    def search(self, query, k=5, min_score=0.0):
+        """
+        Returns up to k (content, score) pairs with similarity above min_score,
+        ordered by cosine similarity.
+        """
+        vector = self.embedder.embed([query])[0]
+        db = self.session_factory()
+        try:
+            if self._is_postgres(db):
+                distance = DocumentEmbedding.embedding.cosine_distance(vector)
+                rows = db.execute(
+                    select(DocumentEmbedding.content, distance.label("distance")).order_by(distance).limit(k)
+                ).all()
+                return [(row.content, 1.0 - row.distance) for row in rows if 1.0 - row.distance > min_score]
+            self._load_matrix(db)
+        finally:
+            db.close()
+
+        matrix, contents = self._matrix, self._contents
+        if matrix is None or not len(contents):
+            return []
+        scores = matrix @ vector
+        k = min(k, len(contents))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(contents[i], float(scores[i])) for i in top if scores[i] > min_score]
+
+    def _load_matrix(self, db):
+        version = tuple(db.execute(select(func.count(DocumentEmbedding.id), func.max(DocumentEmbedding.id))).one())
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            rows = db.execute(select(DocumentEmbedding.content, DocumentEmbedding.embedding)).all()
+            contents = [row.content for row in rows]
+            matrix = np.zeros((0, self.embedder.dim), dtype=np.float32)
+            if rows:
+                matrix = np.array([row.embedding for row in rows], dtype=np.float32)
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                matrix /= norms
+            self._matrix, self._contents, self._version = matrix, contents, version
+            logger.info(f"Loaded {len(rows)} embeddings for brute-force search")
+
+
+if __name__ == "__main__":
+    # Usage: python retrieval.py data/posts.json (see ingest.py for large or Zawgyi exports)
+    from dotenv import load_dotenv
+    load_dotenv()
+    from db.database import Base, engine, SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    path = sys.argv[1] if len(sys.argv) > 1 else "data/posts.json"
+    Base.metadata.create_all(bind=engine)
+    posts = (record for record, _ in iter_records(path))
+    count = RetrievalEngine(SessionLocal, get_embedder()).ingest(posts)
+    print(f"Ingested {count} chunks from {path}")
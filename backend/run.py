@@ -1,22 +1,45 @@
-import subprocess
-import threading
-import sys
-import time
 import os
-
-from server import app
+import argparse
+import logging
 
 import uvicorn
-import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def run_fastapi():
+# Worker processes; 1 keeps the single-process mode. WEB_CONCURRENCY is the usual name on PaaS hosts.
+WORKERS = int(os.getenv("WORKERS", os.getenv("WEB_CONCURRENCY", "1")))
+
+
+def prepare_workers(workers):
+    """
+    State the workers must agree on (bot token, webhook dedup, session memory
+    versions, reply cache, admission rate limits and the count of processes the
+    concurrency limits are split between) moves to SQLite files unless configured
+    otherwise. Set before the workers are spawned so they inherit it.
+    """
+    if workers > 1:
+        os.environ.setdefault("SHARED_STATE", "sqlite")
+        os.environ.setdefault("RESPONSE_CACHE", "sqlite")
+        os.makedirs("data", exist_ok=True)
+
+
+def run_fastapi(workers=WORKERS, host="0.0.0.0", port=8000):
     """Runs the FastAPI server."""
-    logger.info("Starting FastAPI server on port 8000...")
+    if workers > 1 and os.getenv("TELEGRAM_WEBHOOK_URL"):
+        # Each worker would register the webhook and run its own dispatcher, and
+        # Telegram spreads a chat's updates over them, so replies lose their order
+        raise SystemExit("TELEGRAM_WEBHOOK_URL needs a single worker (WORKERS=1). With more workers, "
+                         "unset it and run main.py to poll Telegram next to the API.")
+    prepare_workers(workers)
+    logger.info(f"Starting FastAPI server on port {port} with {workers} worker(s)...")
     # NOTE: Run inside docker, so host should be 0.0.0.0
-    uvicorn.run("server:app", host="0.0.0.0", port=8000, reload=False)
+    uvicorn.run("server:app", host=host, port=port, reload=False, workers=workers)
 
 if __name__ == "__main__":
-    run_fastapi()
+    parser = argparse.ArgumentParser(description="Runs the API server.")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="worker processes (default: WORKERS or 1)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    args = parser.parse_args()
+    run_fastapi(args.workers, args.host, args.port)
@@ -1,45 +1,121 @@
 import os
-import requests
+import json
+import asyncio
 from dotenv import load_dotenv
 load_dotenv()
 
 from fastapi import FastAPI, HTTPException, Request, Query, Depends
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel
 from typing import Optional
 import logging
-from core import get_bot_status, set_bot_token, TELEGRAM_BOT_TOKEN, get_context, get_ai_response, supabase
+from fastapi.responses import Response
+from metrics import REGISTRY, CONTENT_TYPE, MetricsMiddleware, span, trace_request
+from core import CONTEXT_RETRIEVAL, get_bot_status, get_bot_token, get_bot_token_async, set_bot_token_async, SHARED_STATE, get_context_async, get_ai_response_async, get_ai_response_stream, close_http_clients, get_supabase, RESPONSE_CACHE, SINGLE_FLIGHT, ADMISSION, PROVIDER_ROUTER, PROMPT_REGISTRY, GEMINI_PROMPT_CACHE, OLLAMA_ENGINE, should_warm_ollama, CONVERSATION_MEMORY, get_conversation_history, remember_turn, without_failed_turns, is_error_reply
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Personal AI Assistant API")
+# Per-route latency histograms and a structured trace log line per request
+app.add_middleware(MetricsMiddleware)
 
 FB_PAGE_ACCESS_TOKEN = os.getenv("FB_PAGE_ACCESS_TOKEN")
 FB_VERIFY_TOKEN = os.getenv("FB_VERIFY_TOKEN")
+GRAPH_API_URL = os.getenv("GRAPH_API_URL", "https://graph.facebook.com/v12.0")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL")
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET")
+CHAT_WRITE_BEHIND = os.getenv("CHAT_WRITE_BEHIND", "true").lower() in ("1", "true", "yes")
+# Web session memory versions in SHARED_STATE; an expired version only forces a reload from the DB
+MEMORY_VERSION_TTL = 86400
 
-from db.database import get_db, engine, Base
+from db.database import get_db, engine, Base, SessionLocal
+from webhook_queue import WebhookQueue, QueueFullError
+from chat_store import ChatWriteBuffer, ActiveSessionCache
+from chat_history import session_page, session_owner, message_page, DEFAULT_SESSION_PAGE, DEFAULT_MESSAGE_PAGE
+from http_pool import HTTP_POOL
+from bot_health import BotHealthMonitor
+from auth import UserCache, can_verify_locally, verify_access_token, token_expiry
 from db.models import User, ChatSession, DbChatMessage as DbChatMessage
 
 from sqlalchemy.orm import Session
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
+ollama_warmup = None
+
 @app.on_event("startup")
 async def startup():
     try:
+        if CONTEXT_RETRIEVAL == "semantic":
+            import db.documents  # registers the pgvector tables, which are not loaded otherwise
         Base.metadata.create_all(bind=engine)
         logger.info("Database tables verified")
     except Exception as e:
         logger.error(f"Database startup error: {e}")
+    await webhook_queue.start()
+    chat_writer.start()
+    await start_telegram_webhook()
+    await bot_health.start()
+    if should_warm_ollama():
+        # Load the model in the background so the first user does not pay for it
+        global ollama_warmup
+        ollama_warmup = asyncio.create_task(OLLAMA_ENGINE.warm_up_async())
+
+@app.on_event("shutdown")
+async def shutdown():
+    await webhook_queue.stop()
+    await bot_health.stop()
+    if ollama_warmup:
+        ollama_warmup.cancel()
+    if telegram_runtime:
+        await asyncio.to_thread(telegram_runtime.stop)
+    # Durable on shutdown: write every buffered chat message before exiting
+    chat_writer.stop()
+    await close_http_clients()
 
 security = HTTPBearer()
 
+chat_writer = ChatWriteBuffer(
+    SessionLocal,
+    max_batch=int(os.getenv("CHAT_WRITE_BATCH", "100")),
+    flush_interval=float(os.getenv("CHAT_WRITE_INTERVAL", "0.5")),
+    write_behind=CHAT_WRITE_BEHIND
+)
+active_sessions = ActiveSessionCache()
+
+user_cache = UserCache()
+
+# getMe runs in the background; settings reads serve the cached result
+bot_health = BotHealthMonitor(get_bot_status, get_bot_token)
+
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
-    token = credentials.credentials
+    """
+    Resolves the bearer token to a User. Tokens are verified locally when the JWT secret or
+    JWKS is configured, and resolved users are cached until the token expires, so most
+    requests need neither a Supabase call nor a DB query.
+    """
+    with span("auth"):
+        return resolve_user(credentials.credentials, db)
+
+def resolve_user(token, db: Session):
+    cached = user_cache.get(token)
+    if cached:
+        return User(**cached)
+
     try:
-        response = supabase.auth.get_user(token)
-        user_uuid = response.user.id
-        user_email = response.user.email
+        if can_verify_locally():
+            claims = verify_access_token(token)
+            user_uuid = claims["sub"]
+            user_email = claims.get("email")
+            token_exp = claims.get("exp")
+        else:
+            response = get_supabase().auth.get_user(token)
+            user_uuid = response.user.id
+            user_email = response.user.email
+            token_exp = token_expiry(token)
     except Exception as e:
         logger.error(f"Supabase auth error: {e}")
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
@@ -50,6 +126,14 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
         user = User(id=user_uuid, email=user_email)
         db.add(user)
         db.commit()
+        db.refresh(user)
+
+    user_cache.set(token, {
+        "id": user.id,
+        "email": user.email,
+        "full_name": user.full_name,
+        "created_at": user.created_at
+    }, token_exp)
     return user
 
 class RegisterRequest(BaseModel):
@@ -61,7 +145,7 @@ class RegisterRequest(BaseModel):
 async def register_user(req: RegisterRequest, db: Session = Depends(get_db)):
     try:
         # Call Supabase
-        res = supabase.auth.sign_up({
+        res = get_supabase().auth.sign_up({
             "email": req.email,
             "password": req.password,
             "options": { "data": { "full_name": req.full_name } }
@@ -95,11 +179,12 @@ async def register_user(req: RegisterRequest, db: Session = Depends(get_db)):
 
 class ChatRequest(BaseModel):
     message: str
+    no_cache: bool = False
 
 @app.post("/login")
 async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     try:
-        res = supabase.auth.sign_in_with_password({
+        res = get_supabase().auth.sign_in_with_password({
             "email": form_data.username,
             "password": form_data.password
         })
@@ -156,10 +241,33 @@ async def verify_webhook(
         logger.warning("Webhook verification failed.")
         raise HTTPException(status_code=403, detail="Verification token mismatch")
 
+async def process_messaging_event(sender_id, message_text):
+    """
+    Background worker step for one Messenger message: context, AI reply, send.
+    """
+    logger.info(f"Received message from {sender_id}: {message_text}")
+    with trace_request("messenger.message", "messenger"):
+        memory_key = f"fb:{sender_id}"
+        # 1. Get Context
+        context = await get_context_async(message_text)
+        # 2. Get AI Response
+        history = get_conversation_history(memory_key)
+        ai_response = await get_ai_response_async(message_text, context, history=history, channel="messenger", user=sender_id)
+        remember_turn(memory_key, message_text, ai_response)
+        # 3. Send Message back to Facebook
+        with span("send"):
+            await send_fb_message(sender_id, ai_response)
+
+webhook_queue = WebhookQueue(
+    process_messaging_event, workers=WEBHOOK_WORKERS, max_size=WEBHOOK_QUEUE_SIZE,
+    dedup_store=SHARED_STATE if SHARED_STATE.shared else None
+)
+
 @app.post("/webhook")
 async def handle_webhook(request: Request):
     """
     Facebook Webhook message handling (POST).
+    Events are acknowledged immediately and answered by the background webhook queue.
     """
     body = await request.json()
     logger.info(f"Received webhook: {body}")
@@ -172,34 +280,95 @@ async def handle_webhook(request: Request):
                     message_text = messaging_event["message"].get("text")
 
                     if message_text:
-                        logger.info(f"Received message from {sender_id}: {message_text}")
-                        # 1. Get Context
-                        context = get_context(message_text)
-                        # 2. Get AI Response
-                        ai_response = get_ai_response(message_text, context)
-                        # 3. Send Message back to Facebook
-                        send_fb_message(sender_id, ai_response)
+                        try:
+                            await webhook_queue.submit(sender_id, messaging_event["message"].get("mid"), message_text)
+                        except QueueFullError as e:
+                            # Let Facebook retry later instead of piling up work
+                            logger.warning(str(e))
+                            raise HTTPException(status_code=503, detail="Webhook queue is full")
 
         return "EVENT_RECEIVED"
     else:
         raise HTTPException(status_code=404)
 
-def send_fb_message(recipient_id, message_text):
+@app.get("/webhook/stats")
+async def webhook_stats():
+    """
+    Queue depth, counters and processing latency of the webhook worker pool.
+    """
+    return webhook_queue.stats()
+
+async def send_fb_message(recipient_id, message_text):
     """
     Sends a message back to the user via Facebook Graph API.
     """
-    url = f"https://graph.facebook.com/v12.0/me/messages?access_token={FB_PAGE_ACCESS_TOKEN}"
+    url = f"{GRAPH_API_URL}/me/messages?access_token={FB_PAGE_ACCESS_TOKEN}"
     payload = {
         "recipient": {"id": recipient_id},
         "message": {"text": message_text}
     }
     try:
-        response = requests.post(url, json=payload)
+        response = await HTTP_POOL.arequest("graph", "POST", url, json=payload)
         response.raise_for_status()
         logger.info(f"Sent message to {recipient_id}")
     except Exception as e:
         logger.error(f"Error sending FB message: {e}")
 
+async def get_active_session_id(db: Session, user_id: str):
+    """
+    Returns the id of the user's newest chat session, creating one if needed.
+    The id is cached per user, so warm requests skip the lookup; a cold one
+    queries the DB in a worker thread.
+    """
+    session_id = active_sessions.get(user_id)
+    if session_id is not None:
+        return session_id
+    session_id = await asyncio.to_thread(find_or_create_session, db, user_id)
+    active_sessions.set(user_id, session_id)
+    return session_id
+
+def find_or_create_session(db: Session, user_id: str):
+    session = db.query(ChatSession).filter(ChatSession.user_id == user_id).order_by(ChatSession.created_at.desc()).first()
+    if not session:
+        session = ChatSession(user_id=user_id, title="Main Chat")
+        db.add(session)
+        db.commit()
+        db.refresh(session)
+    return session.id
+
+async def release_session(db: Session):
+    """
+    Closes the request's DB session. Ending an open transaction is a DB round-trip,
+    so that case runs in a worker thread.
+    """
+    if db.in_transaction():
+        await asyncio.to_thread(db.close)
+    else:
+        db.close()
+
+async def load_session_memory(db: Session, session_id: int):
+    """
+    Seeds conversation memory from the DB the first time a session is seen in this
+    process, and reloads it when another worker has answered in the session since.
+    """
+    memory_key = f"web:{session_id}"
+    version = await SHARED_STATE.aget(f"memory:{memory_key}", 0)
+    if not CONVERSATION_MEMORY.has(memory_key) or CONVERSATION_MEMORY.version(memory_key) != version:
+        turns = await asyncio.to_thread(CONVERSATION_MEMORY.load_session, db, session_id)
+        CONVERSATION_MEMORY.reseed(memory_key, without_failed_turns(turns), version)
+    return memory_key
+
+async def remember_session_turn(memory_key, user_input, response):
+    """
+    Records a web exchange and bumps the session's shared version. If another worker
+    bumped it meanwhile, the local copy is marked stale and reloaded on the next request.
+    """
+    expected = CONVERSATION_MEMORY.version(memory_key)
+    if not remember_turn(memory_key, user_input, response):
+        return
+    version = await SHARED_STATE.aincr(f"memory:{memory_key}", ttl=MEMORY_VERSION_TTL)
+    CONVERSATION_MEMORY.set_version(memory_key, version if expected is not None and version == expected + 1 else None)
+
 class ChatResponse(BaseModel):
     response: str
 
@@ -207,31 +376,34 @@ class ChatResponse(BaseModel):
 async def chat(msg: ChatRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     """
     Chat endpoint for Web UI, requires JWT auth and saves history to the database.
+    Messages are persisted by the write-behind buffer, so the reply is not delayed by DB commits.
     """
     logger.info(f"Chat request from {current_user.email}: {msg.message}")
     
     try:
         # Find or create active session for this user (simple logic for now)
-        session = db.query(ChatSession).filter(ChatSession.user_id == current_user.id).order_by(ChatSession.created_at.desc()).first()
-        if not session:
-            session = ChatSession(user_id=current_user.id, title="Main Chat")
-            db.add(session)
-            db.commit()
-            db.refresh(session)
-            
+        with span("session"):
+            # Read before db.close(): committing a new session expires and detaches current_user
+            user_id = current_user.id
+            session_id = await get_active_session_id(db, user_id)
+            memory_key = await load_session_memory(db, session_id)
+            history = get_conversation_history(memory_key)
+            # Release the pooled connection (if one was used) while the LLM generates
+            await release_session(db)
+
         # Save user message
-        user_db_msg = DbChatMessage(session_id=session.id, role="user", content=msg.message)
-        db.add(user_db_msg)
+        with span("persist"):
+            chat_writer.add(session_id, "user", msg.message)
         
         # 1. Get Context
-        context = get_context(msg.message)
+        context = await get_context_async(msg.message)
         # 2. Get AI Response
-        response = get_ai_response(msg.message, context)
+        response = await get_ai_response_async(msg.message, context, use_cache=not msg.no_cache, history=history, channel="web", user=user_id)
         
         # Save AI message
-        ai_db_msg = DbChatMessage(session_id=session.id, role="ai", content=response)
-        db.add(ai_db_msg)
-        db.commit()
+        with span("persist"):
+            chat_writer.add(session_id, "ai", response)
+        await remember_session_turn(memory_key, msg.message, response)
         
         return ChatResponse(response=response)
     except Exception as e:
@@ -239,32 +411,287 @@ async def chat(msg: ChatRequest, current_user: User = Depends(get_current_user),
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/stream")
+async def chat_stream(msg: ChatRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    Streaming chat endpoint for Web UI. Emits NDJSON lines ({"token": ...}) as the
+    provider generates, then {"done": true}. The full reply is saved once the stream completes.
+    """
+    logger.info(f"Chat stream request from {current_user.email}: {msg.message}")
+
+    try:
+        with span("session"):
+            user_id = current_user.id
+            session_id = await get_active_session_id(db, user_id)
+            memory_key = await load_session_memory(db, session_id)
+            history = get_conversation_history(memory_key)
+            await release_session(db)
+        with span("persist"):
+            chat_writer.add(session_id, "user", msg.message)
+    except Exception as e:
+        logger.error(f"Chat error: {e}")
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+    context = await get_context_async(msg.message)
+
+    async def generate():
+        tokens = []
+        completed = False
+        try:
+            async for token in get_ai_response_stream(msg.message, context, use_cache=not msg.no_cache, history=history, channel="web", user=user_id):
+                tokens.append(token)
+                yield json.dumps({"token": token}, ensure_ascii=False) + "\n"
+            completed = True
+            yield json.dumps({"done": True}) + "\n"
+        finally:
+            # Persist whatever was generated, even if the client disconnected mid-stream
+            if tokens:
+                response = "".join(tokens)
+                try:
+                    with span("persist"):
+                        chat_writer.add(session_id, "ai", response)
+                except Exception as e:
+                    logger.error(f"Chat stream save error: {e}")
+                # A reply cut short by a disconnect or a provider error is kept in the history
+                # but not in the prompt memory
+                if completed and not is_error_reply(tokens[-1]):
+                    await remember_session_turn(memory_key, msg.message, response)
+
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def history_response(request: Request, page, max_age=0):
+    """
+    Serves a history page with its ETag, or 304 when the client already has it.
+    """
+    headers = {"ETag": page.etag, "Cache-Control": f"private, max-age={max_age}" if max_age else "private, no-cache"}
+    if page.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    return Response(page.body, media_type="application/json", headers=headers)
+
+@app.get("/sessions")
+def list_sessions(request: Request, before: Optional[int] = None, limit: int = Query(DEFAULT_SESSION_PAGE, ge=1, le=100),
+                  current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    The user's chat sessions, newest first. Pass the response's `next` as `before`
+    for the following page.
+    """
+    with span("history"):
+        page = session_page(db, current_user.id, before, limit)
+    return history_response(request, page)
+
+@app.get("/sessions/{session_id}/messages")
+def list_messages(session_id: int, request: Request, before: Optional[int] = None,
+                  limit: int = Query(DEFAULT_MESSAGE_PAGE, ge=1, le=200),
+                  current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+    A page of a session's messages, oldest first: the newest ones without `before`,
+    older ones with the previous response's `next`. Messages are never edited, so
+    pages fetched with `before` stay valid and may be cached by the client.
+    Messages still in the write-behind buffer show up within CHAT_WRITE_INTERVAL.
+    """
+    with span("history"):
+        if session_owner(db, session_id) != current_user.id:
+            raise HTTPException(status_code=404, detail="Session not found")
+        page = message_page(db, session_id, before, limit)
+    return history_response(request, page, max_age=3600 if before is not None else 0)
+
+@app.get("/chat/persistence/stats")
+async def chat_persistence_stats():
+    """
+    Pending and written rows of the chat history write-behind buffer.
+    """
+    return chat_writer.stats()
+
+telegram_runtime = None
+
+async def start_telegram_webhook():
+    """
+    Webhook mode: when TELEGRAM_WEBHOOK_URL is set, Telegram pushes updates to
+    POST /telegram/webhook and this process answers them instead of main.py polling.
+    It must be the only worker (run.py enforces WORKERS=1), since per-chat ordering
+    lives in this process's dispatcher.
+    """
+    global telegram_runtime
+    token = await get_bot_token_async()
+    if not TELEGRAM_WEBHOOK_URL or not token:
+        return
+    from telegram_runtime import TelegramRuntime
+    try:
+        telegram_runtime = TelegramRuntime(token)
+        telegram_runtime.start()
+        await asyncio.to_thread(telegram_runtime.set_webhook, TELEGRAM_WEBHOOK_URL, TELEGRAM_WEBHOOK_SECRET)
+    except Exception as e:
+        logger.error(f"Telegram webhook setup error: {e}")
+
+@app.post("/telegram/webhook")
+async def telegram_webhook(request: Request):
+    """
+    Receives Telegram updates in webhook mode. Chat messages are only enqueued; the
+    handlers run in a worker thread because /start and busy notices reply inline.
+    """
+    if not telegram_runtime:
+        raise HTTPException(status_code=404)
+    if TELEGRAM_WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != TELEGRAM_WEBHOOK_SECRET:
+        raise HTTPException(status_code=403, detail="Invalid secret token")
+    await asyncio.to_thread(telegram_runtime.process_update, await request.json())
+    return {"ok": True}
+
+@REGISTRY.collector
+def collect_server_metrics():
+    """
+    Gauges and counters read from the components' own stats at scrape time.
+    """
+    queue = webhook_queue.stats()
+    yield "assistant_webhook_queue_depth", "gauge", "Messenger events waiting for a worker.", [({}, queue["depth"])]
+    yield "assistant_webhook_events_total", "counter", "Messenger events by outcome.", [
+        ({"outcome": outcome}, queue[outcome]) for outcome in ("accepted", "processed", "failed", "duplicates", "rejected")
+    ]
+    yield "assistant_chat_write_pending", "gauge", "Chat messages buffered for the DB.", [({}, chat_writer.pending())]
+    if telegram_runtime:
+        dispatcher = telegram_runtime.dispatcher.stats()
+        yield "assistant_telegram_pending", "gauge", "Telegram messages queued for a worker.", [({}, dispatcher["pending"])]
+    if RESPONSE_CACHE is not None:
+        cache = RESPONSE_CACHE.stats()
+        yield "assistant_response_cache_lookups_total", "counter", "Response cache lookups by result.", [
+            ({"result": "hit"}, cache["hits"]), ({"result": "miss"}, cache["misses"])
+        ]
+    yield "assistant_auth_cache_lookups_total", "counter", "Token -> user cache lookups by result.", [
+        ({"result": "hit"}, user_cache.hits), ({"result": "miss"}, user_cache.misses)
+    ]
+    router = PROVIDER_ROUTER.stats()
+    yield "assistant_provider_circuit_open", "gauge", "1 while a provider's circuit breaker is not closed.", [
+        ({"provider": name}, int(info["circuit"] != "closed")) for name, info in router["providers"].items()
+    ]
+    flights = SINGLE_FLIGHT.stats()
+    yield "assistant_llm_generations_total", "counter", "Generations started vs. requests that joined one already in flight.", [
+        ({"result": "started"}, flights["generations"]), ({"result": "coalesced"}, flights["coalesced"])
+    ]
+    yield "assistant_llm_generations_in_flight", "gauge", "Distinct generations in flight.", [({}, flights["in_flight"])]
+    admission = ADMISSION.stats()
+    yield "assistant_admission_rejected_total", "counter", "Generations shed with a busy reply, by reason.", [
+        ({"reason": reason}, count) for reason, count in admission["rejected"].items()
+    ]
+    yield "assistant_admission_queued", "gauge", "Generations waiting for a provider slot.", [
+        ({"provider": name}, gate["queued"]) for name, gate in admission["providers"].items()
+    ]
+    yield "assistant_admission_active", "gauge", "Generations holding a provider slot.", [
+        ({"provider": name}, gate["active"]) for name, gate in admission["providers"].items()
+    ]
+    yield "assistant_provider_hedges_total", "counter", "Hedged provider calls.", [({}, router["hedges"])]
+    yield "assistant_provider_fallbacks_total", "counter", "Provider fallbacks after a failure.", [({}, router["fallbacks"])]
+    ollama = OLLAMA_ENGINE.stats()
+    yield "assistant_ollama_cold_loads_total", "counter", "Generations that waited for Ollama to load the model.", [({}, ollama["cold_loads"])]
+    http = HTTP_POOL.stats()["destinations"]
+    yield "assistant_http_client_requests_total", "counter", "Outbound HTTP requests by destination.", [
+        ({"destination": name}, info["requests"]) for name, info in http.items()
+    ]
+    yield "assistant_http_client_connections_opened_total", "counter", "Outbound connections opened by destination.", [
+        ({"destination": name}, info["connections_opened"]) for name, info in http.items()
+    ]
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus scrape endpoint.
+    """
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/http/stats")
+async def http_stats():
+    """
+    Outbound HTTP pool usage: requests, retries and connections opened per destination.
+    """
+    return HTTP_POOL.stats()
+
+@app.get("/telegram/stats")
+async def telegram_stats():
+    """
+    Worker pool state of the Telegram runtime (webhook mode only).
+    """
+    return telegram_runtime.dispatcher.stats() if telegram_runtime else {"mode": "disabled"}
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Hit/miss counters of the AI response cache.
+    """
+    return RESPONSE_CACHE.stats() if RESPONSE_CACHE else {"backend": None}
+
+@app.get("/singleflight/stats")
+async def single_flight_stats():
+    """
+    Generations in flight and how many requests were served by joining one (generations saved).
+    """
+    return SINGLE_FLIGHT.stats()
+
+@app.get("/admission/stats")
+async def admission_stats():
+    """
+    Provider slots in use, queue depth per channel, queue wait and requests shed by reason.
+    """
+    return ADMISSION.stats()
+
+@app.get("/prompts/stats")
+async def prompt_stats():
+    """
+    Loaded prompt version, templates and per-channel prefix digests.
+    """
+    stats = PROMPT_REGISTRY.stats()
+    if GEMINI_PROMPT_CACHE:
+        stats["gemini_cache"] = GEMINI_PROMPT_CACHE.stats()
+    return stats
+
+@app.get("/ollama/stats")
+async def ollama_stats():
+    """
+    Local model options, warm state and load/prompt/eval timings reported by Ollama.
+    """
+    return OLLAMA_ENGINE.stats()
+
+@app.get("/providers/stats")
+async def provider_stats():
+    """
+    Circuit breaker state and latency/error histograms per AI provider.
+    """
+    return PROVIDER_ROUTER.stats()
+
 @app.get("/settings")
 async def get_settings():
-    is_ok, status_msg = get_bot_status()
+    token = await get_bot_token_async()
     return {
-        "telegram_bot_token": TELEGRAM_BOT_TOKEN,
-        "bot_status": {
-            "ok": is_ok,
-            "message": status_msg
-        }
+        "telegram_bot_token": token,
+        "bot_status": bot_health.status(token)
     }
 
 @app.post("/settings")
 async def update_settings(update: dict):
     # Simplified settings for now, focusing on tokens
     if "telegram_bot_token" in update:
-        set_bot_token(update["telegram_bot_token"])
-    
-    is_ok, status_msg = get_bot_status()
+        await set_bot_token_async(update["telegram_bot_token"])
+        bot_status = await bot_health.refresh()
+    else:
+        bot_status = bot_health.status(await get_bot_token_async())
+
     return {
         "status": "success", 
         "settings": {
-            "telegram_bot_token": TELEGRAM_BOT_TOKEN,
-            "bot_status": {"ok": is_ok, "message": status_msg}
+            "telegram_bot_token": await get_bot_token_async(),
+            "bot_status": bot_status
         }
     }
 
+@app.get("/settings/bot-health")
+async def bot_health_history():
+    """
+    Recent Telegram getMe checks, oldest first.
+    """
+    return {"current": bot_health.status(await get_bot_token_async()), "interval": bot_health.interval, "history": bot_health.history()}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -5,7 +5,7 @@ load_dotenv()
 
 from sqlalchemy import text
 from db.database import engine, Base
-from db.models import User, ChatSession, DbChatMessage, CompanyDocument, DocumentEmbedding
+from db.models import User, ChatSession, DbChatMessage, CompanyDocument, DocumentEmbedding, IngestCheckpoint
 
 def setup_database():
     print("Setting up Supabase database...")
@@ -17,6 +17,12 @@ def setup_database():
     
     Base.metadata.create_all(bind=engine)
     print("Created all tables.")
+
+    # create_all skips indexes on tables that already exist
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    print("Verified all indexes.")
     
     print("Database setup complete!")
     print("\nTables created:")
@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class StateStore:
+    """
+    Async counterparts of the store methods for code running on the event loop.
+    A store doing blocking I/O runs them in a worker thread.
+    """
+    shared = False
+    blocking = False
+
+    async def _call(self, method, *args):
+        if self.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def aget(self, key, default=None):
+        return await self._call(self.get, key, default)
+
+    async def aset(self, key, value, ttl=None):
+        return await self._call(self.set, key, value, ttl)
+
+    async def aadd(self, key, value, ttl=None):
+        return await self._call(self.add, key, value, ttl)
+
+    async def aincr(self, key, amount=1, ttl=None):
+        return await self._call(self.incr, key, amount, ttl)
+
+    async def adelete(self, key):
+        return await self._call(self.delete, key)
+
+
+class MemoryStateStore(StateStore):
+    """
+    In-process key/value store; consistent only within one worker.
+    """
+    shared = False
+
+    def __init__(self):
+        self._data = {} # key -> (expires_at or None, value)
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _live(self, key, now):
+        item = self._data.get(key)
+        if item is not None and item[0] is not None and item[0] <= now:
+            del self._data[key]
+            return None
+        return item
+
+    def _put(self, key, value, expires_at, now):
+        self._data[key] = (expires_at, value)
+        # Expired keys are swept now and then instead of on every write
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            for stale in [k for k, item in self._data.items() if item[0] is not None and item[0] <= now]:
+                del self._data[stale]
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._live(key, time.time())
+            return default if item is None else item[1]
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        with self._lock:
+            self._put(key, value, now + ttl if ttl else None, now)
+
+    def add(self, key, value, ttl=None):
+        """
+        Sets key only if it is absent; returns True if it was set.
+        """
+        now = time.time()
+        with self._lock:
+            if self._live(key, now) is not None:
+                return False
+            self._put(key, value, now + ttl if ttl else None, now)
+            return True
+
+    def incr(self, key, amount=1, ttl=None):
+        """
+        Adds to a counter and returns the new value. `ttl` applies when the
+        counter is created, so it works as a fixed-window rate counter.
+        """
+        now = time.time()
+        with self._lock:
+            item = self._live(key, now)
+            if item is None:
+                item = (now + ttl if ttl else None, 0)
+            value = item[1] + amount
+            self._put(key, value, item[0], now)
+            return value
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class SQLiteStateStore(StateStore):
+    """
+    SQLite-file store shared by every worker and process on the host (the API
+    workers and the bot). Values are JSON; add and incr run in one IMMEDIATE
+    transaction so concurrent workers see a consistent result.
+    """
+    shared = True
+    blocking = True
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS shared_state (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+            )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        return conn
+
+    def _row(self, conn, key, now):
+        row = conn.execute("SELECT value, expires_at FROM shared_state WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] <= now):
+            return None
+        return row
+
+    def _put(self, conn, key, value, expires_at):
+        conn.execute(
+            "INSERT OR REPLACE INTO shared_state (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), expires_at)
+        )
+        # Expired keys are swept now and then instead of on every write
+        self._writes += 1
+        if self._writes % 1000 == 0:
+            conn.execute("DELETE FROM shared_state WHERE expires_at <= ?", (time.time(),))
+
+    def get(self, key, default=None):
+        row = self._row(self._conn(), key, time.time())
+        return default if row is None else json.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        conn = self._transaction()
+        try:
+            self._put(conn, key, value, time.time() + ttl if ttl else None)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def add(self, key, value, ttl=None):
+        """
+        Sets key only if it is absent; returns True if it was set.
+        """
+        now = time.time()
+        conn = self._transaction()
+        try:
+            if self._row(conn, key, now) is not None:
+                conn.execute("COMMIT")
+                return False
+            self._put(conn, key, value, now + ttl if ttl else None)
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def incr(self, key, amount=1, ttl=None):
+        """
+        Adds to a counter and returns the new value. `ttl` applies when the
+        counter is created, so it works as a fixed-window rate counter.
+        """
+        now = time.time()
+        conn = self._transaction()
+        try:
+            row = self._row(conn, key, now)
+            if row is None:
+                value, expires_at = amount, (now + ttl if ttl else None)
+            else:
+                value, expires_at = json.loads(row[0]) + amount, row[1]
+            self._put(conn, key, value, expires_at)
+            conn.execute("COMMIT")
+            return value
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM shared_state WHERE key = ?", (key,))
+
+
+def create_shared_state():
+    """
+    Builds the store from SHARED_STATE ('memory' or 'sqlite') and SHARED_STATE_PATH.
+    Use 'sqlite' whenever more than one worker or process serves the app.
+    """
+    kind = os.getenv("SHARED_STATE", "memory").lower()
+    if kind == "sqlite":
+        path = os.getenv("SHARED_STATE_PATH", "data/shared_state.db")
+        logger.info(f"Shared state in {path}")
+        return SQLiteStateStore(path)
+    return MemoryStateStore()
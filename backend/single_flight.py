@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import threading
+import concurrent.futures
+
+logger = logging.getLogger(__name__)
+
+
+class FlightAbandoned(Exception):
+    """
+    The leading caller went away (cancelled, client disconnected) before finishing.
+    Waiting callers start over and one of them leads a new flight.
+    """
+
+
+class Flight:
+    def __init__(self, key):
+        self.key = key
+        self.future = concurrent.futures.Future()
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight calls: while one caller (the leader) computes the
+    result for a key, later callers with the same key wait for that result instead
+    of starting their own. Callers can be coroutines on the event loop or plain
+    threads (the Telegram workers) in any mix; the result is shared through a
+    concurrent.futures.Future that both can wait on.
+
+    Nothing is kept once a flight lands; reuse of finished results is the
+    response cache's job.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.leaders = 0
+        self.shared = 0
+        self.abandoned = 0
+
+    def begin(self, key):
+        """
+        Returns (flight, leading). The leader must call finish() or abandon().
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                self.shared += 1
+                return flight, False
+            flight = self._flights[key] = Flight(key)
+            self.leaders += 1
+            return flight, True
+
+    def _land(self, flight):
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+
+    def finish(self, flight, result=None, error=None):
+        self._land(flight)
+        if error is not None:
+            flight.future.set_exception(error)
+        else:
+            flight.future.set_result(result)
+
+    def abandon(self, flight):
+        self._land(flight)
+        if flight.followers:
+            with self._lock:
+                self.abandoned += 1
+            flight.future.set_exception(FlightAbandoned(flight.key))
+        else:
+            flight.future.cancel()
+
+    def run(self, key, fn, *args):
+        """
+        Calls fn(*args), or waits for the identical call already in flight.
+        Blocks the calling thread; use run_async on the event loop.
+        """
+        if not self.enabled or key is None:
+            return fn(*args)
+        while True:
+            flight, leading = self.begin(key)
+            if not leading:
+                try:
+                    return flight.future.result()
+                except FlightAbandoned:
+                    continue
+            try:
+                result = fn(*args)
+            except BaseException as e:
+                if isinstance(e, Exception):
+                    self.finish(flight, error=e)
+                else:
+                    self.abandon(flight)
+                raise
+            self.finish(flight, result)
+            return result
+
+    async def wait_async(self, flight):
+        """
+        Awaits another caller's flight; cancelling the waiter leaves the flight alone.
+        """
+        return await asyncio.shield(asyncio.wrap_future(flight.future))
+
+    async def run_async(self, key, fn, *args):
+        """
+        Awaits fn(*args), or the identical call already in flight (async or threaded).
+        A cancelled follower stops waiting without affecting the flight.
+        """
+        if not self.enabled or key is None:
+            return await fn(*args)
+        while True:
+            flight, leading = self.begin(key)
+            if not leading:
+                try:
+                    return await self.wait_async(flight)
+                except FlightAbandoned:
+                    continue
+            try:
+                result = await fn(*args)
+            except BaseException as e:
+                # CancelledError is a BaseException: the followers retry rather than fail
+                if isinstance(e, Exception):
+                    self.finish(flight, error=e)
+                else:
+                    self.abandon(flight)
+                raise
+            self.finish(flight, result)
+            return result
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "in_flight": len(self._flights),
+                "followers": sum(flight.followers for flight in self._flights.values()),
+                "generations": self.leaders,
+                "coalesced": self.shared,
+                "abandoned": self.abandoned
+            }
@@ -0,0 +1,247 @@
+import os
+import time
+import queue
+import logging
+import threading
+from collections import deque, OrderedDict
+
+import telebot
+from telebot import apihelper
+
+from core import get_context, get_ai_response, get_conversation_history, remember_turn, TELEGRAM_API_URL
+from http_pool import HTTP_POOL
+from metrics import span, trace_request
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_WORKERS = int(os.getenv("TELEGRAM_WORKERS", "8"))
+TELEGRAM_MAX_PENDING_PER_CHAT = int(os.getenv("TELEGRAM_MAX_PENDING_PER_CHAT", "3"))
+TYPING_INTERVAL = 4.0 # Telegram shows "typing" for ~5 s per chat action
+BUSY_NOTICE_INTERVAL = 30.0 # at most one busy notice per chat in this many seconds
+
+WELCOME_MESSAGE = "Welcome to your AI Assistant! I am now powered by multiple AI providers (Gemini, OpenAI, or Local). Feel free to ask me anything."
+BUSY_MESSAGE = "ခဏစောင့်ပေးပါ၊ အရင်မေးထားတာတွေကို ဖြေနေတုန်းပါ။"
+
+
+class ChatDispatcher:
+    """
+    Worker pool that processes updates concurrently across chats.
+
+    Items of the same chat are handled one at a time, in arrival order; chats with
+    more work are re-queued behind the others after each item, so a busy chat cannot
+    hold a worker. Each chat may have at most `max_pending_per_chat` items queued or
+    running; further items are rejected.
+    """
+
+    def __init__(self, handler, workers=TELEGRAM_WORKERS, max_pending_per_chat=TELEGRAM_MAX_PENDING_PER_CHAT, on_reject=None):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_pending_per_chat = max_pending_per_chat
+        self.on_reject = on_reject
+        self._pending = {}    # chat_id -> deque of items waiting
+        self._running = set() # chat_ids with an item being handled
+        self._ready = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def start(self):
+        if self._threads:
+            return
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"telegram-worker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"Telegram dispatcher started with {self.workers} workers")
+
+    def stop(self):
+        for _ in self._threads:
+            self._ready.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def submit(self, chat_id, item):
+        """
+        Queues an item for its chat. Returns False if the chat is over its cap.
+        """
+        with self._lock:
+            waiting = self._pending.get(chat_id)
+            in_flight = (len(waiting) if waiting else 0) + (chat_id in self._running)
+            if in_flight >= self.max_pending_per_chat:
+                self.rejected += 1
+                rejected = True
+            else:
+                rejected = False
+                if waiting is None:
+                    waiting = self._pending[chat_id] = deque()
+                    if chat_id not in self._running:
+                        self._ready.put(chat_id)
+                waiting.append(item)
+        if rejected and self.on_reject:
+            self.on_reject(chat_id, item)
+        return not rejected
+
+    def _worker(self):
+        while True:
+            chat_id = self._ready.get()
+            if chat_id is None:
+                return
+            with self._lock:
+                item = self._pending[chat_id].popleft()
+                if not self._pending[chat_id]:
+                    del self._pending[chat_id]
+                self._running.add(chat_id)
+            try:
+                self.handler(item)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Telegram update for chat {chat_id} failed: {e}")
+            finally:
+                with self._lock:
+                    self._running.discard(chat_id)
+                    if chat_id in self._pending:
+                        # Back of the line, behind the other chats
+                        self._ready.put(chat_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "busy": len(self._running),
+                "chats_waiting": len(self._pending),
+                "pending": sum(len(items) for items in self._pending.values()),
+                "processed": self.processed,
+                "failed": self.failed,
+                "rejected": self.rejected
+            }
+
+
+class TypingIndicator:
+    """
+    Keeps the "typing" chat action alive while a long generation runs.
+    """
+
+    def __init__(self, bot, chat_id, interval=TYPING_INTERVAL):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.interval = interval
+        self._done = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while True:
+            try:
+                self.bot.send_chat_action(self.chat_id, "typing")
+            except Exception as e:
+                logger.warning(f"send_chat_action failed for chat {self.chat_id}: {e}")
+            if self._done.wait(self.interval):
+                return
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._done.set()
+        self._thread.join()
+
+
+class TelegramRuntime:
+    """
+    Telegram bot whose chat messages are answered by a ChatDispatcher instead of
+    inline in the polling loop. Runs with long polling (main.py) or from the FastAPI
+    app in webhook mode (server.py).
+    """
+
+    def __init__(self, token, workers=TELEGRAM_WORKERS, max_pending_per_chat=TELEGRAM_MAX_PENDING_PER_CHAT):
+        # Bot API calls go through the shared keep-alive pool, not a session per worker thread
+        apihelper.CUSTOM_REQUEST_SENDER = HTTP_POOL.telegram_sender
+        apihelper.API_URL = TELEGRAM_API_URL + "/bot{0}/{1}"
+        # Handlers only enqueue work, so telebot's own thread pool is not needed
+        self.bot = telebot.TeleBot(token, threaded=False)
+        self.dispatcher = ChatDispatcher(self.handle_chat, workers, max_pending_per_chat, on_reject=self._reject)
+        self._busy_notified = OrderedDict() # chat_id -> time of the last busy notice, oldest first
+        self._busy_lock = threading.Lock()
+
+        @self.bot.message_handler(commands=['start', 'help'])
+        def send_welcome(message):
+            self.bot.reply_to(message, WELCOME_MESSAGE)
+
+        @self.bot.message_handler(func=lambda message: True)
+        def enqueue_chat(message):
+            if message.text:
+                self.dispatcher.submit(message.chat.id, message)
+
+    def handle_chat(self, message):
+        """
+        Handles free conversation with the AI using selected provider and local context.
+        """
+        chat_id = message.chat.id
+        user_input = message.text
+        logger.info(f"User is chatting: {user_input[:50]}...")
+
+        with trace_request("telegram.message", "telegram"):
+            with TypingIndicator(self.bot, chat_id):
+                # 1. Get Context
+                context = get_context(user_input)
+
+                # 2. Get AI Response (with this chat's recent history)
+                memory_key = f"tg:{chat_id}"
+                response = get_ai_response(user_input, context, history=get_conversation_history(memory_key), channel="telegram", user=chat_id)
+                remember_turn(memory_key, user_input, response)
+
+            with span("send"):
+                self.bot.reply_to(message, response)
+
+    def _reject(self, chat_id, message):
+        # Tell a flooding chat to wait, at most once every BUSY_NOTICE_INTERVAL;
+        # notices older than that are forgotten so the map stays small
+        now = time.monotonic()
+        with self._busy_lock:
+            while self._busy_notified and next(iter(self._busy_notified.values())) <= now - BUSY_NOTICE_INTERVAL:
+                self._busy_notified.popitem(last=False)
+            if chat_id in self._busy_notified:
+                return
+            self._busy_notified[chat_id] = now
+        try:
+            self.bot.reply_to(message, BUSY_MESSAGE)
+        except Exception as e:
+            logger.warning(f"Could not send busy notice to chat {chat_id}: {e}")
+
+    def start(self):
+        self.dispatcher.start()
+
+    def stop(self):
+        self.dispatcher.stop()
+
+    def run_polling(self):
+        self.start()
+        try:
+            self.bot.remove_webhook()
+            self.bot.infinity_polling()
+        finally:
+            self.stop()
+
+    def set_webhook(self, url, secret_token=None):
+        """
+        Switches Telegram to push updates to `url` instead of long polling. Only one
+        process may serve the webhook: this runtime's dispatcher is what keeps a
+        chat's messages in order (run.py refuses webhook mode with several workers).
+        """
+        # set_webhook replaces any previous webhook or polling registration in one call
+        self.bot.set_webhook(url=url, secret_token=secret_token)
+        logger.info(f"Telegram webhook set to {url}")
+
+    def process_update(self, data):
+        """
+        Feeds one webhook update (parsed JSON) through the handlers.
+        """
+        update = telebot.types.Update.de_json(data)
+        self.bot.process_new_updates([update])
@@ -0,0 +1,101 @@
+import os
+import re
+import logging
+from functools import lru_cache
+
+import burmese
+
+logger = logging.getLogger(__name__)
+
+# One word per line (optionally followed by a tab and anything else, as in
+# frequency lists), added to the built-in Burmese lexicon
+BURMESE_DICTIONARY = os.getenv("BURMESE_DICTIONARY", "")
+
+# Myanmar digit runs, Myanmar letter runs (sentence marks ၊ ။ excluded), Latin words/numbers
+TOKEN_PATTERN = re.compile(r"([၀-၉]+)|([က-ဿ၌-႟ꩠ-ꩿ]+)|[^\W_]+")
+
+ENGLISH_STOPWORDS = frozenset("""
+a an the and or but if then else of to in on at by for with from into onto about as is are was were be been
+being am do does did doing have has had having i me my mine we us our you your yours he him his she her it
+its they them their this that these those there here what which who whom whose when where why how can could
+will would shall should may might must not no nor so too very just than also any some all each both either
+s t ll re ve d m please hi hello thanks thank
+""".split())
+
+
+def load_words(path):
+    words = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            word = line.split("\t", 1)[0].strip()
+            if word and not word.startswith("#"):
+                words.append(word)
+    return words
+
+
+class Tokenizer:
+    """
+    Search terms for English and Burmese text.
+
+    Text is normalised first (Zawgyi converted, NFC, case-folded). Burmese, which
+    is written without spaces between words, is split into syllables and joined
+    back into dictionary words; English is split on non-word characters. Stopwords
+    of both languages are dropped. The lexicon and stopwords are normalised once
+    when the tokenizer is built.
+    """
+
+    def __init__(self, words=burmese.WORDS, stopwords=ENGLISH_STOPWORDS | burmese.STOPWORDS, dictionary_path=None):
+        self.breaker = burmese.WordBreaker()
+        self.stopwords = frozenset(self.normalize(word) for word in stopwords)
+        for word in list(words) + list(stopwords):
+            self.breaker.add(self.normalize(word))
+        if dictionary_path:
+            try:
+                for word in load_words(dictionary_path):
+                    self.breaker.add(self.normalize(word))
+            except OSError as e:
+                logger.error(f"Error reading Burmese dictionary {dictionary_path}: {e}")
+        self.query_terms = lru_cache(maxsize=4096)(self._query_terms)
+
+    @staticmethod
+    def normalize(text):
+        return burmese.normalize(text)[0].casefold()
+
+    def tokenize(self, text):
+        """
+        Splits text into normalised search terms, stopwords removed.
+        """
+        terms = []
+        stopwords = self.stopwords
+        for match in TOKEN_PATTERN.finditer(self.normalize(text)):
+            digits, myanmar = match.groups()
+            if myanmar:
+                terms.extend(word for word in self.breaker.segment(myanmar) if word not in stopwords)
+            elif digits:
+                terms.append(digits)
+            else:
+                term = match.group()
+                if term not in stopwords:
+                    terms.append(term)
+        return terms
+
+    def _query_terms(self, query):
+        # Cached: the same questions come in again and again
+        return tuple(self.tokenize(query))
+
+
+TOKENIZER = Tokenizer(dictionary_path=BURMESE_DICTIONARY)
+
+
+def tokenize(text):
+    """
+    Splits text into search terms with the shared tokenizer.
+    """
+    return TOKENIZER.tokenize(text)
+
+
+def query_terms(query):
+    """
+    Search terms of a query, cached.
+    """
+    return TOKENIZER.query_terms(query)
@@ -0,0 +1,122 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """
+    Raised when an event cannot be queued within the backpressure timeout.
+    """
+
+
+class WebhookQueue:
+    """
+    Bounded in-process worker pool for Messenger events.
+
+    Events are sharded by sender id so each sender is always served by the same
+    worker, which keeps replies in order per sender. Message `mid`s that were
+    already accepted are dropped, so Facebook retries do not produce duplicate replies.
+    With several API workers, pass a shared `dedup_store` (shared_state) so a retry
+    that lands on another worker is dropped as well.
+    """
+
+    def __init__(self, handler, workers=4, max_size=1000, dedup_size=10000, enqueue_timeout=2.0, dedup_store=None, dedup_ttl=86400):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.shard_size = max(1, max_size // self.workers)
+        self.dedup_size = dedup_size
+        self.enqueue_timeout = enqueue_timeout
+        self.dedup_store = dedup_store
+        self.dedup_ttl = dedup_ttl
+        self._queues = []
+        self._tasks = []
+        self._seen = OrderedDict()
+        self._latencies = deque(maxlen=1000)
+        self._counters = {"accepted": 0, "processed": 0, "failed": 0, "duplicates": 0, "rejected": 0}
+
+    async def start(self):
+        self._queues = [asyncio.Queue(maxsize=self.shard_size) for _ in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._worker(q)) for q in self._queues]
+        logger.info(f"Webhook queue started with {self.workers} workers")
+
+    async def stop(self, timeout=10.0):
+        """
+        Waits (up to `timeout`) for queued events to finish, then cancels the workers.
+        """
+        try:
+            await asyncio.wait_for(asyncio.gather(*(q.join() for q in self._queues)), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Webhook queue stopped with {self.depth()} events pending")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, sender_id, mid, payload):
+        """
+        Queues an event for background processing.
+        Returns False for duplicates; raises QueueFullError when the sender's shard stays full.
+        """
+        if mid:
+            if mid in self._seen or (self.dedup_store and not await self.dedup_store.aadd(f"webhook:mid:{mid}", True, self.dedup_ttl)):
+                self._counters["duplicates"] += 1
+                return False
+            self._remember(mid)
+
+        queue = self._queues[hash(sender_id) % self.workers]
+        try:
+            await asyncio.wait_for(queue.put((time.monotonic(), sender_id, payload)), self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            # Forget the mid so Facebook's retry of this event is accepted later
+            self._seen.pop(mid, None)
+            if mid and self.dedup_store:
+                await self.dedup_store.adelete(f"webhook:mid:{mid}")
+            self._counters["rejected"] += 1
+            raise QueueFullError(f"Webhook queue is full ({self.depth()} pending)")
+        self._counters["accepted"] += 1
+        return True
+
+    def _remember(self, mid):
+        self._seen[mid] = True
+        if len(self._seen) > self.dedup_size:
+            self._seen.popitem(last=False)
+
+    async def _worker(self, queue):
+        while True:
+            enqueued_at, sender_id, payload = await queue.get()
+            try:
+                await self.handler(sender_id, payload)
+                self._counters["processed"] += 1
+            except Exception as e:
+                self._counters["failed"] += 1
+                logger.error(f"Webhook event for {sender_id} failed: {e}")
+            finally:
+                self._latencies.append(time.monotonic() - enqueued_at)
+                queue.task_done()
+
+    def depth(self):
+        return sum(q.qsize() for q in self._queues)
+
+    def stats(self):
+        """
+        Returns queue depth, counters and end-to-end latency percentiles (seconds).
+        """
+        latencies = sorted(self._latencies)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 4)
+
+        return {
+            "depth": self.depth(),
+            "capacity": self.shard_size * self.workers,
+            "workers": self.workers,
+            **self._counters,
+            "latency_p50": percentile(0.50),
+            "latency_p95": percentile(0.95),
+            "latency_max": round(latencies[-1], 4) if latencies else None
+        }
@@ -182,7 +182,7 @@ document.addEventListener('DOMContentLoaded', () => {
         const aiMsgDiv = appendMessage('ai', 'Thinking...');
 
         try {
-            const response = await fetch('/chat', {
+            const response = await fetch('/chat/stream', {
                 method: 'POST',
                 headers: { 
                     'Content-Type': 'application/json',
@@ -191,8 +191,35 @@ document.addEventListener('DOMContentLoaded', () => {
                 body: JSON.stringify({ message: text })
             });
 
-            const data = await response.json();
-            aiMsgDiv.textContent = data.response;
+            if (!response.ok || !response.body) {
+                const data = await response.json();
+                aiMsgDiv.textContent = data.detail || 'Error: Could not reach the assistant.';
+                return;
+            }
+
+            // Render NDJSON tokens as they arrive
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let reply = '';
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                const lines = buffer.split('\n');
+                buffer = lines.pop();
+                for (const line of lines) {
+                    if (!line.trim()) continue;
+                    const chunk = JSON.parse(line);
+                    if (chunk.token) {
+                        reply += chunk.token;
+                        aiMsgDiv.textContent = reply;
+                        messagesContainer.scrollTop = messagesContainer.scrollHeight;
+                    }
+                }
+            }
         } catch (err) {
             aiMsgDiv.textContent = 'Error: Could not reach the assistant.';
         }
@@ -243,6 +270,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     function updateBotStatusUI(status) {
         if (!status) return;
+        botStatusBadge.title = status.checked_at ? `Checked ${new Date(status.checked_at).toLocaleString()}` : '';
 
         if (status.ok) {
             botStatusAlert.classList.add('hidden');